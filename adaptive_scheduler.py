@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+自适应采集调度器
+根据每个交易对的近期波动、资金费率接近阈值的程度和持仓量比率变化，
+为每个交易对分配独立的轮询间隔：接近触发条件的交易对每分钟采集，
+平静的交易对每30分钟采集；每轮采集数量受全局请求权重预算限制。
+"""
+
+import heapq
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class AdaptiveScheduler:
+    """按优先级为每个交易对分配采集间隔"""
+
+    def __init__(self, funding_threshold: float, oi_ratio_threshold: float,
+                 min_interval: int = 60, max_interval: int = 1800,
+                 volatility_reference: float = 1.0):
+        """
+        Args:
+            funding_threshold: 资金费率阈值（FUNDING_RATE_THRESHOLD）
+            oi_ratio_threshold: 持仓量比率阈值（OI_RATIO_THRESHOLD）
+            min_interval: 最热交易对的采集间隔（秒）
+            max_interval: 最冷交易对的采集间隔（秒）
+            volatility_reference: 相邻两次采集价格变化达到该百分比时视为最高波动
+        """
+        self.funding_threshold = funding_threshold
+        self.oi_ratio_threshold = oi_ratio_threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.volatility_reference = volatility_reference
+
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._heap: List = []  # (next_due, symbol)
+
+    def sync_symbols(self, symbols: Iterable[str], now: Optional[float] = None):
+        """同步交易对列表：新交易对立即到期，已下架的交易对移除"""
+        now = time.time() if now is None else now
+        symbols = set(symbols)
+
+        for symbol in symbols - set(self._states):
+            self._states[symbol] = {
+                'next_due': now,
+                'interval': self.min_interval,
+                'score': 1.0,
+                'last_price': None,
+                'oi_history': deque(maxlen=10)
+            }
+            heapq.heappush(self._heap, (now, symbol))
+
+        for symbol in set(self._states) - symbols:
+            del self._states[symbol]
+
+    def due_symbols(self, max_symbols: Optional[int] = None, now: Optional[float] = None) -> List[str]:
+        """取出已到期的交易对，优先级高（分数高）的优先，最多 max_symbols 个
+
+        预算不足时未被选中的交易对保持到期状态，下一轮优先处理。
+        """
+        now = time.time() if now is None else now
+        due = []
+
+        while self._heap and self._heap[0][0] <= now:
+            next_due, symbol = heapq.heappop(self._heap)
+            state = self._states.get(symbol)
+            # 跳过已下架或已被重新调度的过期条目
+            if state is None or state['next_due'] != next_due:
+                continue
+            due.append(symbol)
+
+        due.sort(key=lambda symbol: (-self._states[symbol]['score'], self._states[symbol]['next_due']))
+
+        if max_symbols is not None and len(due) > max_symbols:
+            for symbol in due[max_symbols:]:
+                heapq.heappush(self._heap, (self._states[symbol]['next_due'], symbol))
+            due = due[:max_symbols]
+
+        # 先按最短间隔重新排期，采集失败时不会丢失；采集成功后由 update 覆盖
+        for symbol in due:
+            state = self._states[symbol]
+            state['next_due'] = now + self.min_interval
+            heapq.heappush(self._heap, (state['next_due'], symbol))
+
+        return due
+
+    def calculate_score(self, state: Dict[str, Any], snapshot: Dict[str, Any]) -> float:
+        """计算0~1的优先级分数，取三个信号中的最大值"""
+        # 资金费率接近阈值的程度
+        funding_rate = abs(snapshot.get('last_funding_rate') or 0)
+        funding_score = min(1.0, funding_rate / self.funding_threshold) if self.funding_threshold > 0 else 0.0
+
+        # 相邻两次采集的价格波动
+        volatility_score = 0.0
+        mark_price = snapshot.get('mark_price') or 0
+        last_price = state['last_price']
+        if last_price and mark_price:
+            change_pct = abs(mark_price - last_price) / last_price * 100
+            volatility_score = min(1.0, change_pct / self.volatility_reference)
+
+        # 持仓量比率（最近3次均值 / 最近10次均值）偏离1的程度
+        oi_score = 0.0
+        oi_history = state['oi_history']
+        if len(oi_history) >= 3 and self.oi_ratio_threshold > 1:
+            history = list(oi_history)
+            avg_all = sum(history) / len(history)
+            avg_recent = sum(history[-3:]) / 3
+            if avg_all > 0:
+                oi_ratio = avg_recent / avg_all
+                oi_score = min(1.0, abs(oi_ratio - 1) / (self.oi_ratio_threshold - 1))
+
+        return max(funding_score, volatility_score, oi_score)
+
+    def update(self, symbol: str, snapshot: Dict[str, Any], now: Optional[float] = None):
+        """根据最新快照更新交易对的优先级和下次采集时间"""
+        now = time.time() if now is None else now
+        state = self._states.get(symbol)
+        if state is None:
+            return
+
+        if snapshot.get('oi'):
+            state['oi_history'].append(snapshot['oi'])
+
+        score = self.calculate_score(state, snapshot)
+        state['last_price'] = snapshot.get('mark_price') or state['last_price']
+        state['score'] = score
+        state['interval'] = int(self.max_interval - (self.max_interval - self.min_interval) * score)
+        state['next_due'] = now + state['interval']
+        heapq.heappush(self._heap, (state['next_due'], symbol))
+
+    def get_stats(self) -> Dict[str, int]:
+        """各档采集间隔的交易对数量"""
+        hot = sum(1 for state in self._states.values() if state['interval'] <= self.min_interval * 2)
+        cold = sum(1 for state in self._states.values() if state['interval'] >= self.max_interval * 0.9)
+        return {
+            'total': len(self._states),
+            'hot': hot,
+            'cold': cold,
+            'normal': len(self._states) - hot - cold
+        }
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+增量分析缓存
+每个交易对在 <数据目录>/analytics/<SYMBOL>.json 中保存一个很小的状态：
+- 已处理的行数（csv 后端还有已处理到的文件偏移）和最新一行
+- 每个报告周期的窗口起点行（窗口内最旧的一行）及其行号（csv 后端还有文件偏移）
+
+生成报告时只处理上次之后追加的行：最新一行取自新追加的数据；窗口起点只会向后移动，
+从上次的起点向后扫描到新的截止时间即可，扫描量等于两次报告之间流出窗口的行数。
+窗口内行数 = 已处理行数 - 起点行号。报告耗时因此与历史长度无关。
+
+csv 后端按字节偏移读取，文件被重写（数据保留裁剪后原子替换）时 inode 改变，
+该交易对的状态自动重建。其他后端按时间范围读取，存储中的行数与缓存记录不一致
+（发生了裁剪）时检查最旧的窗口起点是否仍然存在，不存在时重建。
+"""
+
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from storage import INT_FIELDS, CsvStore, SnapshotStore, _line_timestamp, parse_timestamp
+
+
+ANALYTICS_CACHE = os.getenv('ANALYTICS_CACHE', 'true').lower() in ('1', 'true', 'yes')
+
+CACHE_DIR_NAME = 'analytics'
+
+CACHE_VERSION = 1
+
+
+class StaleCacheError(Exception):
+    """缓存状态与存储中的数据不一致，需要重建"""
+
+
+def _encode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = {}
+    for field, value in row.items():
+        if isinstance(value, datetime):
+            value = value.isoformat(sep=' ')
+        elif isinstance(value, np.generic):
+            value = value.item()
+        encoded[field] = value
+    return encoded
+
+
+def _decode_row(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    return dict(row, timestamp=pd.Timestamp(row['timestamp']))
+
+
+def _row_time(row: Dict[str, Any]) -> datetime:
+    return parse_timestamp(row['timestamp'])
+
+
+def _parse_csv_row(fields: List[str], line: bytes) -> Dict[str, Any]:
+    values = next(csv.reader([line.decode('utf-8').rstrip('\r\n')]))
+    row = {}
+    for field, value in zip(fields, values):
+        if field == 'timestamp':
+            row[field] = pd.Timestamp(value)
+        elif field == 'symbol':
+            row[field] = value
+        elif value == '':
+            row[field] = np.nan
+        else:
+            row[field] = int(float(value)) if field in INT_FIELDS else float(value)
+    return row
+
+
+def _iter_lines(f, start: int, stop: int, block_size: int = 65536):
+    """逐行读取 [start, stop) 范围内的完整非空行，返回 (行首偏移, 行内容)"""
+    f.seek(start)
+    position = start
+    pending = b''
+    while position < stop:
+        block = f.read(min(block_size, stop - position))
+        if not block:
+            break
+        position += len(block)
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        offset = position - len(pending) - sum(len(line) + 1 for line in lines)
+        for line in lines:
+            if line.strip():
+                yield offset, line
+            offset += len(line) + 1
+
+
+class AnalyticsCache:
+    """每个交易对一个状态文件的增量分析缓存"""
+
+    def __init__(self, store: SnapshotStore, cache_dir: Optional[str] = None):
+        """
+        Args:
+            store: 存储后端
+            cache_dir: 状态文件目录，默认 <数据目录>/analytics
+        """
+        self.store = store
+        self.cache_dir = cache_dir or os.path.join(store.data_dir, CACHE_DIR_NAME)
+        # 带归档的 TieredStore 按时间范围读取，窗口可能跨越热数据和归档
+        self._csv = type(store) is CsvStore
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.cache_dir, f"{symbol}.json")
+
+    def load_state(self, symbol: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(symbol), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('version') != CACHE_VERSION or state.get('csv') != self._csv:
+            return None
+        state['latest'] = _decode_row(state['latest'])
+        for boundary in state['boundaries'].values():
+            boundary['row'] = _decode_row(boundary['row'])
+        return state
+
+    def save_state(self, symbol: str, state: Dict[str, Any]):
+        encoded = dict(state, latest=_encode_row(state['latest']) if state['latest'] else None,
+                       boundaries={hours: dict(boundary, row=_encode_row(boundary['row']) if boundary['row'] else None)
+                                   for hours, boundary in state['boundaries'].items()})
+        tmp_path = f"{self._path(symbol)}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(encoded, f)
+        os.replace(tmp_path, self._path(symbol))
+
+    def invalidate(self, symbol: str):
+        """删除交易对的状态，下次更新时重建"""
+        try:
+            os.remove(self._path(symbol))
+        except FileNotFoundError:
+            pass
+
+    def _new_state(self, horizons: List[int]) -> Dict[str, Any]:
+        return {
+            'version': CACHE_VERSION,
+            'csv': self._csv,
+            'rows': 0,
+            'latest': None,
+            'updated_at': None,
+            'boundaries': {str(hours): {'index': 0, 'row': None, 'offset': None, 'cutoff': None}
+                           for hours in horizons},
+        }
+
+    def _usable(self, state: Optional[Dict[str, Any]], horizons: List[int], now: datetime) -> bool:
+        if state is None:
+            return False
+        for hours in horizons:
+            boundary = state['boundaries'].get(str(hours))
+            if boundary is None:
+                return False
+            # 窗口起点只能向后移动
+            if boundary['cutoff'] and now - timedelta(hours=hours) < parse_timestamp(boundary['cutoff']):
+                return False
+        return True
+
+    def update(self, symbol: str, horizons: List[int], now: Optional[datetime] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        处理上次之后追加的数据并返回各周期的窗口状态
+
+        Returns:
+            {周期小时数: {'oldest': 窗口内最旧的行, 'latest': 最新行, 'data_points': 窗口内行数}}，
+            没有数据时返回空字典
+        """
+        now = now or datetime.now()
+        state = self.load_state(symbol)
+        if not self._usable(state, horizons, now):
+            # 重建时保留已有的周期，交替生成不同周期的报告不会反复重建
+            known = [int(hours) for hours in state['boundaries']] if state else []
+            state = self._new_state(sorted(set(known) | set(horizons)))
+
+        advance = self._advance_csv if self._csv else self._advance_by_time
+        try:
+            state = advance(symbol, state, now)
+        except StaleCacheError:
+            state = advance(symbol, self._new_state([int(hours) for hours in state['boundaries']]), now)
+        if state is None:
+            self.invalidate(symbol)
+            return {}
+
+        state['updated_at'] = now.isoformat(sep=' ')
+        self.save_state(symbol, state)
+
+        windows = {}
+        for hours in horizons:
+            boundary = state['boundaries'][str(hours)]
+            windows[hours] = {
+                'oldest': boundary['row'],
+                'latest': state['latest'],
+                'data_points': state['rows'] - boundary['index'],
+            }
+        return windows
+
+    def _advance_csv(self, symbol: str, state: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
+        """csv 后端：按字节偏移读取追加的行，从上次的起点偏移向后扫描窗口起点"""
+        path = self.store._path(symbol)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        with open(path, 'rb') as f:
+            header = f.readline()
+            fields = next(csv.reader([header.decode('utf-8').rstrip('\r\n')]))
+
+            if state['latest'] is None:
+                state.update(offset=len(header), inode=stat.st_ino)
+                for boundary in state['boundaries'].values():
+                    boundary['offset'] = len(header)
+            elif state.get('inode') != stat.st_ino or stat.st_size < state['offset']:
+                raise StaleCacheError(symbol)
+
+            # 新追加的完整行：只统计行数并解析最后一行
+            last_line = None
+            for offset, line in _iter_lines(f, state['offset'], stat.st_size):
+                state['rows'] += 1
+                state['offset'] = offset + len(line) + 1
+                last_line = line
+            if last_line is not None:
+                state['latest'] = _parse_csv_row(fields, last_line)
+            if state['latest'] is None:
+                return None
+
+            for hours, boundary in state['boundaries'].items():
+                cutoff = now - timedelta(hours=int(hours))
+                boundary['cutoff'] = cutoff.isoformat(sep=' ')
+                if boundary['row'] is not None and _row_time(boundary['row']) >= cutoff:
+                    continue
+
+                # 从旧起点向后找第一行不早于截止时间的行，只解析它的时间戳
+                index = boundary['index']
+                found = None
+                for offset, line in _iter_lines(f, boundary['offset'], state['offset']):
+                    timestamp = _line_timestamp(line)
+                    if timestamp is not None and timestamp >= cutoff:
+                        found = (offset, line)
+                        break
+                    index += 1
+
+                if found is None:
+                    boundary.update(index=state['rows'], offset=state['offset'], row=None)
+                else:
+                    boundary.update(index=index, offset=found[0], row=_parse_csv_row(fields, found[1]))
+        return state
+
+    def _read(self, symbol: str, start: datetime, end: Optional[datetime] = None) -> pd.DataFrame:
+        df = self.store.read(symbol, start=start, end=end)
+        return df if df is not None else pd.DataFrame(columns=['timestamp'])
+
+    def _advance_by_time(self, symbol: str, state: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
+        """其他后端：按时间范围读取追加的行和流出窗口的行"""
+        rebuilding = state['latest'] is None
+        if rebuilding:
+            # 最长周期之前的历史与报告无关，行号从最长窗口的起点开始计
+            longest = max(int(hours) for hours in state['boundaries'])
+            new_rows = self._read(symbol, now - timedelta(hours=longest))
+            old_latest = None
+        else:
+            old_latest = _row_time(state['latest'])
+            new_rows = self._read(symbol, old_latest)
+            new_rows = new_rows[new_rows['timestamp'] > pd.Timestamp(old_latest)].reset_index(drop=True)
+            self._check_trimmed(symbol, state, len(new_rows))
+
+        base_index = state['rows']
+        state['rows'] += len(new_rows)
+        if len(new_rows):
+            state['latest'] = new_rows.iloc[-1].to_dict()
+        if state['latest'] is None:
+            return None
+        state['store_rows'] = self.store.usage().get(symbol)['rows']
+
+        new_times = new_rows['timestamp'].to_numpy(dtype='datetime64[ns]')
+        for hours, boundary in state['boundaries'].items():
+            cutoff = now - timedelta(hours=int(hours))
+            boundary['cutoff'] = cutoff.isoformat(sep=' ')
+            if boundary['row'] is not None and _row_time(boundary['row']) >= cutoff:
+                continue
+
+            found = None
+            index = boundary['index']
+            if boundary['row'] is not None:
+                index, found = self._scan_old_rows(symbol, boundary, cutoff, old_latest, state['updated_at'], now)
+
+            if found is None:
+                # 起点在本次新追加的行中
+                position = int(np.searchsorted(new_times, np.datetime64(pd.Timestamp(cutoff).as_unit('ns'))))
+                if position < len(new_rows):
+                    index, found = base_index + position, new_rows.iloc[position].to_dict()
+                else:
+                    index = state['rows']
+            boundary.update(index=index, row=found)
+        return state
+
+    def _check_trimmed(self, symbol: str, state: Dict[str, Any], appended: int):
+        """存储行数与缓存记录不一致时，确认最旧的窗口起点行仍然存在"""
+        expected = state.get('store_rows')
+        if expected is not None and self.store.usage().get(symbol)['rows'] == expected + appended:
+            return
+        rows = [boundary['row'] for boundary in state['boundaries'].values() if boundary['row'] is not None]
+        if not rows:
+            return
+        oldest = min(_row_time(row) for row in rows)
+        if len(self._read(symbol, oldest, oldest)) == 0:
+            raise StaleCacheError(symbol)
+
+    def _scan_old_rows(self, symbol: str, boundary: Dict[str, Any], cutoff: datetime,
+                       old_latest: datetime, updated_at: Optional[str], now: datetime):
+        """
+        在上次已处理的行中把窗口起点移到 cutoff 之后
+
+        Returns:
+            (新起点行号, 新起点行)，起点不在已处理的行中时行为None（行号为已处理行之后）
+        """
+        start = _row_time(boundary['row'])
+        skipped = self._read(symbol, start, cutoff)
+        if len(skipped) == 0 or skipped['timestamp'].iloc[0] != pd.Timestamp(start):
+            raise StaleCacheError(symbol)
+
+        after = skipped[skipped['timestamp'] >= pd.Timestamp(cutoff)]
+        index = boundary['index'] + len(skipped) - len(after)
+        if len(after):
+            return index, after.iloc[0].to_dict()
+        if old_latest <= cutoff:
+            return index, None
+
+        # 截止时间之后的第一行：从上次报告的间隔开始逐步扩大读取范围
+        step = now - parse_timestamp(updated_at) if updated_at else timedelta(minutes=1)
+        step = max(step, timedelta(minutes=1))
+        while True:
+            end = min(cutoff + step, old_latest)
+            rows = self._read(symbol, cutoff, end)
+            if len(rows):
+                return index, rows.iloc[0].to_dict()
+            if end >= old_latest:
+                return index, None
+            step *= 2
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+冷数据归档层
+把超过保留期的历史快照从数据目录移到单独的归档目录，保存为 zstd 压缩的
+Parquet 列式文件（每个交易对每月一个文件）。每次归档只为本批数据写一个新的
+分块文件，不重写已有文件；数据保留线程在后台把分块合并进月度文件（compact）。
+行情数据的小数位数是固定的，
+浮点列按小数位数无损放大为整数，与时间戳、整数列一起做差分编码；无法放大
+的浮点列使用字典编码。放大倍数记录在文件元数据中，读取时还原为相同的浮点值。
+
+TieredStore 把热数据（存储后端）和冷数据（归档）组合成一份完整的历史，
+DataAnalyzer 通过它读取时无需关心数据位于哪一层。归档由数据保留引擎在
+裁剪前执行，先写入归档再删除热数据，中途崩溃最多产生重复行，读取时按时间去重。
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from storage import SNAPSHOT_FIELDS, SnapshotStore, arrow_schema, parse_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    pq = None
+
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+
+ZSTD_LEVEL = 9
+
+# 浮点列最多按多少位小数放大为整数
+MAX_DECIMALS = 10
+
+# 放大后的整数必须能被float64精确表示
+MAX_SCALED = 2 ** 53
+
+# 一个月份的分块文件达到该数量时合并进月度文件
+COMPACT_PARTS = 24
+
+# 月份的分块文件超过该时长没有新增时合并（该月份已不再接收归档数据）
+COMPACT_IDLE_SECONDS = 24 * 3600
+
+
+def decimal_places(values: np.ndarray) -> Optional[int]:
+    """能把整列无损放大为整数的最少小数位数，无法做到时返回None"""
+    if len(values) == 0 or not np.isfinite(values).all():
+        return None
+    for decimals in range(MAX_DECIMALS + 1):
+        scaled = np.round(values * 10 ** decimals)
+        if np.abs(scaled).max() >= MAX_SCALED:
+            return None
+        if np.array_equal(scaled / 10 ** decimals, values):
+            return decimals
+    return None
+
+
+def is_available() -> bool:
+    """pyarrow是否可用（归档需要）"""
+    return pq is not None
+
+
+class ColdArchive:
+    """按交易对和月份分区的 Parquet 归档
+
+    archive/<SYMBOL>/<YYYY-MM>.parquet 为合并后的月度文件，
+    archive/<SYMBOL>/<YYYY-MM>.<序号>.part.parquet 为尚未合并的归档批次。
+    """
+
+    SUFFIX = '.parquet'
+    PART_SUFFIX = '.part.parquet'
+
+    def __init__(self, archive_dir: str = "archive", fields: Optional[List[str]] = None):
+        if not is_available():
+            raise RuntimeError("数据归档需要安装 pyarrow: pip install pyarrow")
+
+        self.archive_dir = archive_dir
+        self.fields = list(fields or SNAPSHOT_FIELDS)
+        self._lock = threading.Lock()
+        self._ranges: Dict[str, tuple] = {}  # 文件路径 -> (修改时间, 最早时间, 最晚时间)
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def _symbol_dir(self, symbol: str) -> str:
+        return os.path.join(self.archive_dir, symbol)
+
+    def _files(self, symbol: str) -> Dict[str, List[str]]:
+        """{月份: [月度文件和分块文件的路径]}，每个月份内月度文件在前、分块按写入顺序"""
+        symbol_dir = self._symbol_dir(symbol)
+        if not os.path.isdir(symbol_dir):
+            return {}
+        files: Dict[str, List[str]] = {}
+        for name in sorted(os.listdir(symbol_dir)):
+            if not name.endswith(self.SUFFIX):
+                continue
+            files.setdefault(name[:7], []).append(os.path.join(symbol_dir, name))
+        for paths in files.values():
+            paths.sort(key=lambda path: (path.endswith(self.PART_SUFFIX), path))
+        return files
+
+    def _months(self, symbol: str) -> List[str]:
+        return sorted(self._files(symbol))
+
+    def _path(self, symbol: str, month: str) -> str:
+        return os.path.join(self._symbol_dir(symbol), f"{month}{self.SUFFIX}")
+
+    def _part_path(self, symbol: str, month: str) -> str:
+        # 纳秒时间戳作为序号，文件名的字典序即写入顺序
+        return os.path.join(self._symbol_dir(symbol), f"{month}.{time.time_ns():020d}{self.PART_SUFFIX}")
+
+    def _month_range(self, paths: List[str]) -> tuple:
+        """一个月份所有文件的时间范围"""
+        ranges = [self._time_range(path) for path in paths]
+        lows = [low for low, _ in ranges if low is not None]
+        highs = [high for _, high in ranges if high is not None]
+        return (min(lows) if lows else None), (max(highs) if highs else None)
+
+    def _time_range(self, path: str) -> tuple:
+        """从Parquet文件尾的列统计信息读取时间范围，不读取数据"""
+        mtime = os.path.getmtime(path)
+        cached = self._ranges.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        metadata = pq.ParquetFile(path).metadata
+        column = metadata.schema.to_arrow_schema().get_field_index('timestamp')
+        lows, highs = [], []
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(column).statistics
+            if stats is not None and stats.has_min_max:
+                lows.append(pd.Timestamp(stats.min))
+                highs.append(pd.Timestamp(stats.max))
+        low = min(lows) if lows else None
+        high = max(highs) if highs else None
+        self._ranges[path] = (mtime, low, high)
+        return low, high
+
+    def _write_table(self, path: str, df: pd.DataFrame):
+        # 只保存数据中实际存在的字段（binance_monitor_auto 只采集基础字段）
+        fields = [field for field in self.fields if field in df.columns]
+        table = pa.Table.from_pandas(df[fields], schema=arrow_schema(fields), preserve_index=False)
+
+        scales = {}
+        dictionary_fields = []
+        for field in fields:
+            if not pa.types.is_floating(table.schema.field(field).type):
+                continue
+            values = table.column(field).to_numpy()
+            decimals = decimal_places(values)
+            if decimals is None:
+                dictionary_fields.append(field)
+                continue
+            scales[field] = decimals
+            scaled = pa.array(np.round(values * 10 ** decimals).astype(np.int64))
+            table = table.set_column(table.schema.get_field_index(field), field, scaled)
+
+        encodings = {field: 'DELTA_BINARY_PACKED' for field in fields if field not in dictionary_fields}
+        table = table.replace_schema_metadata({'decimal_scales': json.dumps(scales)})
+
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression='zstd', compression_level=ZSTD_LEVEL,
+                       use_dictionary=dictionary_fields, column_encoding=encodings)
+        os.replace(tmp_path, path)
+
+    def _read_file(self, path: str) -> pd.DataFrame:
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        scales = json.loads(metadata.get(b'decimal_scales', b'{}'))
+
+        df = table.to_pandas()
+        for field, decimals in scales.items():
+            df[field] = df[field].to_numpy(dtype=np.float64) / 10 ** decimals
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return df
+
+    def _read_month(self, paths: List[str]) -> pd.DataFrame:
+        """读取一个月份的全部文件，按时间去重（后写入的优先）并排序"""
+        df = pd.concat([self._read_file(path) for path in paths], ignore_index=True)
+        return df.drop_duplicates('timestamp', keep='last').sort_values('timestamp', kind='stable')
+
+    def write(self, symbol: str, df: pd.DataFrame) -> int:
+        """把数据按月份写成新的分块文件（不读取、不重写已有文件），返回写入的行数"""
+        if df is None or len(df) == 0:
+            return 0
+
+        df = df.copy()
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        with self._lock:
+            os.makedirs(self._symbol_dir(symbol), exist_ok=True)
+            for month, rows in df.groupby(df['timestamp'].dt.strftime('%Y-%m')):
+                rows = rows.drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+                self._write_table(self._part_path(symbol, month), rows)
+        return len(df)
+
+    def compact(self, symbol: str, limiter=None, now: Optional[float] = None) -> int:
+        """
+        把分块文件合并进月度文件，返回合并的分块数
+
+        分块数达到 COMPACT_PARTS，或最近一个分块已超过 COMPACT_IDLE_SECONDS（该月份不再
+        接收归档数据）时才合并，每个月份的月度文件只被重写有限次。
+        """
+        now = time.time() if now is None else now
+        merged = 0
+        for month, paths in self._files(symbol).items():
+            parts = [path for path in paths if path.endswith(self.PART_SUFFIX)]
+            if not parts:
+                continue
+            if len(parts) < COMPACT_PARTS and now - os.path.getmtime(parts[-1]) < COMPACT_IDLE_SECONDS:
+                continue
+
+            if limiter is not None:
+                limiter.consume(sum(os.path.getsize(path) for path in paths))
+
+            with self._lock:
+                # 先写入合并后的月度文件，再删除分块；中途崩溃时只会留下重复行，读取时去重
+                self._write_table(self._path(symbol, month), self._read_month(paths))
+                for path in parts:
+                    os.remove(path)
+                    self._ranges.pop(path, None)
+            merged += len(parts)
+        return merged
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        """读取归档数据（按时间升序），只打开时间范围重叠的月份文件；没有归档时返回None"""
+        start = pd.Timestamp(parse_timestamp(start)) if start is not None else None
+        end = pd.Timestamp(parse_timestamp(end)) if end is not None else None
+
+        # 读取期间分块可能被合并删除，此时重新获取文件列表
+        for _ in range(3):
+            files = self._files(symbol)
+            if not files:
+                return None
+            try:
+                frames = self._read_range(files, last_n, start, end)
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            return None
+
+        if not frames:
+            return pd.DataFrame(columns=self.fields)
+
+        df = pd.concat(frames[::-1], ignore_index=True)
+        if last_n is not None:
+            df = df.tail(last_n)
+        return df.reset_index(drop=True)
+
+    def _read_range(self, files: Dict[str, List[str]], last_n: Optional[int],
+                    start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> List[pd.DataFrame]:
+        """从最新的月份向前读取与时间范围重叠的月份，返回按时间倒序的各月数据"""
+        frames = []
+        rows = 0
+        for month in sorted(files, reverse=True):
+            paths = files[month]
+            low, high = self._month_range(paths)
+            if start is not None and high is not None and high < start:
+                break
+            if end is not None and low is not None and low > end:
+                continue
+
+            df = self._read_month(paths)
+            if start is not None:
+                df = df[df['timestamp'] >= start]
+            if end is not None:
+                df = df[df['timestamp'] <= end]
+            frames.append(df)
+            rows += len(df)
+            if last_n is not None and rows >= last_n:
+                break
+        return frames
+
+    def symbols(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.archive_dir) if self._months(name))
+
+    def total_size(self) -> int:
+        total_size = 0
+        for symbol in self.symbols():
+            for paths in self._files(symbol).values():
+                for path in paths:
+                    try:
+                        total_size += os.path.getsize(path)
+                    except OSError:
+                        continue
+        return total_size
+
+    def file_count(self) -> int:
+        return sum(len(paths) for symbol in self.symbols() for paths in self._files(symbol).values())
+
+
+class TieredStore(SnapshotStore):
+    """热数据（存储后端）+ 冷数据（归档）的统一读取视图，写入和裁剪只作用于热数据"""
+
+    def __init__(self, hot: SnapshotStore, archive: ColdArchive):
+        self.hot = hot
+        self.archive = archive
+        self.data_dir = hot.data_dir
+        self.fields = hot.fields
+
+    def append(self, symbol: str, data: Dict[str, Any]):
+        self.hot.append(symbol, data)
+
+    def append_many(self, snapshots: Dict[str, Dict[str, Any]]):
+        self.hot.append_many(snapshots)
+
+    def batch(self):
+        return self.hot.batch()
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        hot_df = self.hot.read(symbol, last_n=last_n, start=start, end=end)
+        if last_n is not None and hot_df is not None and len(hot_df) >= last_n:
+            return hot_df
+
+        # 冷数据只需要补足热数据之前的部分
+        cold_end = end
+        if hot_df is not None and len(hot_df):
+            oldest = hot_df['timestamp'].iloc[0]
+            cold_end = oldest if end is None else min(pd.Timestamp(end), oldest)
+        cold_last_n = last_n - len(hot_df) if last_n is not None and hot_df is not None else last_n
+        cold_df = self.archive.read(symbol, last_n=cold_last_n, start=start, end=cold_end)
+
+        frames = [df for df in (cold_df, hot_df) if df is not None and len(df)]
+        if not frames:
+            return hot_df if hot_df is not None else cold_df
+
+        df = pd.concat(frames, ignore_index=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+        return self._select(df, last_n, start, end)
+
+    def symbols(self) -> List[str]:
+        return sorted(set(self.hot.symbols()) | set(self.archive.symbols()))
+
+    def needs_trim(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> bool:
+        return self.hot.needs_trim(symbol, max_rows, before)
+
+    def trim(self, symbol: str, max_rows: Optional[int] = None, before: Optional[datetime] = None,
+             limiter=None) -> int:
+        return self.hot.trim(symbol, max_rows, before, limiter)
+
+    def compact(self, symbol: str, limiter=None) -> int:
+        return self.hot.compact(symbol, limiter)
+
+    def usage(self):
+        return self.hot.usage()
+
+    def total_size(self) -> int:
+        """热数据大小（数据目录清理阈值只针对热数据）"""
+        return self.hot.total_size()
+
+    def file_count(self) -> int:
+        return self.hot.file_count()
+
+    def storage_breakdown(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.hot.storage_breakdown(top)
+
+
+_default_archive: Optional[ColdArchive] = None
+
+
+def get_default_archive() -> Optional[ColdArchive]:
+    """按环境变量 ARCHIVE_DIR 创建的进程共享归档，未配置或缺少pyarrow时返回None"""
+    global _default_archive
+    if _default_archive is None and ARCHIVE_DIR:
+        if not is_available():
+            print("⚠️ 未安装 pyarrow，数据归档不可用")
+            return None
+        _default_archive = ColdArchive(ARCHIVE_DIR)
+    return _default_archive
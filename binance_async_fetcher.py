@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Binance Futures fetch engine
+
+Fetches every snapshot endpoint for many symbols concurrently with aiohttp.
+Requests go through weight-aware token buckets so that throughput stays as
+high as possible without tripping Binance's 429 (rate limit) / 418 (IP ban)
+responses:
+
+- /fapi/* endpoints share the 2400 weight per minute IP budget. The bucket is
+  resynchronised from the X-MBX-USED-WEIGHT-1M response header.
+- /futures/data/* endpoints have their own 1000 requests per 5 minutes budget.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+from ratio_fetcher import RATIO_ENDPOINTS, PeriodRatioCache
+
+
+# Request weight of each endpoint (see Binance USDⓈ-M Futures API docs)
+ENDPOINT_WEIGHTS = {
+    "/fapi/v1/premiumIndex": 1,
+    "/fapi/v1/fundingRate": 1,
+    "/fapi/v1/openInterest": 1,
+    "/fapi/v1/indexInfo": 1,
+    "/fapi/v1/exchangeInfo": 1,
+    "/futures/data/globalLongShortAccountRatio": 1,
+    "/futures/data/topLongShortAccountRatio": 1,
+    "/futures/data/topLongShortPositionRatio": 1,
+    "/futures/data/takerlongshortRatio": 1,
+}
+
+# Weight of endpoints called without a symbol parameter
+MARKET_WIDE_WEIGHTS = {
+    "/fapi/v1/premiumIndex": 10,
+}
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+
+def is_available() -> bool:
+    """Return True if the async engine can be used (aiohttp is installed)"""
+    return aiohttp is not None
+
+
+def endpoint_weight(path: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """Get the request weight of an endpoint call"""
+    if not (params or {}).get("symbol") and path in MARKET_WIDE_WEIGHTS:
+        return MARKET_WIDE_WEIGHTS[path]
+    return ENDPOINT_WEIGHTS.get(path, 1)
+
+
+class WeightRateLimiter:
+    """Token bucket that tracks request weight over a rolling interval"""
+
+    def __init__(self, limit: int, interval: float = 60.0, safety_ratio: float = 0.9):
+        """
+        Args:
+            limit: Weight allowed per interval by the exchange
+            interval: Length of the interval in seconds
+            safety_ratio: Fraction of the limit we allow ourselves to use
+        """
+        self.limit = limit
+        self.interval = interval
+        self.capacity = max(1.0, limit * safety_ratio)
+        self.refill_rate = self.capacity / interval
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    async def acquire(self, weight: int = 1):
+        """Wait until `weight` tokens are available and consume them"""
+        # The limiter outlives a single asyncio.run(), so rebind the lock per loop
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+
+                await asyncio.sleep((weight - self.tokens) / self.refill_rate)
+
+    def update_used_weight(self, used_weight: int):
+        """Resynchronise the bucket with the weight the server reports as used"""
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used_weight)
+
+    def block(self, seconds: float):
+        """Stop issuing requests for the given number of seconds (429/418)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class AsyncBinanceFetcher:
+    """Concurrent fetcher for per-symbol snapshot endpoints"""
+
+    def __init__(self, base_url: str = "https://fapi.binance.com", max_concurrency: int = 20,
+                 timeout: float = 10, max_retries: int = 3, ratio_cache: Optional[PeriodRatioCache] = None):
+        self.base_url = base_url
+        self.ratio_cache = ratio_cache
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        # /fapi/* weight budget and /futures/data/* request budget
+        self.fapi_limiter = WeightRateLimiter(limit=2400, interval=60)
+        self.futures_data_limiter = WeightRateLimiter(limit=1000, interval=300)
+
+    def _limiter_for(self, path: str) -> WeightRateLimiter:
+        if path.startswith("/futures/data/"):
+            return self.futures_data_limiter
+        return self.fapi_limiter
+
+    async def fetch_json(self, session: "aiohttp.ClientSession", semaphore: asyncio.Semaphore,
+                         path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Fetch one endpoint, honouring rate limits. Returns None on failure."""
+        limiter = self._limiter_for(path)
+        weight = endpoint_weight(path, params)
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(weight)
+
+            try:
+                async with semaphore:
+                    async with session.get(url, params=params) as response:
+                        used_weight = response.headers.get(USED_WEIGHT_HEADER)
+                        if used_weight is not None and limiter is self.fapi_limiter:
+                            limiter.update_used_weight(int(used_weight))
+
+                        if response.status in (418, 429):
+                            retry_after = float(response.headers.get("Retry-After", 60))
+                            limiter.block(retry_after)
+                            print(f"Rate limited ({response.status}) on {path}, backing off {retry_after:.0f}s")
+                            continue
+
+                        if 400 <= response.status < 500:
+                            print(f"Error fetching {path} {params or ''}: HTTP {response.status}")
+                            return None
+
+                        response.raise_for_status()
+                        return await response.json()
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    print(f"Error fetching {path} {params or ''}: {e}")
+                    return None
+                await asyncio.sleep(0.5 * (2 ** attempt))
+
+        return None
+
+    async def fetch_symbol(self, session: "aiohttp.ClientSession", semaphore: asyncio.Semaphore,
+                           symbol: str, period: str = "5m") -> Dict[str, Any]:
+        """Fetch all snapshot endpoints for one symbol concurrently
+
+        Ratio endpoints that are still cached for the current period are
+        skipped; stale ones back-fill any periods missed since the last fetch
+        into the cache history. A failed ratio request yields an empty row,
+        not a stale one.
+        """
+        requests_by_key = {
+            "mark": ("/fapi/v1/premiumIndex", {"symbol": symbol}),
+            "funding": ("/fapi/v1/fundingRate", {"symbol": symbol, "limit": 1}),
+            "oi": ("/fapi/v1/openInterest", {"symbol": symbol}),
+        }
+        for field, endpoint in RATIO_ENDPOINTS.items():
+            limit = 1
+            if self.ratio_cache is not None:
+                if self.ratio_cache.get(endpoint, symbol, period) is not None:
+                    continue
+                limit = self.ratio_cache.backfill_limit(endpoint, symbol, period)
+            requests_by_key[field] = (f"/futures/data/{endpoint}", {"symbol": symbol, "period": period, "limit": limit})
+
+        keys = list(requests_by_key)
+        results = await asyncio.gather(*[
+            self.fetch_json(session, semaphore, *requests_by_key[key]) for key in keys
+        ])
+        raw = dict(zip(keys, results))
+
+        def latest_ratio(field: str) -> Dict[str, Any]:
+            endpoint = RATIO_ENDPOINTS[field]
+            rows = raw.get(field)
+            if self.ratio_cache is not None:
+                if isinstance(rows, list):
+                    self.ratio_cache.put(endpoint, symbol, period, rows)
+                return self.ratio_cache.get(endpoint, symbol, period) or {}
+            return rows[-1] if isinstance(rows, list) and rows else {}
+
+        funding = raw["funding"]
+        ratios = {field: latest_ratio(field) for field in RATIO_ENDPOINTS}
+
+        return {
+            "mark": raw["mark"] or {},
+            "funding": funding[0] if isinstance(funding, list) and funding else {},
+            "oi": raw["oi"] or {},
+            "ratios": {field: ratios[field] for field in RATIO_ENDPOINTS if field != "taker_buy_sell_ratio"},
+            "taker": ratios["taker_buy_sell_ratio"],
+        }
+
+    async def fetch_symbols(self, symbols: List[str], period: str = "5m") -> Dict[str, Dict[str, Any]]:
+        """Fetch raw endpoint data for all symbols concurrently"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit_per_host=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            results = await asyncio.gather(*[
+                self.fetch_symbol(session, semaphore, symbol, period) for symbol in symbols
+            ], return_exceptions=True)
+
+        raw_by_symbol = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                print(f"Error fetching data snapshot for {symbol}: {result}")
+                continue
+            raw_by_symbol[symbol] = result
+
+        return raw_by_symbol
+
+    def run(self, symbols: List[str], period: str = "5m") -> Dict[str, Dict[str, Any]]:
+        """Synchronous entry point: run fetch_symbols on a fresh event loop"""
+        return asyncio.run(self.fetch_symbols(symbols, period))
@@ -16,16 +16,51 @@ This script fetches key metrics for Binance perpetual futures USDT trading pairs
 """
 
 import requests
+import http_client
 import json
 import time
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+import binance_async_fetcher
+from binance_async_fetcher import AsyncBinanceFetcher
+from ratio_fetcher import RATIO_ENDPOINTS, RatioFetcher, get_default_ratio_cache
+
+
+class RequestCycle:
+    """Per-cycle request plan
+
+    Every endpoint response is fetched at most once per collection cycle and
+    shared by all fields derived from it. Whole-market lists (e.g. indexInfo)
+    are fetched once and indexed by symbol.
+    """
 
-class BinanceDataSnapshot:
     def __init__(self):
+        self._responses: Dict[Tuple, Any] = {}
+        self._market_lists: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def get(self, key: Tuple, fetch: Callable[[], Any]) -> Any:
+        """Return the cached response for `key`, fetching it on first use"""
+        if key not in self._responses:
+            self._responses[key] = fetch()
+        return self._responses[key]
+
+    def market_list(self, name: str, fetch: Callable[[], List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """Return a whole-market list indexed by symbol, fetching it on first use"""
+        if name not in self._market_lists:
+            self._market_lists[name] = {item["symbol"]: item for item in fetch() if "symbol" in item}
+        return self._market_lists[name]
+
+
+class BinanceDataSnapshot:
+    def __init__(self, max_concurrency: int = 20):
         self.base_url = "https://fapi.binance.com"
         self.futures_data_url = "https://fapi.binance.com/futures/data"
+        self.max_concurrency = max_concurrency
+        self.ratio_cache = get_default_ratio_cache()
+        self.ratio_fetcher = RatioFetcher(base_url=self.futures_data_url, cache=self.ratio_cache)
+        self.async_fetcher = AsyncBinanceFetcher(base_url=self.base_url, max_concurrency=max_concurrency,
+                                                 ratio_cache=self.ratio_cache)
 
     def get_mark_price(self, symbol: str) -> Dict[str, Any]:
         """Get mark price and funding rate for a symbol"""
@@ -33,35 +68,47 @@ class BinanceDataSnapshot:
         params = {"symbol": symbol}
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             print(f"Error fetching mark price for {symbol}: {e}")
             return {}
 
-    def get_index_price(self, symbol: str) -> Optional[float]:
-        """Get index price for a symbol"""
-        # For USDT perpetual contracts, the index price is often available in the premiumIndex endpoint
-        mark_data = self.get_mark_price(symbol)
-        if mark_data and "indexPrice" in mark_data:
-            return float(mark_data["indexPrice"])
-
-        # Fallback to indexInfo endpoint
+    def get_index_info(self) -> List[Dict[str, Any]]:
+        """Get the composite index list for the whole market"""
         url = f"{self.base_url}/fapi/v1/indexInfo"
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
-            data = response.json()
-
-            # Find the symbol in the composite index data
-            for item in data:
-                if item.get("symbol") == symbol:
-                    return float(item.get("indexPrice", 0))
-            return None
+            return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching index price for {symbol}: {e}")
+            print(f"Error fetching index info: {e}")
+            return []
+
+    def get_index_price(self, symbol: str, mark_data: Optional[Dict[str, Any]] = None,
+                        cycle: Optional[RequestCycle] = None) -> Optional[float]:
+        """Get index price for a symbol
+
+        Args:
+            symbol: Trading pair
+            mark_data: premiumIndex response already fetched for this symbol
+            cycle: Request plan shared by the current collection cycle
+        """
+        cycle = cycle or RequestCycle()
+
+        # For USDT perpetual contracts, the index price is often available in the premiumIndex endpoint
+        if mark_data is None:
+            mark_data = cycle.get(("premiumIndex", symbol), lambda: self.get_mark_price(symbol))
+        if mark_data and "indexPrice" in mark_data:
+            return float(mark_data["indexPrice"])
+
+        # Fallback to indexInfo endpoint, downloaded once per cycle
+        index_info = cycle.market_list("indexInfo", self.get_index_info)
+        item = index_info.get(symbol)
+        if item is None:
             return None
+        return float(item.get("indexPrice", 0))
 
     def calculate_basis(self, mark_price: float, index_price: float) -> Dict[str, float]:
         """Calculate basis and basis percentage"""
@@ -82,7 +129,7 @@ class BinanceDataSnapshot:
         params = {"symbol": symbol, "limit": 1}
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             return data[0] if data else {}
@@ -96,7 +143,7 @@ class BinanceDataSnapshot:
         params = {"symbol": symbol}
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -104,66 +151,48 @@ class BinanceDataSnapshot:
             return {}
 
     def get_long_short_ratio(self, symbol: str, period: str = "5m", limit: int = 1) -> Dict[str, Any]:
-        """Get long/short ratio data for different categories"""
-
-        def fetch_ratio(endpoint: str) -> List[Dict]:
-            url = f"{self.futures_data_url}/{endpoint}"
-            params = {
-                "symbol": symbol,
-                "period": period,
-                "limit": limit
-            }
-
-            try:
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                return response.json()
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching {endpoint} for {symbol}: {e}")
-                return []
+        """Get long/short ratio data for different categories
 
-        # Fetch all ratio types
-        account_ratio = fetch_ratio("globalLongShortAccountRatio")
-        top_account_ratio = fetch_ratio("topLongShortAccountRatio")
-        top_position_ratio = fetch_ratio("topLongShortPositionRatio")
+        The latest values (limit=1) are served from the period-aligned ratio
+        cache and only requested again after the next period boundary.
+        """
+        fields = ["long_short_account_ratio", "top_trader_account_ls_ratio", "top_trader_position_ls_ratio"]
 
-        return {
-            "long_short_account_ratio": account_ratio[0] if account_ratio else {},
-            "top_trader_account_ls_ratio": top_account_ratio[0] if top_account_ratio else {},
-            "top_trader_position_ls_ratio": top_position_ratio[0] if top_position_ratio else {}
-        }
+        if limit == 1:
+            return self.ratio_fetcher.fetch([symbol], period, fields=fields)[symbol]
+
+        def fetch_ratio(field: str) -> List[Dict]:
+            return self.ratio_fetcher.fetch_rows(RATIO_ENDPOINTS[field], symbol, period, limit) or []
+
+        # Fetch all ratio types
+        results = {field: fetch_ratio(field) for field in fields}
+        return {field: rows[0] if rows else {} for field, rows in results.items()}
 
     def get_taker_buy_sell_ratio(self, symbol: str, period: str = "5m", limit: int = 1) -> Dict[str, Any]:
-        """Get taker buy/sell volume ratio"""
-        url = f"{self.futures_data_url}/takerlongshortRatio"
-        params = {
-            "symbol": symbol,
-            "period": period,
-            "limit": limit
-        }
+        """Get taker buy/sell volume ratio (latest value served from the ratio cache)"""
+        if limit == 1:
+            return self.ratio_fetcher.fetch([symbol], period, fields=["taker_buy_sell_ratio"])[symbol]["taker_buy_sell_ratio"]
 
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return data[0] if data else {}
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching taker buy/sell ratio for {symbol}: {e}")
-            return {}
+        data = self.ratio_fetcher.fetch_rows(RATIO_ENDPOINTS["taker_buy_sell_ratio"], symbol, period, limit)
+        return data[0] if data else {}
+
+    def get_data_snapshot(self, symbol: str, cycle: Optional[RequestCycle] = None) -> Dict[str, Any]:
+        """Get complete data snapshot for a symbol
 
-    def get_data_snapshot(self, symbol: str) -> Dict[str, Any]:
-        """Get complete data snapshot for a symbol"""
+        Args:
+            symbol: Trading pair
+            cycle: Request plan shared by the current collection cycle; a new
+                one is used when omitted
+        """
         print(f"Fetching data snapshot for {symbol}...")
+        cycle = cycle or RequestCycle()
 
-        # Get mark price and funding rate
-        mark_data = self.get_mark_price(symbol)
+        # Get mark price and funding rate (premiumIndex is fetched once and reused for the index price)
+        mark_data = cycle.get(("premiumIndex", symbol), lambda: self.get_mark_price(symbol))
         mark_price = float(mark_data.get("markPrice", 0)) if mark_data else 0
 
         # Get index price
-        index_price = self.get_index_price(symbol) or 0
-
-        # Calculate basis
-        basis_data = self.calculate_basis(mark_price, index_price)
+        index_price = self.get_index_price(symbol, mark_data=mark_data, cycle=cycle) or 0
 
         # Get funding rate
         funding_data = self.get_funding_rate(symbol)
@@ -177,7 +206,14 @@ class BinanceDataSnapshot:
         # Get taker buy/sell ratio
         taker_data = self.get_taker_buy_sell_ratio(symbol)
 
-        # Compile complete snapshot
+        return self.build_snapshot(symbol, mark_price, index_price, funding_data, oi_data, ratio_data, taker_data)
+
+    def build_snapshot(self, symbol: str, mark_price: float, index_price: float,
+                       funding_data: Dict[str, Any], oi_data: Dict[str, Any],
+                       ratio_data: Dict[str, Any], taker_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compile a snapshot from raw endpoint responses"""
+        basis_data = self.calculate_basis(mark_price, index_price)
+
         snapshot = {
             "symbol": symbol,
             "timestamp": datetime.now().isoformat(),
@@ -197,11 +233,23 @@ class BinanceDataSnapshot:
         return snapshot
 
     def get_multiple_symbols_snapshot(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
-        """Get data snapshot for multiple symbols"""
+        """Get data snapshot for multiple symbols
+
+        Uses the asyncio engine to fetch every endpoint for every symbol
+        concurrently when aiohttp is installed, otherwise falls back to
+        fetching symbols one at a time.
+        """
+        if binance_async_fetcher.is_available():
+            return self.get_multiple_symbols_snapshot_async(symbols)
+
         snapshots = {}
+        cycle = RequestCycle()
+
+        # Fetch all ratio endpoints for all symbols concurrently into the ratio cache
+        self.ratio_fetcher.fetch(symbols)
 
         for symbol in symbols:
-            snapshot = self.get_data_snapshot(symbol)
+            snapshot = self.get_data_snapshot(symbol, cycle=cycle)
             snapshots[symbol] = snapshot
 
             # Add small delay to avoid rate limiting
@@ -209,6 +257,29 @@ class BinanceDataSnapshot:
 
         return snapshots
 
+    def get_multiple_symbols_snapshot_async(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch snapshots for all symbols concurrently with rate limiting"""
+        print(f"Fetching data snapshots for {len(symbols)} symbols concurrently...")
+
+        raw_by_symbol = self.async_fetcher.run(symbols)
+        cycle = RequestCycle()
+
+        snapshots = {}
+        for symbol in symbols:
+            raw = raw_by_symbol.get(symbol)
+            if raw is None:
+                continue
+
+            mark_data = raw["mark"]
+            mark_price = float(mark_data.get("markPrice", 0)) if mark_data else 0
+            index_price = self.get_index_price(symbol, mark_data=mark_data, cycle=cycle) or 0
+
+            snapshots[symbol] = self.build_snapshot(
+                symbol, mark_price, index_price, raw["funding"], raw["oi"], raw["ratios"], raw["taker"]
+            )
+
+        return snapshots
+
 
 def main():
     """Example usage"""
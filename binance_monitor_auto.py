@@ -11,18 +11,29 @@ Binance永续合约自动监控系统
 5. 启动成功通知（首次运行）
 """
 
-import requests
+import http_client
 import json
 import time
-import csv
 import os
 import pandas as pd
 import schedule
-import glob
-from typing import Dict, List, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import market_stream
+from market_stream import MarketStateTable, MarketStreamIngestor, flush_snapshots
+from symbol_universe import get_default_universe
+from adaptive_scheduler import AdaptiveScheduler
+from storage import BASIC_FIELDS, create_store
+from market_cap import MarketCapService
+from supply_provider import create_supply_provider
+import archive
+from retention import IORateLimiter, RetentionEngine, RetentionPolicy
+from rolling_window import LONG_WINDOW, RollingWindows
+from panel_evaluator import FilterStats, SymbolPanel, evaluate_panel
+
 
 class Config:
     """配置管理类"""
@@ -38,12 +49,45 @@ class Config:
         # 应用设置
         self.DATA_DIR = os.getenv('DATA_DIR', 'data')
         self.CHARTS_DIR = os.getenv('CHARTS_DIR', 'charts')
+        self.STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'csv')  # csv、arrow（列式按天分区）、sqlite 或 segments（分段CSV）
+        self.ROLLING_WINDOW_SIZE = int(os.getenv('ROLLING_WINDOW_SIZE', '10'))  # 内存中每个交易对保留的快照数（至少10）
+        self.VECTORIZED_MONITOR = os.getenv('VECTORIZED_MONITOR', 'true').lower() in ('1', 'true', 'yes')  # 向量化监控评估
         self.COLLECTION_INTERVAL = int(os.getenv('COLLECTION_INTERVAL', '900'))  # 15分钟
 
         # 监控阈值
         self.FUNDING_RATE_THRESHOLD = float(os.getenv('FUNDING_RATE_THRESHOLD', '0.001'))  # 0.1%
         self.OI_RATIO_THRESHOLD = float(os.getenv('OI_RATIO_THRESHOLD', '2.0'))  # 2x
         self.MARKET_CAP_THRESHOLD = float(os.getenv('MARKET_CAP_THRESHOLD', '100000000'))  # 1亿美元
+        self.ALERT_COOLDOWN = int(os.getenv('ALERT_COOLDOWN', '900'))  # 持续满足条件的交易对重复提醒的间隔（秒）
+        self.MARKET_CAP_TTL = int(os.getenv('MARKET_CAP_TTL', '300'))  # 现货价格缓存有效期（秒）
+        self.SUPPLY_FILE = os.getenv('SUPPLY_FILE', '')  # 流通量文件（JSON/CSV），为空时使用内置的主流币种
+
+        # 数据保留：后台线程持续裁剪，0表示不限制
+        # 默认不裁剪（保留全部历史），只在数据目录超过大小阈值时清理（见 CLEANUP_KEEP_ROWS）
+        self.RETENTION_MAX_ROWS = int(os.getenv('RETENTION_MAX_ROWS', '0'))  # 每个交易对保留的行数
+        self.RETENTION_MAX_AGE_HOURS = float(os.getenv('RETENTION_MAX_AGE_HOURS', '0'))  # 保留的小时数
+        # 未配置保留策略时，数据目录超过大小阈值后每个交易对保留的行数（0表示不清理）
+        self.CLEANUP_KEEP_ROWS = int(os.getenv('CLEANUP_KEEP_ROWS', '1000'))
+        self.RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', '60'))  # 后台每轮检查间隔（秒）
+        self.RETENTION_IO_RATE_MB = float(os.getenv('RETENTION_IO_RATE_MB', '5'))  # 重写文件的速率上限（MB/秒）
+
+        # 冷数据归档：配置目录后，超过保留期的数据压缩归档而不是删除
+        self.ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+        self.ARCHIVE_AFTER_HOURS = float(os.getenv('ARCHIVE_AFTER_HOURS', '168'))  # 热数据保留的小时数
+
+        # 采集模式：批量模式一次性获取全市场premiumIndex，只对持仓量做逐个请求
+        self.BULK_COLLECTION = os.getenv('BULK_COLLECTION', 'true').lower() in ('1', 'true', 'yes')
+        self.COLLECTION_WORKERS = int(os.getenv('COLLECTION_WORKERS', '8'))  # 逐个请求的并发数
+
+        # 数据来源：rest（定时轮询）或 stream（WebSocket行情流 + 定时刷新持仓量）
+        self.INGESTION_MODE = os.getenv('INGESTION_MODE', 'rest').lower()
+        self.STREAM_DOWNSAMPLE_INTERVAL = int(os.getenv('STREAM_DOWNSAMPLE_INTERVAL', '60'))  # 行情流写入间隔（秒）
+
+        # 自适应调度：按交易对热度分配采集间隔（REST模式）
+        self.ADAPTIVE_SCHEDULING = os.getenv('ADAPTIVE_SCHEDULING', 'false').lower() in ('1', 'true', 'yes')
+        self.ADAPTIVE_MIN_INTERVAL = int(os.getenv('ADAPTIVE_MIN_INTERVAL', '60'))  # 接近触发条件的交易对（秒）
+        self.ADAPTIVE_MAX_INTERVAL = int(os.getenv('ADAPTIVE_MAX_INTERVAL', '1800'))  # 平静的交易对（秒）
+        self.ADAPTIVE_WEIGHT_BUDGET = int(os.getenv('ADAPTIVE_WEIGHT_BUDGET', '600'))  # 每分钟请求权重预算
 
         # 确保目录存在
         os.makedirs(self.DATA_DIR, exist_ok=True)
@@ -77,7 +121,7 @@ class TelegramBot:
         }
 
         try:
-            response = requests.post(url, json=payload, timeout=10)
+            response = http_client.post(url, json=payload, timeout=10)
             success = response.status_code == 200
             if success:
                 print(f"Telegram消息发送成功: {message[:50]}...")
@@ -112,8 +156,17 @@ class TelegramBot:
             f"💰 监控交易对：{stats['total_symbols']} 个\n"
             f"🔄 运行时长：{stats['uptime']}\n"
             f"📡 系统状态：{'✅ 正常' if stats['system_healthy'] else '⚠️ 异常'}\n\n"
-            "下次报告：30分钟后"
         )
+
+        # 占用最大的交易对
+        breakdown = stats.get('storage_breakdown')
+        if breakdown:
+            message += f"🗂 <b>存储占用前{len(breakdown)}</b>\n"
+            for item in breakdown:
+                message += f"  • {item['symbol']}: {item['size']}（{item['rows']} 行）\n"
+            message += "\n"
+
+        message += "下次报告：30分钟后"
         return self.send_message(message)
 
     def send_alert(self, symbol: str, funding_rate: float, oi_ratio: float, current_oi: float, market_cap: Optional[float] = None) -> bool:
@@ -274,6 +327,31 @@ class BinanceDataCollector:
         self.config = config
         self.base_url = "https://fapi.binance.com"
         self.futures_data_url = "https://fapi.binance.com/futures/data"
+        self.symbol_universe = get_default_universe()
+        self.store = create_store(config.STORAGE_BACKEND, config.DATA_DIR, fields=BASIC_FIELDS)
+        self.supply_provider = create_supply_provider(config.SUPPLY_FILE)
+        self.supply_provider.add_refresh_hook(
+            lambda supply: print(f"流通量数据已更新: {len(supply)} 个币种")
+        )
+        print(f"流通量数据: {len(self.supply_provider)} 个币种")
+        self.market_cap_service = MarketCapService(self.supply_provider, ttl=config.MARKET_CAP_TTL)
+
+        # 快照监听者：每条快照写入存储后回调 callback(symbol, data)
+        self.snapshot_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    def add_snapshot_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """注册快照监听者（例如自适应调度器）"""
+        self.snapshot_listeners.append(listener)
+
+    def store_snapshot(self, symbol: str, data: Dict[str, Any]):
+        """保存快照并通知监听者"""
+        self.store.append(symbol, data)
+
+        for listener in self.snapshot_listeners:
+            try:
+                listener(symbol, data)
+            except Exception as e:
+                print(f"快照回调失败 {symbol}: {e}")
 
     def get_mark_price(self, symbol: str) -> Dict[str, Any]:
         """获取标记价格和资金费率"""
@@ -281,7 +359,7 @@ class BinanceDataCollector:
         params = {"symbol": symbol}
 
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = http_client.get(url, params=params, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -294,7 +372,7 @@ class BinanceDataCollector:
         params = {"symbol": symbol}
 
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = http_client.get(url, params=params, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -307,7 +385,7 @@ class BinanceDataCollector:
         params = {"symbol": symbol, "limit": 1}
 
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = http_client.get(url, params=params, timeout=10)
             response.raise_for_status()
             data = response.json()
             return data[0] if data else {}
@@ -316,80 +394,58 @@ class BinanceDataCollector:
             return {}
 
     def get_all_usdt_perpetual_symbols(self) -> List[str]:
-        """获取所有USDT永续合约交易对"""
-        url = f"{self.base_url}/fapi/v1/exchangeInfo"
+        """获取所有USDT永续合约交易对（经由带TTL的交易对缓存，不会每次下载exchangeInfo）"""
+        symbols = self.symbol_universe.get_symbols()
+        if symbols:
+            return symbols
 
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+        print("获取交易对信息失败")
+        # 返回一些主要交易对作为备用
+        return ["BTCUSDT", "ETHUSDT", "BNBUSDT", "ADAUSDT", "SOLUSDT", "XRPUSDT", "DOTUSDT", "DOGEUSDT", "AVAXUSDT", "MATICUSDT"]
 
-            usdt_symbols = []
-            for symbol_info in data["symbols"]:
-                if (symbol_info["quoteAsset"] == "USDT" and
-                    symbol_info["contractType"] == "PERPETUAL" and
-                    symbol_info["status"] == "TRADING"):
-                    usdt_symbols.append(symbol_info["symbol"])
+    def get_market_cap(self, symbol: str) -> Optional[float]:
+        """获取币种市值（美元），现货价格每个周期批量获取一次并缓存"""
+        return self.market_cap_service.get_market_cap(symbol)
 
-            print(f"获取到 {len(usdt_symbols)} 个USDT永续合约交易对")
-            return sorted(usdt_symbols)
-        except Exception as e:
-            print(f"获取交易对信息失败: {e}")
-            # 返回一些主要交易对作为备用
-            return ["BTCUSDT", "ETHUSDT", "BNBUSDT", "ADAUSDT", "SOLUSDT", "XRPUSDT", "DOTUSDT", "DOGEUSDT", "AVAXUSDT", "MATICUSDT"]
+    def get_data_snapshot(self, symbol: str) -> Dict[str, Any]:
+        """
+        获取完整数据快照
 
-    def get_market_cap(self, symbol: str) -> Optional[float]:
-        """获取币种市值（美元）
-        注意：这是一个简化实现，实际使用时需要更准确的市值数据源
+        资金费率取自该交易对的premiumIndex（lastFundingRate/nextFundingTime，即本期预估费率和
+        下次结算时间），与批量模式和行情流模式一致，资金费率提醒在各模式下比较的是同一个量。
         """
-        # 从交易对中提取基础币种
-        base_asset = symbol.replace("USDT", "")
+        # 获取标记价格和资金费率
+        mark_data = self.get_mark_price(symbol)
 
-        # 这里使用一个简化的市值估算方法
-        # 实际生产环境中应该使用专业的市值数据API
-        try:
-            # 获取现货价格
-            spot_url = "https://api.binance.com/api/v3/ticker/price"
-            params = {"symbol": symbol}
-            response = requests.get(spot_url, params=params, timeout=5)
-
-            if response.status_code == 200:
-                price_data = response.json()
-                price = float(price_data['price'])
-
-                # 简化的流通量估算（实际应该从专业API获取）
-                # 这里使用一个预设的流通量映射
-                supply_map = {
-                    "BTC": 19500000,   # 比特币流通量
-                    "ETH": 120000000,  # 以太坊流通量
-                    "BNB": 150000000,  # BNB流通量
-                    "ADA": 35000000000, # Cardano流通量
-                    "SOL": 400000000,  # Solana流通量
-                    "XRP": 54000000000, # XRP流通量
-                    "DOT": 1200000000, # Polkadot流通量
-                    "DOGE": 140000000000, # Dogecoin流通量
-                    "AVAX": 360000000, # Avalanche流通量
-                    "MATIC": 10000000000, # Polygon流通量
-                }
-
-                # 如果币种在映射中，计算市值
-                if base_asset in supply_map:
-                    market_cap = price * supply_map[base_asset]
-                    return market_cap
-                else:
-                    # 对于不在映射中的币种，返回None表示未知
-                    return None
+        # 获取持仓量
+        oi_data = self.get_open_interest(symbol)
+
+        return self.build_snapshot(symbol, mark_data, oi_data)
+
+    def get_all_premium_index(self) -> Dict[str, Dict[str, Any]]:
+        """一次性获取全市场标记价格、指数价格和资金费率（不带symbol参数）"""
+        url = f"{self.base_url}/fapi/v1/premiumIndex"
 
+        try:
+            response = http_client.get(url, timeout=10)
+            response.raise_for_status()
+            return {item["symbol"]: item for item in response.json() if "symbol" in item}
         except Exception as e:
-            print(f"获取 {symbol} 市值失败: {e}")
-            return None
+            print(f"批量获取标记价格失败: {e}")
+            return {}
 
-        return None
+    def get_open_interests(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """并发获取多个交易对的持仓量（该接口不支持全市场查询）"""
+        if not symbols:
+            return {}
 
-    def get_data_snapshot(self, symbol: str) -> Dict[str, Any]:
-        """获取完整数据快照"""
-        # 获取标记价格和资金费率
-        mark_data = self.get_mark_price(symbol)
+        workers = max(1, min(self.config.COLLECTION_WORKERS, len(symbols)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self.get_open_interest, symbols)
+            return dict(zip(symbols, results))
+
+    def build_snapshot(self, symbol: str, mark_data: Dict[str, Any], oi_data: Dict[str, Any]) -> Dict[str, Any]:
+        """由premiumIndex数据（批量或单个交易对）和持仓量数据组装快照"""
         mark_price = float(mark_data.get("markPrice", 0)) if mark_data else 0
         index_price = float(mark_data.get("indexPrice", 0)) if mark_data else 0
 
@@ -397,119 +453,156 @@ class BinanceDataCollector:
         basis = mark_price - index_price
         basis_percent = (basis / index_price) * 100 if index_price != 0 else 0
 
-        # 获取资金费率
-        funding_data = self.get_funding_rate(symbol)
-
-        # 获取持仓量
-        oi_data = self.get_open_interest(symbol)
-
-        # 编译完整快照
-        snapshot = {
+        return {
             "symbol": symbol,
             "timestamp": datetime.now().isoformat(),
             "mark_price": mark_price,
             "index_price": index_price,
             "basis": basis,
             "basis_percent": basis_percent,
-            "last_funding_rate": float(funding_data.get("fundingRate", 0)) if funding_data else 0,
-            "next_funding_time": funding_data.get("fundingTime", 0) if funding_data else 0,
+            "last_funding_rate": float(mark_data.get("lastFundingRate", 0)) if mark_data else 0,
+            "next_funding_time": mark_data.get("nextFundingTime", 0) if mark_data else 0,
             "oi": float(oi_data.get("openInterest", 0)) if oi_data else 0
         }
 
-        return snapshot
-
-    def save_to_csv(self, symbol: str, data: Dict[str, any]):
-        """将数据保存到CSV文件"""
-        csv_file = os.path.join(self.config.DATA_DIR, f"{symbol}.csv")
-
-        # CSV文件头
-        fieldnames = [
-            'timestamp',
-            'mark_price',
-            'index_price',
-            'basis',
-            'basis_percent',
-            'last_funding_rate',
-            'next_funding_time',
-            'oi'
-        ]
+    def collect_data(self) -> Tuple[int, int]:
+        """收集数据"""
+        if self.config.BULK_COLLECTION:
+            return self.collect_data_bulk()
+
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始数据采集...")
+        return self.collect_data_per_symbol(self.get_all_usdt_perpetual_symbols())
 
-        # 检查文件是否存在，如果不存在则写入表头
-        file_exists = os.path.isfile(csv_file)
+    def collect_data_per_symbol(self, symbols: List[str]) -> Tuple[int, int]:
+        """逐个交易对收集数据（每个交易对2次请求：premiumIndex和持仓量）"""
+        success_count = 0
+        error_count = 0
 
-        with open(csv_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+        print(f"开始采集 {len(symbols)} 个交易对的数据...")
 
-            if not file_exists:
-                writer.writeheader()
+        # 本周期的写入合并为一批
+        with self.store.batch():
+            for i, symbol in enumerate(symbols, 1):
+                try:
+                    # 获取数据快照
+                    data = self.get_data_snapshot(symbol)
 
-            # 准备要写入的数据
-            row_data = {
-                'timestamp': data['timestamp'],
-                'mark_price': data['mark_price'],
-                'index_price': data['index_price'],
-                'basis': data['basis'],
-                'basis_percent': data['basis_percent'],
-                'last_funding_rate': data['last_funding_rate'],
-                'next_funding_time': data['next_funding_time'],
-                'oi': data['oi']
-            }
+                    # 保存快照
+                    self.store_snapshot(symbol, data)
 
-            writer.writerow(row_data)
+                    success_count += 1
+                    if i % 20 == 0 or i == len(symbols):
+                        print(f"  [{i}/{len(symbols)}] ✓ {symbol}: 数据已保存")
 
-    def collect_data(self) -> Tuple[int, int]:
-        """收集数据"""
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始数据采集...")
+                    # 添加延迟避免API限制
+                    time.sleep(0.1)
 
-        symbols = self.get_all_usdt_perpetual_symbols()
-        success_count = 0
-        error_count = 0
+                except Exception as e:
+                    error_count += 1
+                    print(f"  ✗ {symbol}: 错误 - {e}")
+
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 数据采集完成: {success_count} 成功, {error_count} 失败")
+        return success_count, error_count
+
+    def collect_data_bulk(self, symbols: Optional[List[str]] = None) -> Tuple[int, int]:
+        """批量模式收集数据
+
+        premiumIndex 一次请求覆盖全市场的标记价格、指数价格和资金费率，
+        只有持仓量需要逐个交易对并发请求。
+
+        Args:
+            symbols: 需要采集的交易对，默认为所有USDT永续合约
+        """
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始数据采集（批量模式）...")
+
+        if symbols is None:
+            symbols = self.get_all_usdt_perpetual_symbols()
+        premium_index = self.get_all_premium_index()
+        if not premium_index:
+            print("批量接口不可用，回退到逐个采集模式")
+            return self.collect_data_per_symbol(symbols)
+
+        # 只保留有行情数据的交易对
+        missing = [symbol for symbol in symbols if symbol not in premium_index]
+        symbols = [symbol for symbol in symbols if symbol in premium_index]
 
         print(f"开始采集 {len(symbols)} 个交易对的数据...")
 
-        for i, symbol in enumerate(symbols, 1):
-            try:
-                # 获取数据快照
-                data = self.get_data_snapshot(symbol)
+        oi_map = self.get_open_interests(symbols)
+        success_count = 0
+        error_count = len(missing)
 
-                # 保存到CSV
-                self.save_to_csv(symbol, data)
+        for symbol in missing:
+            print(f"  ✗ {symbol}: 错误 - 批量行情中缺少该交易对")
 
-                success_count += 1
-                if i % 20 == 0 or i == len(symbols):
-                    print(f"  [{i}/{len(symbols)}] ✓ {symbol}: 数据已保存")
+        # 本周期的写入合并为一批
+        with self.store.batch():
+            for i, symbol in enumerate(symbols, 1):
+                try:
+                    data = self.build_snapshot(symbol, premium_index[symbol], oi_map.get(symbol, {}))
+                    self.store_snapshot(symbol, data)
 
-                # 添加延迟避免API限制
-                time.sleep(0.1)
+                    success_count += 1
+                    if i % 20 == 0 or i == len(symbols):
+                        print(f"  [{i}/{len(symbols)}] ✓ {symbol}: 数据已保存")
 
-            except Exception as e:
-                error_count += 1
-                print(f"  ✗ {symbol}: 错误 - {e}")
+                except Exception as e:
+                    error_count += 1
+                    print(f"  ✗ {symbol}: 错误 - {e}")
 
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 数据采集完成: {success_count} 成功, {error_count} 失败")
         return success_count, error_count
 
 
+class AlertThrottle:
+    """提醒去重：新满足条件的交易对立即提醒，持续满足条件的交易对每隔 cooldown 秒才再次提醒"""
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+        self._last_sent: Dict[str, float] = {}
+
+    def filter(self, alerts: List[Dict], evaluated: Optional[List[str]] = None,
+               now: Optional[float] = None) -> List[Dict]:
+        """
+        返回需要发送的提醒
+
+        Args:
+            alerts: 本轮满足条件的提醒
+            evaluated: 本轮检查过的交易对（None表示全部）；其中不再满足条件的交易对
+                解除抑制，之后再次满足条件时立即提醒
+        """
+        now = time.time() if now is None else now
+        qualifying = {alert['symbol'] for alert in alerts}
+        checked = None if evaluated is None else set(evaluated)
+        for symbol in list(self._last_sent):
+            if symbol not in qualifying and (checked is None or symbol in checked):
+                del self._last_sent[symbol]
+
+        return [alert for alert in alerts
+                if now - self._last_sent.get(alert['symbol'], float('-inf')) >= self.cooldown]
+
+    def mark_sent(self, alerts: List[Dict], now: Optional[float] = None):
+        """记录提醒已发送"""
+        now = time.time() if now is None else now
+        for alert in alerts:
+            self._last_sent[alert['symbol']] = now
+
+
 class Monitor:
     """监控器"""
 
-    def __init__(self, config: Config, telegram_bot: TelegramBot, data_collector: BinanceDataCollector):
+    def __init__(self, config: Config, telegram_bot: TelegramBot, data_collector: BinanceDataCollector,
+                 rolling_windows: Optional[RollingWindows] = None):
         self.config = config
         self.telegram_bot = telegram_bot
         self.data_collector = data_collector
+        self.rolling_windows = rolling_windows  # 由采集器直接写入的内存滚动窗口
+        self.filter_stats = FilterStats()  # 最近一次监控各筛选阶段的计数
 
-    def load_symbol_data(self, symbol: str) -> Optional[pd.DataFrame]:
-        """加载单个交易对的历史数据"""
-        csv_file = os.path.join(self.config.DATA_DIR, f"{symbol}.csv")
-
-        if not os.path.exists(csv_file):
-            return None
-
+    def load_symbol_data(self, symbol: str, last_n: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """加载单个交易对的历史数据（last_n 为None时加载全部）"""
         try:
-            df = pd.read_csv(csv_file)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp')
-            return df
+            return self.data_collector.store.read(symbol, last_n=last_n)
         except Exception as e:
             print(f"加载 {symbol} 数据失败: {e}")
             return None
@@ -534,57 +627,136 @@ class Monitor:
 
         return recent_3_avg / recent_10_avg
 
-    def check_conditions(self, symbol: str) -> Tuple[bool, Optional[float], Optional[float], Optional[float], Optional[float]]:
-        """检查交易对是否满足监控条件"""
-        # 先获取市值
-        market_cap = self.data_collector.get_market_cap(symbol)
+    def check_conditions(self, symbol: str, df: Optional[pd.DataFrame] = None) -> Tuple[bool, Optional[float], Optional[float], Optional[float], Optional[float]]:
+        """检查交易对是否满足监控条件（df 为已加载的最近数据，为None时从存储读取）
 
-        # 获取最新数据
-        df = self.load_symbol_data(symbol)
-        if df is None or len(df) == 0:
-            # 没有数据时，无法判断
-            return False, None, None, None, market_cap
-
-        # 获取最新数据
-        latest = df.iloc[-1]
-        funding_rate = latest['last_funding_rate']
-        current_oi = latest['oi']
-
-        # 检查资金费率条件
-        funding_condition = abs(funding_rate) > self.config.FUNDING_RATE_THRESHOLD
-
-        # 判断条件：
+        按阶段筛选：先检查本地的资金费率条件，只有通过的交易对才查询市值，
+        只有大市值交易对才计算OI比率。未查询市值时返回的市值为None。
+        """
+        window = None
+        if df is None and self.rolling_windows is not None:
+            window = self.rolling_windows.get(symbol)
+
+        if window is not None and len(window) > 0:
+            # 从内存滚动窗口读取，OI比率由滑动累加和直接得到
+            funding_rate = window.latest('last_funding_rate')
+            current_oi = window.latest('oi')
+            rows = window.oi_sample_count()
+            get_oi_ratio = window.oi_ratio
+        else:
+            # 获取最新数据（OI比率只需要最近10行）
+            if df is None:
+                df = self.load_symbol_data(symbol, last_n=10)
+            if df is None or len(df) == 0:
+                # 没有数据时，无法判断
+                return False, None, None, None, None
+
+            # 获取最新数据
+            latest = df.iloc[-1]
+            funding_rate = latest['last_funding_rate']
+            current_oi = latest['oi']
+            rows = len(df)
+            get_oi_ratio = lambda: self.calculate_oi_ratio(df)
+
+        stats = self.filter_stats
+
+        # 阶段1：资金费率条件（本地，所有分支都必须满足）
+        stats.add('funding', 'input')
+        if not abs(funding_rate) > self.config.FUNDING_RATE_THRESHOLD:
+            stats.add('funding', 'dropped')
+            return False, funding_rate, None, current_oi, None
+        stats.add('funding', 'passed')
+
+        # 阶段2：市值（远程）
         # 1. 对于市值 < 1亿美元的交易对：只需要满足资金费率条件
         # 2. 对于市值 >= 1亿美元的交易对：需要同时满足资金费率和持仓量条件
         # 3. 对于市值未知的交易对：默认按小市值币种处理（只需要满足资金费率条件）
+        market_cap = self.data_collector.get_market_cap(symbol)
+        stats.add('market_cap', 'input')
         if market_cap is None or market_cap < self.config.MARKET_CAP_THRESHOLD:
             # 小市值币种或市值未知币种：只需要满足资金费率条件
-            condition_met = funding_condition
-            oi_ratio = None  # 小市值币种不需要OI比率
-        else:
-            # 大市值币种：需要同时满足资金费率和持仓量条件
-            # 检查是否有足够数据计算OI比率
-            if len(df) < 10:
-                # 数据不足，无法计算OI比率
-                condition_met = False
-                oi_ratio = None
-            else:
-                # 计算OI比率
-                oi_ratio = self.calculate_oi_ratio(df)
-                if oi_ratio is None:
-                    condition_met = False
-                else:
-                    # 检查OI条件
-                    oi_condition = oi_ratio > self.config.OI_RATIO_THRESHOLD
-                    condition_met = funding_condition and oi_condition
+            stats.add('market_cap', 'small_cap')
+            return True, funding_rate, None, current_oi, market_cap  # 小市值币种不需要OI比率
+        stats.add('market_cap', 'large_cap')
+
+        # 阶段3：OI比率（大市值币种）
+        stats.add('oi_ratio', 'input')
+        oi_ratio = None
+        condition_met = False
+        # 检查是否有足够数据计算OI比率
+        if rows >= 10:
+            oi_ratio = get_oi_ratio()
+            if oi_ratio is not None:
+                condition_met = oi_ratio > self.config.OI_RATIO_THRESHOLD
+        stats.add('oi_ratio', 'passed' if condition_met else 'dropped')
 
         # 返回结果
         return (condition_met, funding_rate, oi_ratio, current_oi, market_cap)
 
-    def monitor_all_symbols(self) -> List[Dict]:
-        """监控所有交易对"""
-        csv_files = glob.glob(os.path.join(self.config.DATA_DIR, "*.csv"))
-        symbols = [os.path.basename(f).replace('.csv', '') for f in csv_files]
+    def print_alert(self, alert: Dict):
+        """打印一条提醒"""
+        funding_rate = alert['funding_rate']
+        oi_ratio = alert['oi_ratio']
+        current_oi = alert['current_oi']
+        market_cap = alert['market_cap']
+
+        print(f"🚨 发现符合条件的交易对: {alert['symbol']}")
+        print(f"   资金费率: {funding_rate:.6f}" if funding_rate is not None else "   资金费率: N/A")
+        print(f"   OI比率: {oi_ratio:.2f}x" if oi_ratio is not None else "   OI比率: N/A")
+        print(f"   当前OI: {current_oi:,.0f}" if current_oi is not None else "   当前OI: N/A")
+        if market_cap:
+            print(f"   市值: ${market_cap:,.0f}")
+
+    def monitor_all_symbols(self, symbols: Optional[List[str]] = None) -> List[Dict]:
+        """监控所有交易对（symbols 不为None时只检查这些交易对，例如本轮刚采集的交易对）"""
+        self.filter_stats = FilterStats()
+
+        if self.config.VECTORIZED_MONITOR:
+            alerts = self.monitor_all_symbols_vectorized(symbols)
+        else:
+            alerts = self.monitor_all_symbols_per_symbol(symbols)
+
+        print(f"筛选统计: {self.filter_stats.summary()}")
+        return alerts
+
+    def build_panel(self, symbols: Optional[List[str]] = None) -> SymbolPanel:
+        """组装交易对最近10行的面板（优先使用内存滚动窗口），symbols 为None时包含全部交易对"""
+        if self.rolling_windows is not None:
+            return SymbolPanel.from_rolling_windows(self.rolling_windows, symbols=symbols)
+        return SymbolPanel.from_frames(self.data_collector.store.latest_per_symbol(10), symbols=symbols)
+
+    def monitor_all_symbols_vectorized(self, symbols: Optional[List[str]] = None) -> List[Dict]:
+        """向量化监控：一次数组运算评估所有交易对，结果与逐个检查相同"""
+        panel = self.build_panel(symbols)
+        print(f"开始监控 {len(panel)} 个交易对（向量化）...")
+
+        started = time.perf_counter()
+        alerts = evaluate_panel(
+            panel, self.data_collector.market_cap_service.get_market_caps,
+            funding_threshold=self.config.FUNDING_RATE_THRESHOLD,
+            oi_ratio_threshold=self.config.OI_RATIO_THRESHOLD,
+            market_cap_threshold=self.config.MARKET_CAP_THRESHOLD,
+            stats=self.filter_stats
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        for alert in alerts:
+            self.print_alert(alert)
+
+        print(f"向量化评估耗时 {elapsed_ms:.2f}ms")
+        return alerts
+
+    def monitor_all_symbols_per_symbol(self, symbols: Optional[List[str]] = None) -> List[Dict]:
+        """逐个交易对检查"""
+        if self.rolling_windows is not None:
+            # 内存滚动窗口由采集器实时更新，无需读取磁盘
+            recent_data = {}
+            available = self.rolling_windows.symbols()
+        else:
+            # 一次性读取所有交易对最近10行（sqlite后端为一次索引查询）
+            recent_data = self.data_collector.store.latest_per_symbol(10)
+            available = sorted(recent_data)
+        symbols = available if symbols is None else sorted(set(symbols) & set(available))
 
         alerts = []
 
@@ -592,7 +764,7 @@ class Monitor:
 
         for symbol in symbols:
             try:
-                condition_met, funding_rate, oi_ratio, current_oi, market_cap = self.check_conditions(symbol)
+                condition_met, funding_rate, oi_ratio, current_oi, market_cap = self.check_conditions(symbol, recent_data.get(symbol))
 
                 if condition_met:
                     alert_info = {
@@ -603,13 +775,7 @@ class Monitor:
                         'market_cap': market_cap
                     }
                     alerts.append(alert_info)
-
-                    print(f"🚨 发现符合条件的交易对: {symbol}")
-                    print(f"   资金费率: {funding_rate:.6f}" if funding_rate is not None else "   资金费率: N/A")
-                    print(f"   OI比率: {oi_ratio:.2f}x" if oi_ratio is not None else "   OI比率: N/A")
-                    print(f"   当前OI: {current_oi:,.0f}" if current_oi is not None else "   当前OI: N/A")
-                    if market_cap:
-                        print(f"   市值: ${market_cap:,.0f}")
+                    self.print_alert(alert_info)
 
                     # 注意：警报已收集，将在后续统一发送
 
@@ -627,7 +793,33 @@ class AutoMonitorSystem:
         self.config = Config()
         self.telegram_bot = TelegramBot(self.config)
         self.data_collector = BinanceDataCollector(self.config)
-        self.monitor = Monitor(self.config, self.telegram_bot, self.data_collector)
+
+        # 行情流模式
+        self.state_table: Optional[MarketStateTable] = None
+        self.stream_ingestor: Optional[MarketStreamIngestor] = None
+        self.stream_mode = self.use_stream_mode()
+
+        # 内存滚动窗口：冷启动时从存储重建一次，之后由采集器直接推入
+        if self.stream_mode:
+            # 行情流每次写入都带着同一个持仓量，直到下一次REST刷新：多读一些行凑够持仓量样本
+            self.rolling_windows = RollingWindows(self.config.ROLLING_WINDOW_SIZE)
+            flushes_per_refresh = -(-self.config.COLLECTION_INTERVAL // self.config.STREAM_DOWNSAMPLE_INTERVAL)
+            restored = self.rolling_windows.rebuild(self.data_collector.store, rows=LONG_WINDOW * flushes_per_refresh,
+                                                    infer_oi_time=True)
+        elif self.config.ADAPTIVE_SCHEDULING:
+            # 各交易对采集间隔不同：OI比率按固定时长计算，每个采集周期（COLLECTION_INTERVAL）一个持仓量样本
+            self.rolling_windows = RollingWindows(self.config.ROLLING_WINDOW_SIZE,
+                                                  oi_interval=self.config.COLLECTION_INTERVAL)
+            polls_per_interval = -(-self.config.COLLECTION_INTERVAL // self.config.ADAPTIVE_MIN_INTERVAL)
+            restored = self.rolling_windows.rebuild(self.data_collector.store, rows=LONG_WINDOW * polls_per_interval)
+        else:
+            self.rolling_windows = RollingWindows(self.config.ROLLING_WINDOW_SIZE)
+            restored = self.rolling_windows.rebuild(self.data_collector.store)
+        print(f"已从存储恢复 {restored} 个交易对的滚动窗口")
+        self.data_collector.add_snapshot_listener(self.rolling_windows.push)
+
+        self.monitor = Monitor(self.config, self.telegram_bot, self.data_collector, self.rolling_windows)
+        self.alert_throttle = AlertThrottle(self.config.ALERT_COOLDOWN)
 
         # 运行统计
         self.start_time = datetime.now()
@@ -639,19 +831,88 @@ class AutoMonitorSystem:
         # 文件管理
         self.data_size_threshold = 800 * 1024 * 1024  # 800MB
         self.last_cleanup_time = None
+        self.archive = self.create_archive()
+        max_age_hours = self.config.RETENTION_MAX_AGE_HOURS
+        if self.archive is not None:
+            # 归档时热数据只保留 ARCHIVE_AFTER_HOURS，更早的数据移入归档
+            max_age_hours = min(max_age_hours or self.config.ARCHIVE_AFTER_HOURS, self.config.ARCHIVE_AFTER_HOURS)
+        self.retention_policy = RetentionPolicy(
+            max_rows=self.config.RETENTION_MAX_ROWS or None,
+            max_age=timedelta(hours=max_age_hours) if max_age_hours > 0 else None
+        )
+        self.retention_engine = RetentionEngine(
+            self.data_collector.store, self.retention_policy,
+            limiter=IORateLimiter(self.config.RETENTION_IO_RATE_MB * 1024 * 1024),
+            archive=self.archive
+        )
+        # 数据目录超过大小阈值时的清理策略：优先使用保留策略，未配置时按行数保留（与原有清理方式一致）
+        if self.retention_policy.enabled:
+            self.cleanup_policy = self.retention_policy
+        elif self.config.CLEANUP_KEEP_ROWS > 0:
+            self.cleanup_policy = RetentionPolicy(max_rows=self.config.CLEANUP_KEEP_ROWS)
+        else:
+            self.cleanup_policy = None
+
+        # 交易对上架/下架通知
+        self.data_collector.symbol_universe.add_listener(self.on_symbols_changed)
+
+        # 自适应调度器：每条快照写入后更新该交易对的优先级
+        self.adaptive_scheduler = AdaptiveScheduler(
+            funding_threshold=self.config.FUNDING_RATE_THRESHOLD,
+            oi_ratio_threshold=self.config.OI_RATIO_THRESHOLD,
+            min_interval=self.config.ADAPTIVE_MIN_INTERVAL,
+            max_interval=self.config.ADAPTIVE_MAX_INTERVAL
+        )
+        self.data_collector.add_snapshot_listener(self.adaptive_scheduler.update)
 
         # 状态标志
         self.system_started = False
 
+    def on_symbols_changed(self, listed: List[str], delisted: List[str]):
+        """交易对上架/下架时发送通知"""
+        self.rolling_windows.remove(delisted)
+
+        message_parts = ["🆕 <b>交易对列表变化</b>\n\n"]
+        if listed:
+            message_parts.append(f"上架 {len(listed)} 个: {', '.join(listed[:20])}\n")
+        if delisted:
+            message_parts.append(f"下架 {len(delisted)} 个: {', '.join(delisted[:20])}\n")
+        self.telegram_bot.send_message("".join(message_parts))
+
+    def use_stream_mode(self) -> bool:
+        """是否使用WebSocket行情流采集"""
+        if self.config.INGESTION_MODE != 'stream':
+            return False
+        if not market_stream.is_available():
+            print("⚠️ 未安装 websockets，行情流模式不可用，使用REST轮询模式")
+            return False
+        return True
+
+    def start_stream_ingestion(self):
+        """启动行情流采集：先用REST初始化持仓量，再连接行情流"""
+        self.state_table = MarketStateTable()
+        self.stream_ingestor = MarketStreamIngestor(self.state_table)
+        self.refresh_stream_open_interest()
+        self.stream_ingestor.start()
+
+    def refresh_stream_open_interest(self):
+        """刷新行情流状态表中的交易对列表和持仓量（持仓量没有全市场行情流）"""
+        symbols = self.data_collector.get_all_usdt_perpetual_symbols()
+        self.state_table.set_symbols(symbols)
+        self.state_table.update_open_interest(self.data_collector.get_open_interests(symbols))
+
+    def create_archive(self) -> Optional[archive.ColdArchive]:
+        """配置了 ARCHIVE_DIR 时创建冷数据归档"""
+        if not self.config.ARCHIVE_DIR:
+            return None
+        if not archive.is_available():
+            print("⚠️ 未安装 pyarrow，冷数据归档不可用，超过保留期的数据将被删除")
+            return None
+        return archive.ColdArchive(self.config.ARCHIVE_DIR, fields=BASIC_FIELDS)
+
     def calculate_data_size(self) -> int:
-        """计算数据目录总大小（字节）"""
-        total_size = 0
-        for file_path in glob.glob(os.path.join(self.config.DATA_DIR, "*.csv")):
-            try:
-                total_size += os.path.getsize(file_path)
-            except OSError:
-                continue
-        return total_size
+        """数据总大小（字节），由存储层增量维护，无需扫描数据目录"""
+        return self.data_collector.store.total_size()
 
     def format_file_size(self, size_bytes: int) -> str:
         """格式化文件大小"""
@@ -661,87 +922,69 @@ class AutoMonitorSystem:
             size_bytes /= 1024.0
         return f"{size_bytes:.2f} TB"
 
-    def cleanup_old_data(self) -> Dict[str, any]:
-        """清理旧数据，保留最近的数据"""
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始数据清理...")
-
-        csv_files = glob.glob(os.path.join(self.config.DATA_DIR, "*.csv"))
-        files_processed = 0
-        files_cleaned = 0
-        total_rows_removed = 0
-
-        for csv_file in csv_files:
-            try:
-                # 读取CSV文件
-                df = pd.read_csv(csv_file)
-                original_rows = len(df)
-
-                if original_rows <= 1000:  # 如果数据量不大，跳过清理
-                    files_processed += 1
-                    continue
-
-                # 保留最近1000行数据
-                df_cleaned = df.tail(1000)
-                rows_removed = original_rows - len(df_cleaned)
-
-                if rows_removed > 0:
-                    # 保存清理后的数据
-                    df_cleaned.to_csv(csv_file, index=False)
-                    files_cleaned += 1
-                    total_rows_removed += rows_removed
-                    print(f"  ✓ {os.path.basename(csv_file)}: 保留 {len(df_cleaned)} 行，删除 {rows_removed} 行")
+    def cleanup_old_data(self, size_before: int) -> bool:
+        """
+        请求后台保留线程按保留策略裁剪全部交易对（平时每轮只轮流检查一部分）
 
-                files_processed += 1
+        裁剪按I/O限速执行，可能持续数分钟，因此不在调度线程中执行；完成后由后台线程
+        发送清理完成通知。已有清理在进行或未配置清理策略时返回False。
+        """
+        if self.cleanup_policy is None:
+            return False
 
-            except Exception as e:
-                print(f"  ✗ {os.path.basename(csv_file)}: 清理失败 - {e}")
-                continue
+        def on_done(result: Dict[str, int]):
+            self.last_cleanup_time = datetime.now()
+            cleanup_time = self.last_cleanup_time.strftime('%Y-%m-%d %H:%M:%S')
 
-        self.last_cleanup_time = datetime.now()
+            moved = "归档" if self.archive is not None else "删除"
+            print(f"数据清理完成: 处理 {result['files_processed']} 个文件，清理 {result['files_cleaned']} 个文件，{moved} {result['total_rows_removed']} 行数据")
 
-        result = {
-            'files_processed': files_processed,
-            'files_cleaned': files_cleaned,
-            'total_rows_removed': total_rows_removed,
-            'cleanup_time': self.last_cleanup_time.strftime('%Y-%m-%d %H:%M:%S')
-        }
+            # 发送清理完成通知
+            new_size = self.calculate_data_size()
+            self.telegram_bot.send_message(
+                f"✅ <b>数据清理完成</b>\n\n"
+                f"处理文件: {result['files_processed']} 个\n"
+                f"清理文件: {result['files_cleaned']} 个\n"
+                f"{moved}数据行: {result['total_rows_removed']} 行\n"
+                f"清理前大小: {self.format_file_size(size_before)}\n"
+                f"清理后大小: {self.format_file_size(new_size)}\n"
+                f"清理时间: {cleanup_time}"
+            )
 
-        print(f"数据清理完成: 处理 {files_processed} 个文件，清理 {files_cleaned} 个文件，删除 {total_rows_removed} 行数据")
-        return result
+        if not self.retention_engine.request_full_pass(on_done, self.cleanup_policy):
+            return False
+        # 未配置保留策略时后台线程没有启动，此时只执行这次全量裁剪
+        self.retention_engine.start(self.config.RETENTION_INTERVAL)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始数据清理（{self.cleanup_policy.describe()}，后台执行）...")
+        return True
 
-    def check_and_cleanup_data(self) -> Optional[Dict[str, any]]:
-        """检查数据大小并执行清理"""
+    def check_and_cleanup_data(self) -> bool:
+        """检查数据大小，超过阈值时请求后台清理，返回是否发起了清理"""
         current_size = self.calculate_data_size()
 
         if current_size >= self.data_size_threshold:
             print(f"数据大小 {self.format_file_size(current_size)} 超过阈值 {self.format_file_size(self.data_size_threshold)}，执行清理...")
 
+            if self.cleanup_policy is None:
+                print("未配置保留策略且 CLEANUP_KEEP_ROWS=0，不清理数据")
+                return False
+
+            if self.retention_engine.full_pass_pending():
+                print("上一次数据清理仍在进行中")
+                return False
+
             # 发送清理通知
             self.telegram_bot.send_message(
                 f"🧹 <b>数据清理通知</b>\n\n"
                 f"数据目录大小已达到 {self.format_file_size(current_size)}，\n"
                 f"超过阈值 {self.format_file_size(self.data_size_threshold)}，\n"
-                f"正在执行自动清理..."
+                f"正在后台执行自动清理（{self.cleanup_policy.describe()}）..."
             )
 
-            # 执行清理
-            cleanup_result = self.cleanup_old_data()
-
-            # 发送清理完成通知
-            new_size = self.calculate_data_size()
-            self.telegram_bot.send_message(
-                f"✅ <b>数据清理完成</b>\n\n"
-                f"处理文件: {cleanup_result['files_processed']} 个\n"
-                f"清理文件: {cleanup_result['files_cleaned']} 个\n"
-                f"删除数据行: {cleanup_result['total_rows_removed']} 行\n"
-                f"清理前大小: {self.format_file_size(current_size)}\n"
-                f"清理后大小: {self.format_file_size(new_size)}\n"
-                f"清理时间: {cleanup_result['cleanup_time']}"
-            )
+            # 请求后台清理
+            return self.cleanup_old_data(current_size)
 
-            return cleanup_result
-
-        return None
+        return False
 
     def get_system_stats(self) -> Dict:
         """获取系统统计信息"""
@@ -752,13 +995,19 @@ class AutoMonitorSystem:
         uptime_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
         # 统计数据文件
-        data_files = len(glob.glob(os.path.join(self.config.DATA_DIR, "*.csv")))
+        data_files = self.data_collector.store.file_count()
 
         # 计算数据大小
         data_size = self.calculate_data_size()
         data_size_str = self.format_file_size(data_size)
 
-        # 获取总交易对数量
+        # 占用最大的交易对
+        storage_breakdown = [
+            {'symbol': item['symbol'], 'rows': item['rows'], 'size': self.format_file_size(item['bytes'])}
+            for item in self.data_collector.store.storage_breakdown(top=5)
+        ]
+
+        # 获取总交易对数量（来自交易对缓存）
         total_symbols = len(self.data_collector.get_all_usdt_perpetual_symbols())
 
         return {
@@ -769,6 +1018,8 @@ class AutoMonitorSystem:
             'data_files': data_files,
             'data_size': data_size_str,
             'data_size_bytes': data_size,
+            'data_rows': self.data_collector.store.total_rows(),
+            'storage_breakdown': storage_breakdown,
             'total_symbols': total_symbols,
             'uptime': uptime_str,
             'system_healthy': True,
@@ -793,23 +1044,86 @@ class AutoMonitorSystem:
         except Exception as e:
             print(f"数据采集失败: {e}")
 
-    def monitoring_job(self):
-        """监控任务"""
+    def adaptive_collection_job(self):
+        """自适应采集任务：每分钟只采集已到期的交易对"""
+        try:
+            self.adaptive_scheduler.sync_symbols(self.data_collector.get_all_usdt_perpetual_symbols())
+
+            # 批量premiumIndex权重为10，其余预算用于逐个交易对的持仓量请求（权重1）
+            max_symbols = max(0, self.config.ADAPTIVE_WEIGHT_BUDGET - 10)
+            due = self.adaptive_scheduler.due_symbols(max_symbols)
+            if not due:
+                return
+
+            success, errors = self.data_collector.collect_data_bulk(due)
+            self.collection_success_total += success
+            self.collection_errors_total += errors
+
+            stats = self.adaptive_scheduler.get_stats()
+            print(f"自适应调度: 本轮 {len(due)} 个, 高频 {stats['hot']} 个, 低频 {stats['cold']} 个, 共 {stats['total']} 个")
+
+            # 采集完成后只检查本轮刚采集的交易对，其余交易对的数据没有变化
+            self.monitoring_job(due)
+
+        except Exception as e:
+            print(f"自适应采集失败: {e}")
+
+    def stream_open_interest_job(self):
+        """行情流模式下的持仓量刷新任务"""
+        print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 刷新持仓量...")
+
+        try:
+            self.refresh_stream_open_interest()
+
+            # 检查并执行数据清理（如果需要）
+            self.check_and_cleanup_data()
+
+        except Exception as e:
+            print(f"持仓量刷新失败: {e}")
+
+    def stream_flush_job(self):
+        """行情流模式下的降采样写入任务"""
+        try:
+            interval = self.config.STREAM_DOWNSAMPLE_INTERVAL
+            if self.stream_ingestor and not self.stream_ingestor.connected:
+                print(f"⚠️ 行情流未连接，跳过超过{interval}秒未更新的交易对")
+
+            # 只写入本间隔内收到过行情的交易对，断线时不把旧行情当作新数据写入
+            with self.data_collector.store.batch():
+                count = flush_snapshots(self.state_table, self.data_collector.store_snapshot, max_age=interval)
+            self.collection_success_total += count
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 行情流写入 {count} 个交易对")
+
+            # 写入后立即执行监控
+            if count:
+                self.monitoring_job()
+
+        except Exception as e:
+            print(f"行情流写入失败: {e}")
+
+    def monitoring_job(self, symbols: Optional[List[str]] = None):
+        """监控任务（symbols 不为None时只检查这些交易对）"""
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 执行监控检查...")
 
         try:
-            alerts = self.monitor.monitor_all_symbols()
+            alerts = self.monitor.monitor_all_symbols(symbols)
             self.alerts_found_total += len(alerts)
 
-            if alerts:
+            # 持续满足条件的交易对在冷却期内不重复提醒
+            to_send = self.alert_throttle.filter(alerts, evaluated=symbols)
+            if len(to_send) < len(alerts):
+                print(f"{len(alerts) - len(to_send)} 个交易对仍在提醒冷却期内，不重复发送")
+
+            if to_send:
                 # 发送合并警报
-                success = self.telegram_bot.send_combined_alerts(alerts)
+                success = self.telegram_bot.send_combined_alerts(to_send)
                 if success:
-                    self.alerts_sent_total += len(alerts)  # 统计发送的警报数量
-                    print(f"✅ 发现 {len(alerts)} 个符合条件的交易对，已发送合并提醒")
+                    self.alert_throttle.mark_sent(to_send)
+                    self.alerts_sent_total += len(to_send)  # 统计发送的警报数量
+                    print(f"✅ 发现 {len(to_send)} 个新的符合条件的交易对，已发送合并提醒")
                 else:
-                    print(f"❌ 发现 {len(alerts)} 个符合条件的交易对，但提醒发送失败")
-            else:
+                    print(f"❌ 发现 {len(to_send)} 个新的符合条件的交易对，但提醒发送失败")
+            elif not alerts:
                 print("✅ 未发现符合条件的交易对")
 
         except Exception as e:
@@ -833,15 +1147,34 @@ class AutoMonitorSystem:
 
     def setup_schedule(self):
         """设置定时任务"""
-        # 每15分钟执行数据采集和监控
-        schedule.every(15).minutes.do(self.collection_job)
+        if self.stream_mode:
+            interval = self.config.STREAM_DOWNSAMPLE_INTERVAL
+
+            # 行情流实时更新，按降采样间隔写入并监控；持仓量每15分钟REST刷新
+            schedule.every(interval).seconds.do(self.stream_flush_job)
+            schedule.every(15).minutes.do(self.stream_open_interest_job)
+        elif self.config.ADAPTIVE_SCHEDULING:
+            # 每分钟采集到期的交易对，数据清理检查仍按15分钟执行
+            schedule.every(1).minutes.do(self.adaptive_collection_job)
+            schedule.every(15).minutes.do(self.check_and_cleanup_data)
+        else:
+            # 每15分钟执行数据采集和监控
+            schedule.every(15).minutes.do(self.collection_job)
 
         # 每30分钟执行状态报告
         schedule.every(30).minutes.do(self.status_report_job)
 
         print("定时任务设置完成:")
-        print("  📊 数据采集: 每15分钟（所有USDT永续合约）")
-        print("  🔔 监控检查: 每15分钟")
+        if self.stream_mode:
+            print(f"  📊 数据采集: WebSocket行情流，每{self.config.STREAM_DOWNSAMPLE_INTERVAL}秒写入")
+            print(f"  🔔 监控检查: 每{self.config.STREAM_DOWNSAMPLE_INTERVAL}秒（同一交易对每{self.config.ALERT_COOLDOWN}秒最多提醒一次）")
+            print("  📦 持仓量刷新: 每15分钟")
+        elif self.config.ADAPTIVE_SCHEDULING:
+            print(f"  📊 数据采集: 自适应（{self.config.ADAPTIVE_MIN_INTERVAL}秒 ~ {self.config.ADAPTIVE_MAX_INTERVAL}秒/交易对）")
+            print(f"  🔔 监控检查: 每次采集后检查本轮采集的交易对（同一交易对每{self.config.ALERT_COOLDOWN}秒最多提醒一次）")
+        else:
+            print("  📊 数据采集: 每15分钟（所有USDT永续合约）")
+            print("  🔔 监控检查: 每15分钟")
         print("  📈 状态报告: 每30分钟")
 
     def run(self):
@@ -865,8 +1198,15 @@ class AutoMonitorSystem:
         self.setup_schedule()
 
         # 立即执行一次数据采集和监控
-        print("\n执行首次数据采集和监控...")
-        self.collection_job()
+        if self.stream_mode:
+            print("\n启动行情流采集...")
+            self.start_stream_ingestion()
+        elif self.config.ADAPTIVE_SCHEDULING:
+            print("\n执行首次自适应采集和监控...")
+            self.adaptive_collection_job()
+        else:
+            print("\n执行首次数据采集和监控...")
+            self.collection_job()
 
         print("\n" + "=" * 50)
         print("系统已启动，开始自动运行...")
@@ -875,12 +1215,19 @@ class AutoMonitorSystem:
 
         self.system_started = True
 
+        # 配置了保留策略或冷数据归档时，后台持续裁剪历史数据
+        if self.retention_policy.enabled or self.archive is not None:
+            self.retention_engine.start(self.config.RETENTION_INTERVAL)
+
         # 主循环
         while True:
             try:
                 schedule.run_pending()
                 time.sleep(1)
             except KeyboardInterrupt:
+                if self.stream_ingestor:
+                    self.stream_ingestor.stop()
+                self.retention_engine.stop()
                 print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 系统已停止")
                 break
             except Exception as e:
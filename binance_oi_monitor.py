@@ -5,6 +5,7 @@ Binance永续合约持仓量监控系统
 """
 
 import requests
+import http_client
 import json
 import time
 import csv
@@ -15,6 +16,9 @@ import glob
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 
+from symbol_universe import get_default_universe
+from timeseries import TimeSeries
+
 
 class BinanceDataSnapshot:
     """Binance永续合约数据快照类"""
@@ -29,23 +33,24 @@ class BinanceDataSnapshot:
         params = {"symbol": symbol}
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             print(f"Error fetching mark price for {symbol}: {e}")
             return {}
 
-    def get_index_price(self, symbol: str) -> Optional[float]:
-        """获取指数价格"""
-        mark_data = self.get_mark_price(symbol)
+    def get_index_price(self, symbol: str, mark_data: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """获取指数价格（可传入已获取的premiumIndex数据，避免重复请求）"""
+        if mark_data is None:
+            mark_data = self.get_mark_price(symbol)
         if mark_data and "indexPrice" in mark_data:
             return float(mark_data["indexPrice"])
 
         # 备用方法
         url = f"{self.base_url}/fapi/v1/indexInfo"
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
             data = response.json()
 
@@ -76,7 +81,7 @@ class BinanceDataSnapshot:
         params = {"symbol": symbol, "limit": 1}
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             return data[0] if data else {}
@@ -90,7 +95,7 @@ class BinanceDataSnapshot:
         params = {"symbol": symbol}
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -109,7 +114,7 @@ class BinanceDataSnapshot:
             }
 
             try:
-                response = requests.get(url, params=params)
+                response = http_client.get(url, params=params)
                 response.raise_for_status()
                 return response.json()
             except requests.exceptions.RequestException as e:
@@ -137,7 +142,7 @@ class BinanceDataSnapshot:
         }
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             return data[0] if data else {}
@@ -154,7 +159,7 @@ class BinanceDataSnapshot:
         mark_price = float(mark_data.get("markPrice", 0)) if mark_data else 0
 
         # 获取指数价格
-        index_price = self.get_index_price(symbol) or 0
+        index_price = self.get_index_price(symbol, mark_data=mark_data) or 0
 
         # 计算基差
         basis_data = self.calculate_basis(mark_price, index_price)
@@ -205,26 +210,8 @@ class BinanceDataSnapshot:
 
 
 def get_usdt_perpetual_symbols():
-    """获取所有USDT永续合约交易对"""
-    url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        usdt_symbols = []
-        for symbol_info in data["symbols"]:
-            if (symbol_info["quoteAsset"] == "USDT" and
-                symbol_info["contractType"] == "PERPETUAL" and
-                symbol_info["status"] == "TRADING"):
-                usdt_symbols.append(symbol_info["symbol"])
-
-        return sorted(usdt_symbols)
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange info: {e}")
-        return []
+    """获取所有USDT永续合约交易对（经由交易对缓存）"""
+    return get_default_universe().get_symbols()
 
 
 def get_top_symbols_by_volume(limit: int = 20):
@@ -232,7 +219,7 @@ def get_top_symbols_by_volume(limit: int = 20):
     url = "https://fapi.binance.com/fapi/v1/ticker/24hr"
 
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
         response.raise_for_status()
         data = response.json()
 
@@ -369,6 +356,10 @@ class DataAnalyzer:
 
     def load_symbol_data(self, symbol: str) -> pd.DataFrame:
         """加载单个交易对的历史数据"""
+        return self.load_series(symbol).frame
+
+    def load_series(self, symbol: str) -> TimeSeries:
+        """加载单个交易对的历史数据为按时间索引的序列（采集器按时间顺序追加，只在乱序时才排序）"""
         csv_file = os.path.join(self.data_dir, f"{symbol}.csv")
 
         if not os.path.exists(csv_file):
@@ -376,9 +367,7 @@ class DataAnalyzer:
 
         df = pd.read_csv(csv_file)
         df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
-
-        return df
+        return TimeSeries(df, symbol)
 
     def get_available_symbols(self) -> List[str]:
         """获取所有可用的交易对"""
@@ -389,21 +378,21 @@ class DataAnalyzer:
     def analyze_changes(self, symbol: str, hours: int = 24) -> Dict[str, any]:
         """分析指定时间段内的数据变化"""
         try:
-            df = self.load_symbol_data(symbol)
+            series = self.load_series(symbol)
 
-            if len(df) < 2:
+            if len(series) < 2:
                 return {"error": "数据不足"}
 
-            # 计算时间范围
+            # 计算时间范围（二分查找窗口起点）
             cutoff_time = datetime.now() - timedelta(hours=hours)
-            recent_data = df[df['timestamp'] >= cutoff_time]
+            recent_data = series.since(cutoff_time)
 
             if len(recent_data) < 2:
                 return {"error": "指定时间段内数据不足"}
 
             # 获取最新和最旧的数据点
-            latest = recent_data.iloc[-1]
-            oldest = recent_data.iloc[0]
+            latest = recent_data.last()
+            oldest = recent_data.first()
 
             # 计算变化
             changes = {
@@ -4,30 +4,15 @@ Utility script to get all available USDT perpetual trading pairs from Binance
 """
 
 import requests
+import http_client
 import json
 
+from symbol_universe import get_default_universe
 
-def get_usdt_perpetual_symbols():
-    """Get all USDT perpetual trading pairs"""
-    url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
 
-        usdt_symbols = []
-        for symbol_info in data["symbols"]:
-            if (symbol_info["quoteAsset"] == "USDT" and
-                symbol_info["contractType"] == "PERPETUAL" and
-                symbol_info["status"] == "TRADING"):
-                usdt_symbols.append(symbol_info["symbol"])
-
-        return sorted(usdt_symbols)
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange info: {e}")
-        return []
+def get_usdt_perpetual_symbols():
+    """Get all USDT perpetual trading pairs (served from the cached symbol universe)"""
+    return get_default_universe().get_symbols()
 
 
 def get_top_symbols_by_volume(limit: int = 20):
@@ -35,7 +20,7 @@ def get_top_symbols_by_volume(limit: int = 20):
     url = "https://fapi.binance.com/fapi/v1/ticker/24hr"
 
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
         response.raise_for_status()
         data = response.json()
 
@@ -2,221 +2,359 @@
 """
 图表生成器
 为监控提醒生成价格、持仓量、费率变化的图表
+
+渲染使用面向对象的 Figure + FigureCanvasAgg（非交互的Agg后端），不使用 pyplot 和
+seaborn 的全局状态，可以在任意线程或进程中并发执行。ChartGenerator 的 submit_* 方法
+把渲染放到共享的进程池（ChartRenderPool）中，立即返回 Future，调用方可以先发送
+文字提醒，图表渲染完成后再通过回调补发；多个图表在不同进程中并行渲染。
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import multiprocessing
 import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
+
+import pandas as pd
+from matplotlib import rc_context
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from storage import SnapshotStore
+
+
+# 渲染进程数
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '2'))
+
+CHART_DPI = 150
+
+# husl 调色板（与 seaborn.color_palette("husl", n) 相同的颜色）
+HUSL_4 = [(0.9678, 0.4413, 0.5358), (0.5921, 0.6418, 0.1935),
+          (0.2104, 0.6773, 0.6434), (0.6423, 0.5498, 0.9583)]
+HUSL_6 = [(0.9678, 0.4413, 0.5358), (0.7350, 0.5953, 0.1944), (0.3127, 0.6929, 0.1924),
+          (0.2104, 0.6773, 0.6434), (0.2330, 0.6396, 0.9261), (0.9083, 0.4020, 0.9577)]
+
+# 中文字体设置只在渲染期间生效，不修改全局 rcParams
+CHART_RC = {
+    'font.sans-serif': ['Arial Unicode MS', 'DejaVu Sans'],
+    'axes.unicode_minus': False,
+}
+
+
+def _new_figure(rows: int, cols: int, figsize: tuple):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(rows, cols)
+
+
+def _style_axis(ax, title: str, ylabel: str, legend: bool = True):
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_ylabel(ylabel)
+    if legend:
+        ax.legend()
+    ax.grid(True, alpha=0.3)
+    # 旋转x轴标签
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def render_monitoring_chart(symbol: str, df: pd.DataFrame, funding_rate: float, oi_ratio: Optional[float],
+                            chart_path: str, dpi: int = CHART_DPI) -> str:
+    """渲染监控图表并保存到 chart_path（可在工作进程中执行）"""
+    with rc_context(CHART_RC):
+        oi_ratio_text = f"{oi_ratio:.2f}x" if oi_ratio is not None else "N/A"
+        fig, axes = _new_figure(2, 2, (16, 12))
+        fig.suptitle(f'{symbol} 监控分析图表\n(资金费率: {funding_rate:.4f}, OI比率: {oi_ratio_text})',
+                     fontsize=16, fontweight='bold')
+
+        # 1. 价格走势图
+        ax1 = axes[0, 0]
+        ax1.plot(df['timestamp'], df['mark_price'],
+                 color=HUSL_4[0], linewidth=2, label='标记价格')
+        ax1.plot(df['timestamp'], df['index_price'],
+                 color=HUSL_4[1], linewidth=2, label='指数价格', linestyle='--')
+        _style_axis(ax1, '价格走势', '价格 (USDT)')
+
+        # 2. 基差变化图
+        ax2 = axes[0, 1]
+        ax2.plot(df['timestamp'], df['basis_percent'],
+                 color=HUSL_4[2], linewidth=2, label='基差百分比')
+        ax2.axhline(y=0, color='red', linestyle='-', alpha=0.3)
+        _style_axis(ax2, '基差变化', '基差百分比 (%)')
+
+        # 3. 持仓量变化图
+        ax3 = axes[1, 0]
+        ax3.plot(df['timestamp'], df['oi'],
+                 color=HUSL_4[3], linewidth=2, label='持仓量')
+        _style_axis(ax3, '持仓量变化', '持仓量')
+
+        # 4. 资金费率变化图
+        ax4 = axes[1, 1]
+        ax4.plot(df['timestamp'], df['last_funding_rate'] * 100,
+                 color='purple', linewidth=2, label='资金费率')
+        ax4.axhline(y=0.1, color='red', linestyle='--', alpha=0.7, label='0.1%阈值')
+        ax4.axhline(y=-0.1, color='red', linestyle='--', alpha=0.7)
+        _style_axis(ax4, '资金费率变化', '资金费率 (%)')
+
+        fig.tight_layout()
+        fig.savefig(chart_path, dpi=dpi, bbox_inches='tight')
+    return chart_path
+
+
+def render_detailed_analysis(symbol: str, df: pd.DataFrame, chart_path: str, dpi: int = CHART_DPI) -> str:
+    """渲染详细分析图表并保存到 chart_path（可在工作进程中执行）"""
+    with rc_context(CHART_RC):
+        fig, axes = _new_figure(3, 2, (18, 15))
+        fig.suptitle(f'{symbol} 详细分析报告', fontsize=18, fontweight='bold')
+        for ax in axes.flat:
+            ax.set_prop_cycle(color=HUSL_6)
+
+        # 1. 价格和基差对比
+        ax1 = axes[0, 0]
+        ax1.plot(df['timestamp'], df['mark_price'], label='标记价格', linewidth=2)
+        ax1.plot(df['timestamp'], df['index_price'], label='指数价格', linewidth=2, linestyle='--')
+        _style_axis(ax1, '价格对比', '价格')
+
+        # 2. 基差百分比
+        ax2 = axes[0, 1]
+        ax2.plot(df['timestamp'], df['basis_percent'],
+                 color='orange', linewidth=2)
+        ax2.axhline(y=0, color='red', linestyle='-', alpha=0.3)
+        _style_axis(ax2, '基差百分比', '基差 (%)', legend=False)
+
+        # 3. 持仓量变化
+        ax3 = axes[1, 0]
+        ax3.plot(df['timestamp'], df['oi'],
+                 color='green', linewidth=2)
+        _style_axis(ax3, '持仓量变化', '持仓量', legend=False)
+
+        # 4. 资金费率
+        ax4 = axes[1, 1]
+        ax4.plot(df['timestamp'], df['last_funding_rate'] * 100,
+                 color='purple', linewidth=2)
+        ax4.axhline(y=0.1, color='red', linestyle='--', alpha=0.7, label='0.1%阈值')
+        ax4.axhline(y=-0.1, color='red', linestyle='--', alpha=0.7)
+        _style_axis(ax4, '资金费率', '资金费率 (%)')
+
+        # 5. 多空比率
+        ax5 = axes[2, 0]
+        ax5.plot(df['timestamp'], df['long_short_account_ratio'],
+                 label='账户多空比', linewidth=2)
+        ax5.plot(df['timestamp'], df['top_trader_account_ls_ratio'],
+                 label='大户账户多空比', linewidth=2, linestyle='--')
+        _style_axis(ax5, '多空比率', '比率')
+
+        # 6. 主动买卖比
+        ax6 = axes[2, 1]
+        ax6.plot(df['timestamp'], df['taker_buy_sell_ratio'],
+                 color='brown', linewidth=2)
+        ax6.axhline(y=1, color='red', linestyle='--', alpha=0.3, label='平衡线')
+        _style_axis(ax6, '主动买卖比', '买卖比率')
+
+        fig.tight_layout()
+        fig.savefig(chart_path, dpi=dpi, bbox_inches='tight')
+    return chart_path
+
+
+class ChartRenderPool:
+    """
+    图表渲染进程池
+
+    渲染在工作进程中执行（spawn 方式启动，不继承调用进程的线程和锁）；完成回调在
+    单独的投递线程中依次执行，回调里发送 Telegram 图片不会阻塞进程池处理其他结果。
+    """
+
+    def __init__(self, workers: int = CHART_WORKERS):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._delivery: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, callback: Optional[Callable[[Optional[str]], None]] = None) -> Future:
+        """
+        提交渲染任务
+
+        Args:
+            fn: 渲染函数（模块级函数，返回图表路径）
+            callback: 渲染完成后在投递线程中以图表路径调用（渲染失败时为None）
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._delivery = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart-delivery')
+            executor, delivery = self._executor, self._delivery
+
+        future = executor.submit(fn, *args)
+        if callback is not None:
+            # 关闭时先等待渲染进程池，再关闭投递线程，回调始终能提交到投递线程
+            future.add_done_callback(lambda f: delivery.submit(self._deliver, f, callback))
+        return future
+
+    @staticmethod
+    def _deliver(future: Future, callback: Callable[[Optional[str]], None]):
+        try:
+            chart_path = future.result()
+        except Exception as e:
+            print(f"生成图表失败: {e}")
+            chart_path = None
+        try:
+            callback(chart_path)
+        except Exception as e:
+            print(f"图表回调失败: {e}")
+
+    def shutdown(self, wait: bool = True):
+        """等待已提交的渲染和回调完成后关闭"""
+        with self._lock:
+            executor, delivery = self._executor, self._delivery
+            self._executor = self._delivery = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+            delivery.shutdown(wait=wait)
+
+
+_default_pool: Optional[ChartRenderPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_chart_pool() -> ChartRenderPool:
+    """进程共享的图表渲染池（按需启动工作进程）"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ChartRenderPool()
+        return _default_pool
+
+
+def _completed(result=None) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
 
 
 class ChartGenerator:
-    def __init__(self, output_dir: str = "charts"):
+    def __init__(self, output_dir: str = "charts", store: Optional[SnapshotStore] = None,
+                 history_rows: int = 1000, pool: Optional[ChartRenderPool] = None):
+        """
+        Args:
+            output_dir: 图表输出目录
+            store: 存储后端，未传入 df 时从中读取历史数据
+            history_rows: 从存储后端读取的最大行数
+            pool: 后台渲染使用的进程池，默认使用进程共享的渲染池
+        """
         self.output_dir = output_dir
+        self.store = store
+        self.history_rows = history_rows
+        self.pool = pool
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # 设置中文字体（如果需要显示中文）
-        plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
+    def load_data(self, symbol: str) -> Optional[pd.DataFrame]:
+        """从存储后端读取最近 history_rows 行历史数据"""
+        if self.store is None:
+            return None
+        try:
+            return self.store.read(symbol, last_n=self.history_rows)
+        except Exception as e:
+            print(f"加载 {symbol} 图表数据失败: {e}")
+            return None
+
+    def _chart_path(self, symbol: str, kind: str) -> str:
+        # 带微秒，同一秒内并行渲染的图表不会互相覆盖
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        return os.path.join(self.output_dir, f"{symbol}_{kind}_{timestamp}.png")
+
+    def _monitoring_args(self, symbol: str, df: Optional[pd.DataFrame],
+                         funding_rate: float, oi_ratio: Optional[float]) -> Optional[tuple]:
+        if df is None:
+            df = self.load_data(symbol)
+
+        if df is None or len(df) < 5:
+            print(f"数据不足，无法为 {symbol} 生成图表")
+            return None
+        return symbol, df, funding_rate, oi_ratio, self._chart_path(symbol, 'monitor')
+
+    def _detailed_args(self, symbol: str, df: Optional[pd.DataFrame]) -> Optional[tuple]:
+        if df is None:
+            df = self.load_data(symbol)
 
-    def generate_monitoring_chart(self, symbol: str, df: pd.DataFrame,
-                                funding_rate: float, oi_ratio: float) -> Optional[str]:
+        if df is None or len(df) < 10:
+            return None
+        return symbol, df, self._chart_path(symbol, 'detailed')
+
+    def generate_monitoring_chart(self, symbol: str, df: Optional[pd.DataFrame] = None,
+                                funding_rate: float = 0.0, oi_ratio: float = 0.0) -> Optional[str]:
         """
-        生成监控图表
+        生成监控图表（在当前线程中渲染）
 
         Args:
             symbol: 交易对名称
-            df: 包含历史数据的数据框
+            df: 包含历史数据的数据框，为None时从存储后端读取
             funding_rate: 当前资金费率
             oi_ratio: OI比率
 
         Returns:
             str: 图表文件路径，如果生成失败返回None
         """
-        if len(df) < 5:
-            print(f"数据不足，无法为 {symbol} 生成图表")
+        args = self._monitoring_args(symbol, df, funding_rate, oi_ratio)
+        if args is None:
             return None
 
         try:
-            # 创建图表
-            fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-            fig.suptitle(f'{symbol} 监控分析图表\n(资金费率: {funding_rate:.4f}, OI比率: {oi_ratio:.2f}x)',
-                        fontsize=16, fontweight='bold')
-
-            # 设置颜色
-            colors = sns.color_palette("husl", 4)
-
-            # 1. 价格走势图
-            ax1 = axes[0, 0]
-            ax1.plot(df['timestamp'], df['mark_price'],
-                    color=colors[0], linewidth=2, label='标记价格')
-            ax1.plot(df['timestamp'], df['index_price'],
-                    color=colors[1], linewidth=2, label='指数价格', linestyle='--')
-            ax1.set_title('价格走势', fontsize=14, fontweight='bold')
-            ax1.set_ylabel('价格 (USDT)')
-            ax1.legend()
-            ax1.grid(True, alpha=0.3)
-
-            # 旋转x轴标签
-            plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
-
-            # 2. 基差变化图
-            ax2 = axes[0, 1]
-            ax2.plot(df['timestamp'], df['basis_percent'],
-                    color=colors[2], linewidth=2, label='基差百分比')
-            ax2.axhline(y=0, color='red', linestyle='-', alpha=0.3)
-            ax2.set_title('基差变化', fontsize=14, fontweight='bold')
-            ax2.set_ylabel('基差百分比 (%)')
-            ax2.legend()
-            ax2.grid(True, alpha=0.3)
-            plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45)
-
-            # 3. 持仓量变化图
-            ax3 = axes[1, 0]
-            ax3.plot(df['timestamp'], df['oi'],
-                    color=colors[3], linewidth=2, label='持仓量')
-            ax3.set_title('持仓量变化', fontsize=14, fontweight='bold')
-            ax3.set_ylabel('持仓量')
-            ax3.legend()
-            ax3.grid(True, alpha=0.3)
-            plt.setp(ax3.xaxis.get_majorticklabels(), rotation=45)
-
-            # 4. 资金费率变化图
-            ax4 = axes[1, 1]
-            ax4.plot(df['timestamp'], df['last_funding_rate'] * 100,
-                    color='purple', linewidth=2, label='资金费率')
-            ax4.axhline(y=0.1, color='red', linestyle='--', alpha=0.7, label='0.1%阈值')
-            ax4.axhline(y=-0.1, color='red', linestyle='--', alpha=0.7)
-            ax4.set_title('资金费率变化', fontsize=14, fontweight='bold')
-            ax4.set_ylabel('资金费率 (%)')
-            ax4.legend()
-            ax4.grid(True, alpha=0.3)
-            plt.setp(ax4.xaxis.get_majorticklabels(), rotation=45)
-
-            # 调整布局
-            plt.tight_layout()
-
-            # 保存图表
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            chart_filename = f"{symbol}_monitor_{timestamp}.png"
-            chart_path = os.path.join(self.output_dir, chart_filename)
-
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
+            chart_path = render_monitoring_chart(*args)
             print(f"图表已保存: {chart_path}")
             return chart_path
-
         except Exception as e:
             print(f"生成图表失败: {e}")
             return None
 
-    def generate_detailed_analysis(self, symbol: str, df: pd.DataFrame) -> Optional[str]:
+    def generate_detailed_analysis(self, symbol: str, df: Optional[pd.DataFrame] = None) -> Optional[str]:
         """
-        生成详细分析图表
+        生成详细分析图表（在当前线程中渲染）
 
         Args:
             symbol: 交易对名称
-            df: 包含历史数据的数据框
+            df: 包含历史数据的数据框，为None时从存储后端读取
 
         Returns:
             str: 图表文件路径
         """
-        if len(df) < 10:
+        args = self._detailed_args(symbol, df)
+        if args is None:
             return None
 
         try:
-            # 创建更详细的图表
-            fig, axes = plt.subplots(3, 2, figsize=(18, 15))
-            fig.suptitle(f'{symbol} 详细分析报告', fontsize=18, fontweight='bold')
-
-            # 设置颜色主题
-            sns.set_palette("husl")
-
-            # 1. 价格和基差对比
-            ax1 = axes[0, 0]
-            ax1.plot(df['timestamp'], df['mark_price'], label='标记价格', linewidth=2)
-            ax1.plot(df['timestamp'], df['index_price'], label='指数价格', linewidth=2, linestyle='--')
-            ax1.set_title('价格对比', fontsize=14, fontweight='bold')
-            ax1.set_ylabel('价格')
-            ax1.legend()
-            ax1.grid(True, alpha=0.3)
-            plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
-
-            # 2. 基差百分比
-            ax2 = axes[0, 1]
-            ax2.plot(df['timestamp'], df['basis_percent'],
-                    color='orange', linewidth=2)
-            ax2.axhline(y=0, color='red', linestyle='-', alpha=0.3)
-            ax2.set_title('基差百分比', fontsize=14, fontweight='bold')
-            ax2.set_ylabel('基差 (%)')
-            ax2.grid(True, alpha=0.3)
-            plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45)
-
-            # 3. 持仓量变化
-            ax3 = axes[1, 0]
-            ax3.plot(df['timestamp'], df['oi'],
-                    color='green', linewidth=2)
-            ax3.set_title('持仓量变化', fontsize=14, fontweight='bold')
-            ax3.set_ylabel('持仓量')
-            ax3.grid(True, alpha=0.3)
-            plt.setp(ax3.xaxis.get_majorticklabels(), rotation=45)
-
-            # 4. 资金费率
-            ax4 = axes[1, 1]
-            ax4.plot(df['timestamp'], df['last_funding_rate'] * 100,
-                    color='purple', linewidth=2)
-            ax4.axhline(y=0.1, color='red', linestyle='--', alpha=0.7, label='0.1%阈值')
-            ax4.axhline(y=-0.1, color='red', linestyle='--', alpha=0.7)
-            ax4.set_title('资金费率', fontsize=14, fontweight='bold')
-            ax4.set_ylabel('资金费率 (%)')
-            ax4.legend()
-            ax4.grid(True, alpha=0.3)
-            plt.setp(ax4.xaxis.get_majorticklabels(), rotation=45)
-
-            # 5. 多空比率
-            ax5 = axes[2, 0]
-            ax5.plot(df['timestamp'], df['long_short_account_ratio'],
-                    label='账户多空比', linewidth=2)
-            ax5.plot(df['timestamp'], df['top_trader_account_ls_ratio'],
-                    label='大户账户多空比', linewidth=2, linestyle='--')
-            ax5.set_title('多空比率', fontsize=14, fontweight='bold')
-            ax5.set_ylabel('比率')
-            ax5.legend()
-            ax5.grid(True, alpha=0.3)
-            plt.setp(ax5.xaxis.get_majorticklabels(), rotation=45)
-
-            # 6. 主动买卖比
-            ax6 = axes[2, 1]
-            ax6.plot(df['timestamp'], df['taker_buy_sell_ratio'],
-                    color='brown', linewidth=2)
-            ax6.axhline(y=1, color='red', linestyle='--', alpha=0.3, label='平衡线')
-            ax6.set_title('主动买卖比', fontsize=14, fontweight='bold')
-            ax6.set_ylabel('买卖比率')
-            ax6.legend()
-            ax6.grid(True, alpha=0.3)
-            plt.setp(ax6.xaxis.get_majorticklabels(), rotation=45)
-
-            # 调整布局
-            plt.tight_layout()
-
-            # 保存图表
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            chart_filename = f"{symbol}_detailed_{timestamp}.png"
-            chart_path = os.path.join(self.output_dir, chart_filename)
-
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
+            chart_path = render_detailed_analysis(*args)
             print(f"详细图表已保存: {chart_path}")
             return chart_path
-
         except Exception as e:
             print(f"生成详细图表失败: {e}")
             return None
 
+    def submit_monitoring_chart(self, symbol: str, df: Optional[pd.DataFrame] = None,
+                                funding_rate: float = 0.0, oi_ratio: Optional[float] = 0.0,
+                                callback: Optional[Callable[[Optional[str]], None]] = None) -> Future:
+        """
+        在渲染进程池中生成监控图表，立即返回 Future（结果为图表路径，失败时为None）
+
+        数据在当前线程中读取，只有渲染放到工作进程中执行。callback 在图表完成后调用。
+        """
+        args = self._monitoring_args(symbol, df, funding_rate, oi_ratio)
+        if args is None:
+            if callback is not None:
+                callback(None)
+            return _completed(None)
+        return (self.pool or get_default_chart_pool()).submit(render_monitoring_chart, *args, callback=callback)
+
+    def submit_detailed_analysis(self, symbol: str, df: Optional[pd.DataFrame] = None,
+                                 callback: Optional[Callable[[Optional[str]], None]] = None) -> Future:
+        """在渲染进程池中生成详细分析图表，立即返回 Future"""
+        args = self._detailed_args(symbol, df)
+        if args is None:
+            if callback is not None:
+                callback(None)
+            return _completed(None)
+        return (self.pool or get_default_chart_pool()).submit(render_detailed_analysis, *args, callback=callback)
+
 
 def test_chart_generation():
     """测试图表生成功能"""
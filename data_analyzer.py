@@ -5,113 +5,110 @@
 """
 
 import pandas as pd
-import os
-import glob
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
+from archive import ColdArchive, TieredStore, get_default_archive
+from report_engine import REPORT_HORIZONS, ReportEngine, changes_between
+from storage import SnapshotStore, create_store
+from timeseries import TimeSeries
 
 
 class DataAnalyzer:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", store: Optional[SnapshotStore] = None,
+                 archive: Optional[ColdArchive] = None, report_workers: Optional[int] = None,
+                 use_cache: Optional[bool] = None):
+        """
+        Args:
+            store: 热数据存储后端
+            archive: 冷数据归档，默认取环境变量 ARCHIVE_DIR；配置后读取的是热数据+归档的完整历史
+            report_workers: 生成报告的进程数，默认取环境变量 REPORT_WORKERS
+            use_cache: 生成报告时是否使用增量分析缓存，默认取环境变量 ANALYTICS_CACHE
+        """
         self.data_dir = data_dir
+        self.report_workers = report_workers
+        self.use_cache = use_cache
+        self.store = store or create_store(data_dir=data_dir)
 
-    def load_symbol_data(self, symbol: str) -> pd.DataFrame:
-        """加载单个交易对的历史数据"""
-        csv_file = os.path.join(self.data_dir, f"{symbol}.csv")
+        archive = archive or get_default_archive()
+        if archive is not None:
+            self.store = TieredStore(self.store, archive)
 
-        if not os.path.exists(csv_file):
-            raise FileNotFoundError(f"数据文件不存在: {csv_file}")
+    def load_symbol_data(self, symbol: str, last_n: Optional[int] = None,
+                         start: Optional[datetime] = None) -> pd.DataFrame:
+        """加载单个交易对的历史数据（可只加载最近N行或某个时间之后的数据）"""
+        df = self.store.read(symbol, last_n=last_n, start=start)
 
-        df = pd.read_csv(csv_file)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
+        if df is None:
+            raise FileNotFoundError(f"数据不存在: {symbol}")
 
         return df
 
     def get_available_symbols(self) -> List[str]:
         """获取所有可用的交易对"""
-        csv_files = glob.glob(os.path.join(self.data_dir, "*.csv"))
-        symbols = [os.path.basename(f).replace('.csv', '') for f in csv_files]
-        return sorted(symbols)
-
-    def analyze_changes(self, symbol: str, hours: int = 24) -> Dict[str, any]:
-        """分析指定时间段内的数据变化"""
+        return self.store.symbols()
+
+    def load_series(self, symbol: str, last_n: Optional[int] = None,
+                    start: Optional[datetime] = None) -> TimeSeries:
+        """加载单个交易对的历史数据为按时间索引的序列，可在多个周期之间复用"""
+        return TimeSeries(self.load_symbol_data(symbol, last_n=last_n, start=start), symbol)
+
+    def analyze_changes(self, symbol: str, hours: int = 24,
+                        recent_data: Union[pd.DataFrame, TimeSeries, None] = None) -> Dict[str, any]:
+        """
+        分析指定时间段内的数据变化
+
+        Args:
+            recent_data: 已加载的数据，为None时从存储读取。DataFrame 视为已经是该时间窗口的数据；
+                TimeSeries 可以包含更长的历史，窗口边界用二分查找定位
+        """
         try:
-            df = self.load_symbol_data(symbol)
-
-            if len(df) < 2:
-                return {"error": "数据不足"}
-
-            # 计算时间范围
             cutoff_time = datetime.now() - timedelta(hours=hours)
-            recent_data = df[df['timestamp'] >= cutoff_time]
-
-            if len(recent_data) < 2:
+            if recent_data is None:
+                # 只读取时间范围内的数据
+                window = self.load_series(symbol, start=cutoff_time)
+            elif isinstance(recent_data, TimeSeries):
+                window = recent_data.since(cutoff_time)
+            else:
+                window = TimeSeries(recent_data, symbol)
+
+            if len(window) < 2:
                 return {"error": "指定时间段内数据不足"}
 
-            # 获取最新和最旧的数据点
-            latest = recent_data.iloc[-1]
-            oldest = recent_data.iloc[0]
-
-            # 计算变化
-            changes = {
-                'symbol': symbol,
-                'period_hours': hours,
-                'data_points': len(recent_data),
-                'mark_price_change': latest['mark_price'] - oldest['mark_price'],
-                'mark_price_change_pct': ((latest['mark_price'] - oldest['mark_price']) / oldest['mark_price']) * 100,
-                'basis_change': latest['basis'] - oldest['basis'],
-                'basis_percent_change': latest['basis_percent'] - oldest['basis_percent'],
-                'funding_rate_change': latest['last_funding_rate'] - oldest['last_funding_rate'],
-                'oi_change': latest['oi'] - oldest['oi'],
-                'oi_change_pct': ((latest['oi'] - oldest['oi']) / oldest['oi']) * 100 if oldest['oi'] != 0 else 0,
-                'account_ratio_change': latest['long_short_account_ratio'] - oldest['long_short_account_ratio'],
-                'taker_ratio_change': latest['taker_buy_sell_ratio'] - oldest['taker_buy_sell_ratio'],
-                'latest_timestamp': latest['timestamp'],
-                'oldest_timestamp': oldest['timestamp']
-            }
-
-            return changes
+            return changes_between(symbol, hours, window.first(), window.last(), len(window))
 
         except Exception as e:
             return {"error": str(e)}
 
     def find_extreme_changes(self, hours: int = 24, top_n: int = 10) -> Dict[str, List[Dict]]:
         """查找变化最大的交易对"""
-        symbols = self.get_available_symbols()
-        all_changes = []
-
-        print(f"分析 {len(symbols)} 个交易对在过去 {hours} 小时内的变化...")
-
-        for symbol in symbols:
-            changes = self.analyze_changes(symbol, hours)
-            if 'error' not in changes:
-                all_changes.append(changes)
-
-        # 按不同指标排序
-        results = {
-            'price_increase': sorted(all_changes, key=lambda x: x['mark_price_change_pct'], reverse=True)[:top_n],
-            'price_decrease': sorted(all_changes, key=lambda x: x['mark_price_change_pct'])[:top_n],
-            'basis_increase': sorted(all_changes, key=lambda x: x['basis_percent_change'], reverse=True)[:top_n],
-            'basis_decrease': sorted(all_changes, key=lambda x: x['basis_percent_change'])[:top_n],
-            'funding_increase': sorted(all_changes, key=lambda x: x['funding_rate_change'], reverse=True)[:top_n],
-            'funding_decrease': sorted(all_changes, key=lambda x: x['funding_rate_change'])[:top_n],
-            'oi_increase': sorted(all_changes, key=lambda x: x['oi_change_pct'], reverse=True)[:top_n],
-            'oi_decrease': sorted(all_changes, key=lambda x: x['oi_change_pct'])[:top_n]
-        }
+        return self.find_extreme_changes_multi([hours], top_n)[hours]
 
-        return results
+    def find_extreme_changes_multi(self, horizons: List[int], top_n: int = 10) -> Dict[int, Dict[str, List[Dict]]]:
+        """一次读取所有交易对，同时查找多个周期内变化最大的交易对 {周期小时数: {类别: [变化]}}"""
+        engine = ReportEngine(self.store, horizons, workers=self.report_workers, use_cache=self.use_cache)
+        symbols = self.get_available_symbols()
+        print(f"分析 {len(symbols)} 个交易对在过去 {'/'.join(str(hours) for hours in horizons)} 小时内的变化...")
+        return engine.extreme_changes(top_n, symbols)
 
     def generate_report(self, hours: int = 24):
         """生成分析报告"""
+        self.generate_reports([hours])
+
+    def generate_reports(self, horizons: Optional[List[int]] = None):
+        """一次读取数据，依次打印多个周期的分析报告（默认取环境变量 REPORT_HORIZONS）"""
+        horizons = list(horizons or REPORT_HORIZONS)
+        results = self.find_extreme_changes_multi(horizons)
+        for hours in horizons:
+            self.print_report(hours, results[hours])
+
+    def print_report(self, hours: int, extreme_changes: Dict[str, List[Dict]]):
+        """打印一个周期的分析报告"""
         print(f"\n{'='*60}")
         print(f"Binance永续合约数据分析报告")
         print(f"时间范围: 过去 {hours} 小时")
         print(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*60}")
 
-        extreme_changes = self.find_extreme_changes(hours)
-
         # 价格变化分析
         print(f"\n📈 价格涨幅Top 10:")
         for i, change in enumerate(extreme_changes['price_increase'], 1):
@@ -148,6 +145,23 @@ class DataAnalyzer:
         for i, change in enumerate(extreme_changes['oi_decrease'], 1):
             print(f"  {i:2d}. {change['symbol']}: {change['oi_change_pct']:.2f}%")
 
+        # 多空比和主动买卖比变化分析
+        print(f"\n⚖️ 多空账户比上升Top 10:")
+        for i, change in enumerate(extreme_changes['account_ratio_increase'], 1):
+            print(f"  {i:2d}. {change['symbol']}: +{change['account_ratio_change']:.4f}")
+
+        print(f"\n⚖️ 多空账户比下降Top 10:")
+        for i, change in enumerate(extreme_changes['account_ratio_decrease'], 1):
+            print(f"  {i:2d}. {change['symbol']}: {change['account_ratio_change']:.4f}")
+
+        print(f"\n🔄 主动买卖比上升Top 10:")
+        for i, change in enumerate(extreme_changes['taker_ratio_increase'], 1):
+            print(f"  {i:2d}. {change['symbol']}: +{change['taker_ratio_change']:.4f}")
+
+        print(f"\n🔄 主动买卖比下降Top 10:")
+        for i, change in enumerate(extreme_changes['taker_ratio_decrease'], 1):
+            print(f"  {i:2d}. {change['symbol']}: {change['taker_ratio_change']:.4f}")
+
 
 def main():
     """主函数"""
@@ -1,16 +1,14 @@
 #!/usr/bin/env python3
 """
 Binance永续合约数据采集器
-每5分钟自动获取所有USDT永续合约交易对数据并保存到CSV文件
+每5分钟自动获取所有USDT永续合约交易对数据并保存到存储后端（CSV或列式存储）
 """
 
-import csv
-import os
-import time
 from datetime import datetime
 from typing import Dict, List
 from binance_data_snapshot import BinanceDataSnapshot
 from binance_symbols import get_usdt_perpetual_symbols
+from storage import create_store
 
 
 class DataCollector:
@@ -18,55 +16,12 @@ class DataCollector:
         self.data_dir = data_dir
         self.snapshot = BinanceDataSnapshot()
 
-        # 确保数据目录存在
-        os.makedirs(self.data_dir, exist_ok=True)
-
-    def save_to_csv(self, symbol: str, data: Dict[str, any]):
-        """将数据保存到CSV文件"""
-        csv_file = os.path.join(self.data_dir, f"{symbol}.csv")
-
-        # CSV文件头
-        fieldnames = [
-            'timestamp',
-            'mark_price',
-            'index_price',
-            'basis',
-            'basis_percent',
-            'last_funding_rate',
-            'next_funding_time',
-            'oi',
-            'long_short_account_ratio',
-            'top_trader_account_ls_ratio',
-            'top_trader_position_ls_ratio',
-            'taker_buy_sell_ratio'
-        ]
-
-        # 检查文件是否存在，如果不存在则写入表头
-        file_exists = os.path.isfile(csv_file)
-
-        with open(csv_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-
-            if not file_exists:
-                writer.writeheader()
-
-            # 准备要写入的数据
-            row_data = {
-                'timestamp': data['timestamp'],
-                'mark_price': data['mark_price'],
-                'index_price': data['index_price'],
-                'basis': data['basis'],
-                'basis_percent': data['basis_percent'],
-                'last_funding_rate': data['last_funding_rate'],
-                'next_funding_time': data['next_funding_time'],
-                'oi': data['oi'],
-                'long_short_account_ratio': data['long_short_account_ratio'],
-                'top_trader_account_ls_ratio': data['top_trader_account_ls_ratio'],
-                'top_trader_position_ls_ratio': data['top_trader_position_ls_ratio'],
-                'taker_buy_sell_ratio': data['taker_buy_sell_ratio']
-            }
-
-            writer.writerow(row_data)
+        # 存储后端（由环境变量 STORAGE_BACKEND 选择，会自动创建数据目录）
+        self.store = create_store(data_dir=self.data_dir)
+
+    def save_snapshot(self, symbol: str, data: Dict[str, any]):
+        """将数据保存到存储后端"""
+        self.store.append(symbol, data)
 
     def collect_data_for_symbols(self, symbols: List[str]):
         """为指定的交易对列表收集数据"""
@@ -75,23 +30,26 @@ class DataCollector:
         success_count = 0
         error_count = 0
 
-        for symbol in symbols:
-            try:
-                # 获取数据快照
-                data = self.snapshot.get_data_snapshot(symbol)
+        # 并发获取所有交易对的数据快照
+        snapshots = self.snapshot.get_multiple_symbols_snapshot(symbols)
 
-                # 保存到CSV
-                self.save_to_csv(symbol, data)
+        # 本周期的写入合并为一批
+        with self.store.batch():
+            for symbol in symbols:
+                try:
+                    data = snapshots.get(symbol)
+                    if data is None:
+                        raise ValueError("未获取到数据快照")
 
-                success_count += 1
-                print(f"  ✓ {symbol}: 数据已保存")
+                    # 保存到存储后端
+                    self.save_snapshot(symbol, data)
 
-                # 添加延迟避免API限制
-                time.sleep(0.1)
+                    success_count += 1
+                    print(f"  ✓ {symbol}: 数据已保存")
 
-            except Exception as e:
-                error_count += 1
-                print(f"  ✗ {symbol}: 错误 - {e}")
+                except Exception as e:
+                    error_count += 1
+                    print(f"  ✗ {symbol}: 错误 - {e}")
 
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 数据收集完成: {success_count} 成功, {error_count} 失败")
         return success_count, error_count
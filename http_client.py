@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+共享HTTP客户端
+为所有Binance和Telegram请求提供按主机划分的持久连接池（keep-alive），
+避免每次请求重新进行TCP+TLS握手，并在5xx和连接重置时按指数退避重试
+
+可通过环境变量调整：
+- HTTP_POOL_CONNECTIONS: 每个会话缓存的连接池数量
+- HTTP_POOL_MAXSIZE: 每个主机连接池的最大连接数
+- HTTP_MAX_RETRIES: 最大重试次数
+- HTTP_BACKOFF_FACTOR: 退避系数（秒）
+- HTTP_TIMEOUT: 默认超时时间（秒）
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+DEFAULT_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+
+# 需要重试的服务端错误状态码
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def _build_retry() -> Retry:
+    """构建重试策略
+
+    状态码重试只针对幂等的GET/HEAD请求；连接建立失败（包括连接重置）
+    对所有方法都会重试，因为此时请求尚未发送到服务端。
+    """
+    return Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+
+
+def _host_key(url: str) -> str:
+    """提取URL的 scheme://host 作为连接池键"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url: str) -> requests.Session:
+    """获取指定主机的共享会话，不存在时创建"""
+    key = _host_key(url)
+
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=_build_retry()
+            )
+            session.mount(key, adapter)
+            _sessions[key] = session
+
+    return session
+
+
+def configure(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None,
+              max_retries: Optional[int] = None, backoff_factor: Optional[float] = None,
+              timeout: Optional[float] = None):
+    """调整连接池参数，已创建的会话会被关闭并在下次请求时按新参数重建"""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, MAX_RETRIES, BACKOFF_FACTOR, DEFAULT_TIMEOUT
+
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if backoff_factor is not None:
+        BACKOFF_FACTOR = backoff_factor
+    if timeout is not None:
+        DEFAULT_TIMEOUT = timeout
+
+    close_all()
+
+
+def close_all():
+    """关闭所有共享会话"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """通过共享会话发送请求"""
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+    """发送GET请求（用法同 requests.get）"""
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url: str, data=None, json=None, **kwargs) -> requests.Response:
+    """发送POST请求（用法同 requests.post）"""
+    return request('POST', url, data=data, json=json, **kwargs)
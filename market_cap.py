@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+市值查询服务
+每个周期只请求一次全市场现货价格（/api/v3/ticker/price 不带symbol参数），
+按TTL缓存；流通量来自可替换的 SupplyProvider（见 supply_provider.py），
+流通量未知的币种直接返回None，不发起任何网络请求。
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+import http_client
+from supply_provider import DEFAULT_SUPPLY, StaticSupplyProvider, SupplyProvider
+
+
+SPOT_TICKER_URL = "https://api.binance.com/api/v3/ticker/price"
+DEFAULT_TTL = int(os.getenv('MARKET_CAP_TTL', '300'))  # 5分钟
+
+
+def base_asset(symbol: str) -> str:
+    """从交易对中提取基础币种"""
+    return symbol.replace("USDT", "")
+
+
+class MarketCapService:
+    """带TTL缓存的市值查询"""
+
+    def __init__(self, supply: Union[SupplyProvider, Dict[str, float], None] = None,
+                 ttl: int = DEFAULT_TTL, url: str = SPOT_TICKER_URL):
+        """
+        Args:
+            supply: 流通量提供者，或 {基础币种: 流通量}；默认使用内置的固定表
+            ttl: 现货价格缓存有效期（秒）
+            url: 现货价格接口地址
+        """
+        if not isinstance(supply, SupplyProvider):
+            supply = StaticSupplyProvider(DEFAULT_SUPPLY if supply is None else supply)
+        self.supply_provider = supply
+        self.ttl = ttl
+        self.url = url
+
+        self.prices: Dict[str, float] = {}
+        self.fetched_at = 0.0
+        self.requests_made = 0
+        self._lock = threading.Lock()
+
+    def is_fresh(self) -> bool:
+        return (time.time() - self.fetched_at) < self.ttl
+
+    def refresh_prices(self, force: bool = False):
+        """一次请求获取全部现货价格，缓存未过期时跳过
+
+        失败时保留旧价格，并在一个TTL内不再重试，避免每个交易对都重复请求失败的接口。
+        同时检查流通量数据是否需要刷新（文件提供者只比较修改时间）。
+        """
+        with self._lock:
+            if not force and self.is_fresh():
+                return
+
+            self.supply_provider.refresh()
+
+            try:
+                self.requests_made += 1
+                response = http_client.get(self.url, timeout=5)
+                response.raise_for_status()
+                self.prices = {item['symbol']: float(item['price']) for item in response.json()}
+            except Exception as e:
+                print(f"获取现货价格失败: {e}")
+            finally:
+                self.fetched_at = time.time()
+
+    def get_market_cap(self, symbol: str) -> Optional[float]:
+        """获取币种市值（美元），流通量或现货价格未知时返回None"""
+        supply = self.supply_provider.get_supply(base_asset(symbol))
+        if supply is None:
+            return None
+
+        self.refresh_prices()
+        price = self.prices.get(symbol)
+        if price is None:
+            return None
+        return price * supply
+
+    def get_market_caps(self, symbols: List[str]) -> List[Optional[float]]:
+        """批量获取市值，与 symbols 顺序对齐"""
+        return [self.get_market_cap(symbol) for symbol in symbols]
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+WebSocket行情流采集
+订阅合并行情流 !markPrice@arr@1s，在内存中维护每个交易对的最新状态，
+并按可配置的降采样间隔写入与REST采集相同的存储后端（store_snapshot）
+
+标记价格、指数价格和资金费率来自行情流；持仓量没有对应的全市场行情流，
+由REST按采集间隔刷新后合并进状态表。写入的快照带 oi_time（持仓量的刷新时间），
+监控据此只把真正刷新过的持仓量计入OI比率。
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - 可选依赖
+    websockets = None
+
+
+STREAM_BASE_URL = "wss://fstream.binance.com/stream"
+MARK_PRICE_STREAM = "!markPrice@arr@1s"
+
+
+def is_available() -> bool:
+    """websockets库是否可用"""
+    return websockets is not None
+
+
+class MarketStateTable:
+    """每个交易对最新行情状态的线程安全内存表"""
+
+    def __init__(self, symbols: Optional[Iterable[str]] = None):
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._symbols = set(symbols) if symbols is not None else None
+        self.messages_received = 0
+
+    def set_symbols(self, symbols: Iterable[str]):
+        """限定需要跟踪的交易对（例如只跟踪USDT永续合约）"""
+        with self._lock:
+            self._symbols = set(symbols)
+
+    def update_mark_prices(self, items: List[Dict[str, Any]]):
+        """用 markPriceUpdate 事件更新状态"""
+        with self._lock:
+            self.messages_received += 1
+            for item in items:
+                symbol = item.get("s")
+                if not symbol or (self._symbols is not None and symbol not in self._symbols):
+                    continue
+
+                state = self._states.setdefault(symbol, {})
+                state["mark_price"] = float(item.get("p", 0))
+                state["index_price"] = float(item.get("i", 0))
+                state["last_funding_rate"] = float(item.get("r") or 0)
+                state["next_funding_time"] = item.get("T", 0)
+                state["event_time"] = item.get("E", 0)
+                state["received_at"] = time.time()
+
+    def update_open_interest(self, oi_map: Dict[str, Dict[str, Any]]):
+        """合并REST获取的持仓量，记录刷新时间"""
+        oi_time = datetime.now().isoformat()
+        with self._lock:
+            for symbol, oi_data in oi_map.items():
+                if oi_data and "openInterest" in oi_data:
+                    state = self._states.setdefault(symbol, {})
+                    state["oi"] = float(oi_data["openInterest"])
+                    state["oi_time"] = oi_time
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """获取单个交易对的最新状态"""
+        with self._lock:
+            state = self._states.get(symbol)
+            return dict(state) if state else None
+
+    def symbols(self) -> List[str]:
+        """已有行情的交易对"""
+        with self._lock:
+            return sorted(symbol for symbol, state in self._states.items() if "mark_price" in state)
+
+    def snapshots(self, max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        生成与REST采集格式一致的快照，只包含行情和持仓量都已知的交易对
+
+        Args:
+            max_age: 行情超过该秒数未更新的交易对不生成快照（断线时不把旧行情当作新数据写入）
+        """
+        timestamp = datetime.now().isoformat()
+        now = time.time()
+        rows = []
+
+        with self._lock:
+            for symbol, state in sorted(self._states.items()):
+                if "mark_price" not in state or "oi" not in state:
+                    continue
+                if max_age is not None and now - state["received_at"] > max_age:
+                    continue
+
+                mark_price = state["mark_price"]
+                index_price = state["index_price"]
+                basis = mark_price - index_price
+                basis_percent = (basis / index_price) * 100 if index_price != 0 else 0
+
+                rows.append({
+                    "symbol": symbol,
+                    "timestamp": timestamp,
+                    "mark_price": mark_price,
+                    "index_price": index_price,
+                    "basis": basis,
+                    "basis_percent": basis_percent,
+                    "last_funding_rate": state["last_funding_rate"],
+                    "next_funding_time": state["next_funding_time"],
+                    "oi": state["oi"],
+                    "oi_time": state["oi_time"]
+                })
+
+        return rows
+
+
+class MarketStreamIngestor:
+    """在后台线程中消费合并行情流并维护状态表"""
+
+    def __init__(self, table: MarketStateTable, url: Optional[str] = None,
+                 streams: Optional[List[str]] = None, reconnect_delay: float = 5.0):
+        self.table = table
+        self.streams = streams or [MARK_PRICE_STREAM]
+        self.url = url or f"{STREAM_BASE_URL}?streams={'/'.join(self.streams)}"
+        self.reconnect_delay = reconnect_delay
+
+        self.connected = False
+        self.last_message_time: Optional[float] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def handle_message(self, raw: str):
+        """解析一条合并流消息"""
+        message = json.loads(raw)
+        data = message.get("data", message)
+
+        if isinstance(data, list):
+            self.table.update_mark_prices(data)
+        elif isinstance(data, dict) and data.get("e") == "markPriceUpdate":
+            self.table.update_mark_prices([data])
+
+        self.last_message_time = time.time()
+
+    async def _consume(self):
+        """连接并持续接收消息，断线后自动重连（Binance每24小时会主动断开连接）"""
+        while not self._stop_event.is_set():
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20) as ws:
+                    self.connected = True
+                    print(f"行情流已连接: {self.url}")
+
+                    while not self._stop_event.is_set():
+                        try:
+                            raw = await asyncio.wait_for(ws.recv(), timeout=1)
+                        except asyncio.TimeoutError:
+                            continue
+                        self.handle_message(raw)
+
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    print(f"行情流连接中断: {e}，{self.reconnect_delay:.0f}秒后重连")
+            finally:
+                self.connected = False
+
+            if not self._stop_event.is_set():
+                await asyncio.sleep(self.reconnect_delay)
+
+    def start(self):
+        """启动后台采集线程"""
+        if not is_available():
+            raise RuntimeError("行情流模式需要安装 websockets: pip install websockets")
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._consume()),
+                                        name="market-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台采集线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def flush_snapshots(table: MarketStateTable, save: Callable[[str, Dict[str, Any]], None],
+                    max_age: Optional[float] = None) -> int:
+    """将状态表降采样写入存储，跳过超过 max_age 秒未更新的交易对，返回写入的交易对数量"""
+    count = 0
+    for row in table.snapshots(max_age):
+        try:
+            save(row["symbol"], row)
+            count += 1
+        except Exception as e:
+            print(f"  ✗ {row['symbol']}: 写入失败 - {e}")
+    return count
+
+
+def test_market_stream():
+    """使用本地WebSocket替身服务器测试行情流采集"""
+    if not is_available():
+        print("未安装 websockets，跳过测试")
+        return
+
+    payload = json.dumps({
+        "stream": MARK_PRICE_STREAM,
+        "data": [
+            {"e": "markPriceUpdate", "E": 1700000000000, "s": "BTCUSDT",
+             "p": "37000.5", "i": "36990.0", "P": "37001", "r": "0.00012", "T": 1700006400000},
+            {"e": "markPriceUpdate", "E": 1700000000000, "s": "ETHUSDC",
+             "p": "2000.0", "i": "2001.0", "P": "2000", "r": "0.0001", "T": 1700006400000},
+        ]
+    })
+
+    async def handler(ws, *args):
+        for _ in range(3):
+            await ws.send(payload)
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(1)
+
+    server_ready = threading.Event()
+    server_info = {}
+    stop_server = threading.Event()
+
+    async def serve():
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            server_info["port"] = list(server.sockets)[0].getsockname()[1]
+            server_ready.set()
+            while not stop_server.is_set():
+                await asyncio.sleep(0.05)
+
+    server_thread = threading.Thread(target=lambda: asyncio.run(serve()), daemon=True)
+    server_thread.start()
+    server_ready.wait(5)
+
+    table = MarketStateTable(symbols=["BTCUSDT"])
+    ingestor = MarketStreamIngestor(table, url=f"ws://127.0.0.1:{server_info['port']}", reconnect_delay=0.2)
+    ingestor.start()
+
+    deadline = time.time() + 5
+    while table.messages_received < 3 and time.time() < deadline:
+        time.sleep(0.05)
+
+    ingestor.stop()
+    stop_server.set()
+
+    state = table.get("BTCUSDT")
+    assert state is not None, "未收到BTCUSDT行情"
+    assert state["mark_price"] == 37000.5
+    assert table.get("ETHUSDC") is None, "未跟踪的交易对不应写入状态表"
+
+    # 持仓量未知时不写入
+    assert table.snapshots() == []
+
+    table.update_open_interest({"BTCUSDT": {"openInterest": "1234.5"}})
+    saved = {}
+    count = flush_snapshots(table, lambda symbol, row: saved.setdefault(symbol, row))
+
+    assert count == 1
+    assert saved["BTCUSDT"]["oi"] == 1234.5
+    assert abs(saved["BTCUSDT"]["basis"] - 10.5) < 1e-9
+
+    # 行情过期的交易对不写入
+    time.sleep(0.2)
+    assert flush_snapshots(table, lambda symbol, row: None, max_age=0.1) == 0
+    print(f"行情流测试通过: 收到 {table.messages_received} 条消息")
+
+
+if __name__ == "__main__":
+    test_market_stream()
@@ -6,32 +6,29 @@
 2. 最近3次OI均值 / 最近10次OI均值 > 2
 """
 
-import pandas as pd
 import os
-import glob
+import pandas as pd
 from typing import Dict, List, Tuple, Optional
 from telegram_bot import TelegramBot
-from chart_generator import ChartGenerator
+from chart_generator import ChartGenerator, get_default_chart_pool
+from storage import SnapshotStore, create_store
+
+
+# 每轮提醒最多补发几张图表
+ALERT_CHART_LIMIT = int(os.getenv('ALERT_CHART_LIMIT', '5'))
 
 
 class FundingOIMonitor:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", store: Optional[SnapshotStore] = None):
         self.data_dir = data_dir
+        self.store = store or create_store(data_dir=data_dir)
         self.bot = TelegramBot()
-        self.chart_generator = ChartGenerator()
-
-    def load_symbol_data(self, symbol: str) -> Optional[pd.DataFrame]:
-        """加载单个交易对的历史数据"""
-        csv_file = os.path.join(self.data_dir, f"{symbol}.csv")
-
-        if not os.path.exists(csv_file):
-            return None
+        self.chart_generator = ChartGenerator(store=self.store)
 
+    def load_symbol_data(self, symbol: str, last_n: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """加载单个交易对的历史数据（last_n 为None时加载全部）"""
         try:
-            df = pd.read_csv(csv_file)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp')
-            return df
+            return self.store.read(symbol, last_n=last_n)
         except Exception as e:
             print(f"加载 {symbol} 数据失败: {e}")
             return None
@@ -64,18 +61,21 @@ class FundingOIMonitor:
 
         return recent_3_avg / recent_10_avg
 
-    def check_conditions(self, symbol: str) -> Tuple[bool, Optional[float], Optional[float], Optional[float]]:
+    def check_conditions(self, symbol: str, df: Optional[pd.DataFrame] = None) -> Tuple[bool, Optional[float], Optional[float], Optional[float]]:
         """
         检查交易对是否满足监控条件
 
         Args:
             symbol: 交易对名称
+            df: 已加载的最近数据，为None时从存储读取
 
         Returns:
             Tuple[bool, float, float, float]:
                 (是否满足条件, 资金费率, OI比率, 当前OI)
         """
-        df = self.load_symbol_data(symbol)
+        # 只需要最近10行
+        if df is None:
+            df = self.load_symbol_data(symbol, last_n=10)
         if df is None or len(df) < 10:
             return False, None, None, None
 
@@ -105,8 +105,9 @@ class FundingOIMonitor:
         Returns:
             List[Dict]: 满足条件的交易对列表
         """
-        csv_files = glob.glob(os.path.join(self.data_dir, "*.csv"))
-        symbols = [os.path.basename(f).replace('.csv', '') for f in csv_files]
+        # 一次性读取所有交易对最近10行（sqlite后端为一次索引查询）
+        recent_data = self.store.latest_per_symbol(10)
+        symbols = sorted(recent_data)
 
         alerts = []
 
@@ -114,7 +115,7 @@ class FundingOIMonitor:
 
         for symbol in symbols:
             try:
-                condition_met, funding_rate, oi_ratio, current_oi = self.check_conditions(symbol)
+                condition_met, funding_rate, oi_ratio, current_oi = self.check_conditions(symbol, recent_data[symbol])
 
                 if condition_met:
                     alert_info = {
@@ -140,6 +141,9 @@ class FundingOIMonitor:
         """
         发送Telegram提醒
 
+        文字提醒立即发送；图表提交到渲染进程池并行生成，完成后再作为图片补发，
+        不阻塞调用方（调度循环）。
+
         Args:
             alerts: 提醒列表
 
@@ -152,48 +156,54 @@ class FundingOIMonitor:
         # 如果有多个警报，发送合并消息
         if len(alerts) > 1:
             try:
-                # 发送合并警报（不包含图表）
                 success = self.bot.send_combined_alerts(alerts)
                 if success:
                     print(f"✅ 已发送合并提醒，包含 {len(alerts)} 个交易对")
-                    return len(alerts)  # 所有警报视为已发送
+                    success_count = len(alerts)  # 所有警报视为已发送
                 else:
                     print("❌ 合并提醒发送失败")
-                    return 0
+                    success_count = 0
             except Exception as e:
                 print(f"发送合并提醒失败: {e}")
                 return 0
         else:
-            # 单个警报：保持原有逻辑（包含图表）
             success_count = 0
             for alert in alerts:
                 try:
-                    # 为每个提醒生成图表
-                    df = self.load_symbol_data(alert['symbol'])
-                    chart_path = None
-
-                    if df is not None and len(df) >= 5:
-                        chart_path = self.chart_generator.generate_monitoring_chart(
-                            symbol=alert['symbol'],
-                            df=df,
-                            funding_rate=alert['funding_rate'],
-                            oi_ratio=alert['oi_ratio']
-                        )
-
-                    # 发送提醒（包含图表）
                     success = self.bot.send_alert(
                         symbol=alert['symbol'],
                         funding_rate=alert['funding_rate'],
                         oi_ratio=alert['oi_ratio'],
-                        current_oi=alert['current_oi'],
-                        chart_path=chart_path
+                        current_oi=alert['current_oi']
                     )
                     if success:
                         success_count += 1
                 except Exception as e:
                     print(f"发送 {alert['symbol']} 提醒失败: {e}")
 
-            return success_count
+        if success_count:
+            self.attach_charts(alerts)
+        return success_count
+
+    def attach_charts(self, alerts: List[Dict]):
+        """为资金费率绝对值最大的前 ALERT_CHART_LIMIT 个提醒并行生成图表，完成后补发图片"""
+        ranked = sorted(alerts, key=lambda alert: abs(alert['funding_rate'] or 0), reverse=True)
+        for alert in ranked[:ALERT_CHART_LIMIT]:
+            symbol = alert['symbol']
+            try:
+                # 图表生成器在当前线程读取历史数据，渲染在工作进程中进行
+                self.chart_generator.submit_monitoring_chart(
+                    symbol=symbol,
+                    funding_rate=alert['funding_rate'],
+                    oi_ratio=alert['oi_ratio'],
+                    callback=lambda chart_path, symbol=symbol: self._send_chart(symbol, chart_path)
+                )
+            except Exception as e:
+                print(f"提交 {symbol} 图表失败: {e}")
+
+    def _send_chart(self, symbol: str, chart_path: Optional[str]):
+        if chart_path:
+            self.bot.send_photo(chart_path, f"📈 <b>{symbol}</b> 监控图表")
 
     def run_monitoring(self) -> Tuple[int, int]:
         """
@@ -228,6 +238,9 @@ def main():
         monitor = FundingOIMonitor()
         alerts_found, alerts_sent = monitor.run_monitoring()
 
+        # 等待后台图表渲染和补发完成后再退出
+        get_default_chart_pool().shutdown(wait=True)
+
         print(f"\n监控完成: 发现 {alerts_found} 个提醒，发送 {alerts_sent} 个提醒")
 
     except Exception as e:
@@ -9,6 +9,7 @@ import schedule
 from datetime import datetime
 from data_collector import run_collection_cycle
 from monitor import FundingOIMonitor
+from chart_generator import get_default_chart_pool
 
 
 def monitoring_job():
@@ -56,6 +57,8 @@ def run_monitor_scheduler():
             time.sleep(1)
         except KeyboardInterrupt:
             print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 监控调度器已停止")
+            # 等待尚未完成的图表渲染和补发
+            get_default_chart_pool().shutdown(wait=True)
             break
         except Exception as e:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 调度器错误: {e}")
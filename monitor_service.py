@@ -56,14 +56,8 @@ class MonitorService:
         try:
             logger.info("开始生成分析报告...")
 
-            # 生成24小时分析报告
-            self.analyzer.generate_report(24)
-
-            # 同时生成6小时短期报告
-            print("\n" + "="*60)
-            print("短期分析报告 (6小时)")
-            print("="*60)
-            self.analyzer.generate_report(6)
+            # 一次读取数据，生成所有周期的报告（默认24小时和6小时，见 REPORT_HORIZONS）
+            self.analyzer.generate_reports()
 
             logger.info("分析报告生成完成")
 
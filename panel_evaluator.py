@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+横截面向量化监控评估
+把所有交易对最近N条数据组装成一个面板（交易对 × 最近N行的NumPy数组），
+用少量数组运算同时计算资金费率条件、OI 3/10 比率和市值分级条件，
+返回与 Monitor.monitor_all_symbols 相同格式的提醒列表。
+评估按阶段进行：先用本地的资金费率条件筛选，只有通过的交易对才查询市值和计算OI比率。
+"""
+
+import warnings
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from rolling_window import LONG_WINDOW, SHORT_WINDOW, RollingWindows
+
+
+class SymbolPanel:
+    """交易对 × 最近N行的面板数据"""
+
+    def __init__(self, symbols: List[str], funding: np.ndarray, oi: np.ndarray, counts: np.ndarray):
+        """
+        Args:
+            symbols: 交易对列表（行顺序）
+            funding: 每个交易对最新的资金费率，形状 (S,)
+            oi: 最近N次持仓量，按时间升序右对齐，不足N行的左侧为NaN，形状 (S, N)
+            counts: 每个交易对的有效行数，形状 (S,)
+        """
+        self.symbols = symbols
+        self.funding = funding
+        self.oi = oi
+        self.counts = counts
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def current_oi(self) -> np.ndarray:
+        return self.oi[:, -1]
+
+    @classmethod
+    def _from_series(cls, items: List[tuple], depth: int) -> 'SymbolPanel':
+        """items: [(symbol, 最新资金费率, 持仓量序列)]"""
+        symbols = [symbol for symbol, _, _ in items]
+        funding = np.full(len(items), np.nan)
+        oi = np.full((len(items), depth), np.nan)
+        counts = np.zeros(len(items), dtype=np.int64)
+
+        for row, (_, funding_rate, oi_values) in enumerate(items):
+            oi_values = oi_values[-depth:]
+            funding[row] = funding_rate
+            if len(oi_values):
+                oi[row, depth - len(oi_values):] = oi_values
+            counts[row] = len(oi_values)
+
+        return cls(symbols, funding, oi, counts)
+
+    @classmethod
+    def from_rolling_windows(cls, windows: RollingWindows, depth: int = LONG_WINDOW,
+                             symbols: Optional[Iterable[str]] = None) -> 'SymbolPanel':
+        """从内存滚动窗口组装面板（持仓量使用缓冲区的持仓量样本），symbols 为None时包含全部交易对"""
+        items = []
+        for symbol in windows.symbols() if symbols is None else sorted(set(symbols)):
+            buffer = windows.get(symbol)
+            if buffer is None or len(buffer) == 0:
+                continue
+            items.append((symbol, buffer.latest('last_funding_rate'), buffer.oi_values()))
+        return cls._from_series(items, depth)
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], depth: int = LONG_WINDOW,
+                    symbols: Optional[Iterable[str]] = None) -> 'SymbolPanel':
+        """从 store.latest_per_symbol 的结果组装面板，symbols 为None时包含全部交易对"""
+        items = []
+        for symbol in sorted(frames if symbols is None else set(symbols) & set(frames)):
+            df = frames[symbol]
+            if len(df) == 0:
+                continue
+            items.append((symbol, df['last_funding_rate'].iloc[-1], df['oi'].to_numpy(dtype=np.float64)))
+        return cls._from_series(items, depth)
+
+
+class FilterStats:
+    """分阶段筛选的计数器：资金费率（本地） → 市值（远程） → OI比率"""
+
+    STAGE_NAMES = {
+        'funding': '资金费率',
+        'market_cap': '市值',
+        'oi_ratio': 'OI比率',
+    }
+
+    OUTCOME_NAMES = {
+        'input': '输入',
+        'passed': '通过',
+        'dropped': '淘汰',
+        'small_cap': '小市值直接提醒',
+        'large_cap': '大市值需检查OI',
+    }
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {stage: {} for stage in self.STAGE_NAMES}
+
+    def add(self, stage: str, outcome: str, n: int = 1):
+        counts = self.counts[stage]
+        counts[outcome] = counts.get(outcome, 0) + n
+
+    def get(self, stage: str, outcome: str) -> int:
+        return self.counts[stage].get(outcome, 0)
+
+    def summary(self) -> str:
+        """单行汇总，例如：资金费率 输入400 通过12 淘汰388 | 市值 ..."""
+        parts = []
+        for stage, stage_name in self.STAGE_NAMES.items():
+            outcomes = " ".join(
+                f"{self.OUTCOME_NAMES.get(outcome, outcome)}{count}"
+                for outcome, count in self.counts[stage].items()
+            )
+            parts.append(f"{stage_name} {outcomes or '输入0'}")
+        return " | ".join(parts)
+
+
+def oi_ratios(panel: SymbolPanel, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    最近3次OI均值 / 最近10次OI均值，数据不足或长期均值为0时为NaN
+
+    Args:
+        rows: 只计算这些行，默认全部行
+    """
+    if rows is None:
+        rows = np.arange(len(panel))
+    if len(rows) == 0:
+        return np.empty(0)
+
+    oi = panel.oi[rows]
+    with warnings.catch_warnings():
+        # 全为NaN的行（无数据）和除零都按NaN处理
+        warnings.simplefilter('ignore', RuntimeWarning)
+        recent_short = np.nanmean(oi[:, -SHORT_WINDOW:], axis=1)
+        recent_long = np.nanmean(oi[:, -LONG_WINDOW:], axis=1)
+        ratios = recent_short / recent_long
+
+    ratios[(panel.counts[rows] < LONG_WINDOW) | (recent_long == 0)] = np.nan
+    return ratios
+
+
+def evaluate_panel(panel: SymbolPanel,
+                   market_cap_lookup: Callable[[List[str]], List[Optional[float]]],
+                   funding_threshold: float, oi_ratio_threshold: float,
+                   market_cap_threshold: float, stats: Optional[FilterStats] = None) -> List[Dict]:
+    """
+    分阶段向量化评估所有交易对
+
+    判断条件与 Monitor.check_conditions 一致：
+    1. 市值 < 阈值或市值未知：只需要满足资金费率条件
+    2. 市值 >= 阈值：需要同时满足资金费率和持仓量条件（至少10行数据）
+
+    资金费率条件在每个分支中都是必需的，因此先用它筛选，只为通过的交易对
+    查询市值，再只为大市值交易对计算OI比率。
+
+    Args:
+        panel: 面板数据
+        market_cap_lookup: 批量查询市值，返回与输入顺序对齐的列表（未知为None）
+        stats: 各阶段计数器
+
+    Returns:
+        List[Dict]: 提醒列表，字段与 monitor_all_symbols 相同
+    """
+    stats = stats if stats is not None else FilterStats()
+    if len(panel) == 0:
+        return []
+
+    # 阶段1：资金费率（本地）
+    with np.errstate(invalid='ignore'):
+        funding_condition = np.abs(panel.funding) > funding_threshold
+    candidates = np.flatnonzero(funding_condition)
+    stats.add('funding', 'input', len(panel))
+    stats.add('funding', 'passed', len(candidates))
+    stats.add('funding', 'dropped', len(panel) - len(candidates))
+
+    # 阶段2：市值（远程），只查询通过资金费率筛选的交易对
+    caps = np.full(len(panel), np.nan)
+    if len(candidates):
+        looked_up = market_cap_lookup([panel.symbols[row] for row in candidates])
+        caps[candidates] = [np.nan if cap is None else cap for cap in looked_up]
+    with np.errstate(invalid='ignore'):
+        large_cap = caps >= market_cap_threshold
+    small_rows = candidates[~large_cap[candidates]]
+    large_rows = candidates[large_cap[candidates]]
+    stats.add('market_cap', 'input', len(candidates))
+    stats.add('market_cap', 'small_cap', len(small_rows))
+    stats.add('market_cap', 'large_cap', len(large_rows))
+
+    # 阶段3：OI比率，只计算大市值交易对
+    ratios = np.full(len(panel), np.nan)
+    ratios[large_rows] = oi_ratios(panel, large_rows)
+    with np.errstate(invalid='ignore'):
+        oi_rows = large_rows[ratios[large_rows] > oi_ratio_threshold]
+    stats.add('oi_ratio', 'input', len(large_rows))
+    stats.add('oi_ratio', 'passed', len(oi_rows))
+    stats.add('oi_ratio', 'dropped', len(large_rows) - len(oi_rows))
+
+    alerts = []
+    current_oi = panel.current_oi
+    for row in np.sort(np.concatenate([small_rows, oi_rows])):
+        alerts.append({
+            'symbol': panel.symbols[row],
+            'funding_rate': float(panel.funding[row]),
+            # 小市值币种不需要OI比率
+            'oi_ratio': float(ratios[row]) if large_cap[row] else None,
+            'current_oi': float(current_oi[row]),
+            'market_cap': None if np.isnan(caps[row]) else float(caps[row])
+        })
+    return alerts
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Batched long/short and taker ratio fetching with period-aligned caching
+
+The /futures/data/* ratio endpoints only publish a new value once per
+`period` (5m by default). Results are cached per (endpoint, symbol, period)
+until the next period boundary, so several collection runs inside one window
+reuse the same values. When a refresh happens after one or more periods were
+skipped, the missed periods are back-filled with a single `limit>1` request
+and kept in a per-key history (see `PeriodRatioCache.history`). A refresh
+that fails leaves the key expired, so callers get an empty latest row instead
+of the previous period's value.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+import http_client
+
+
+FUTURES_DATA_URL = "https://fapi.binance.com/futures/data"
+
+# Snapshot field -> /futures/data endpoint
+RATIO_ENDPOINTS = {
+    "long_short_account_ratio": "globalLongShortAccountRatio",
+    "top_trader_account_ls_ratio": "topLongShortAccountRatio",
+    "top_trader_position_ls_ratio": "topLongShortPositionRatio",
+    "taker_buy_sell_ratio": "takerlongshortRatio",
+}
+
+PERIOD_SECONDS = {
+    "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "6h": 21600, "12h": 43200,
+    "1d": 86400,
+}
+
+# Maximum `limit` accepted by the ratio endpoints
+MAX_LIMIT = 500
+
+
+def period_seconds(period: str) -> int:
+    """Length of a ratio period in seconds"""
+    if period not in PERIOD_SECONDS:
+        raise ValueError(f"Unsupported period: {period}")
+    return PERIOD_SECONDS[period]
+
+
+def next_period_boundary(period: str, now: Optional[float] = None) -> float:
+    """Unix time of the next period boundary after `now`"""
+    seconds = period_seconds(period)
+    now = time.time() if now is None else now
+    return (int(now // seconds) + 1) * seconds
+
+
+class PeriodRatioCache:
+    """Thread-safe cache of ratio rows that expires at period boundaries"""
+
+    def __init__(self, max_history: int = 288, publish_delay: float = 5.0):
+        """
+        Args:
+            max_history: Number of rows kept per key (288 = one day of 5m periods)
+            publish_delay: Seconds after a boundary before the new period is
+                expected to be available
+        """
+        self.max_history = max_history
+        self.publish_delay = publish_delay
+        self._entries: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str, symbol: str, period: str) -> Optional[Dict[str, Any]]:
+        """Return the latest row of the last refresh if it is still valid for the current period"""
+        with self._lock:
+            entry = self._entries.get((endpoint, symbol, period))
+            if entry is None or time.time() >= entry["expires_at"]:
+                return None
+            return entry["latest"]
+
+    def history(self, endpoint: str, symbol: str, period: str) -> List[Dict[str, Any]]:
+        """Return every cached row for a key (oldest first, including back-filled periods), regardless of expiry"""
+        with self._lock:
+            entry = self._entries.get((endpoint, symbol, period))
+            return list(entry["rows"]) if entry else []
+
+    def backfill_limit(self, endpoint: str, symbol: str, period: str) -> int:
+        """Number of periods to request so that no period since the last cached row is missed"""
+        with self._lock:
+            entry = self._entries.get((endpoint, symbol, period))
+            if not entry or not entry["rows"]:
+                return 1
+
+            last_timestamp = (entry["rows"][-1].get("timestamp") or 0) / 1000
+            missed = int((time.time() - last_timestamp) // period_seconds(period))
+            return max(1, min(MAX_LIMIT, missed))
+
+    def put(self, endpoint: str, symbol: str, period: str, rows: List[Dict[str, Any]]):
+        """Merge freshly fetched rows into the history and cache them until the next period boundary"""
+        with self._lock:
+            key = (endpoint, symbol, period)
+            entry = self._entries.get(key)
+
+            merged = {row.get("timestamp"): row for row in (entry["rows"] if entry else [])}
+            for row in rows:
+                merged[row.get("timestamp")] = row
+            ordered = [merged[ts] for ts in sorted(merged, key=lambda ts: ts or 0)]
+
+            self._entries[key] = {
+                "rows": ordered[-self.max_history:],
+                # Latest row of this refresh only, so an empty response never serves an old period
+                "latest": max(rows, key=lambda row: row.get("timestamp") or 0) if rows else {},
+                "expires_at": next_period_boundary(period) + self.publish_delay,
+            }
+
+
+class RatioFetcher:
+    """Fetch the four ratio endpoints concurrently for many symbols"""
+
+    def __init__(self, base_url: str = FUTURES_DATA_URL, max_workers: int = 8,
+                 cache: Optional[PeriodRatioCache] = None):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.cache = cache or get_default_ratio_cache()
+
+    def fetch_rows(self, endpoint: str, symbol: str, period: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Fetch raw rows from one ratio endpoint. Returns None on failure."""
+        url = f"{self.base_url}/{endpoint}"
+        params = {"symbol": symbol, "period": period, "limit": limit}
+
+        try:
+            response = http_client.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {endpoint} for {symbol}: {e}")
+            return None
+
+    def _refresh(self, endpoint: str, symbol: str, period: str):
+        limit = self.cache.backfill_limit(endpoint, symbol, period)
+        rows = self.fetch_rows(endpoint, symbol, period, limit)
+        if rows is not None:
+            self.cache.put(endpoint, symbol, period, rows)
+
+    def fetch(self, symbols: List[str], period: str = "5m",
+              fields: Optional[List[str]] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Get the latest row of every ratio for every symbol
+
+        Only keys whose cache expired are requested; they are fetched
+        concurrently across endpoints and symbols and back-fill any periods
+        missed since the last refresh (see `history`). A key whose refresh
+        failed maps to an empty dict rather than the previous period's row.
+
+        Returns:
+            Dict[symbol, Dict[field, latest_row]]
+        """
+        fields = fields or list(RATIO_ENDPOINTS)
+        stale = [
+            (RATIO_ENDPOINTS[field], symbol)
+            for symbol in symbols
+            for field in fields
+            if self.cache.get(RATIO_ENDPOINTS[field], symbol, period) is None
+        ]
+
+        if stale:
+            workers = max(1, min(self.max_workers, len(stale)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda key: self._refresh(key[0], key[1], period), stale))
+
+        results = {}
+        for symbol in symbols:
+            results[symbol] = {}
+            for field in fields:
+                results[symbol][field] = self.cache.get(RATIO_ENDPOINTS[field], symbol, period) or {}
+        return results
+
+    def history(self, symbol: str, period: str = "5m",
+                fields: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get every cached row of each ratio for one symbol, including back-filled periods
+
+        Returns:
+            Dict[field, rows oldest first]
+        """
+        fields = fields or list(RATIO_ENDPOINTS)
+        return {field: self.cache.history(RATIO_ENDPOINTS[field], symbol, period) for field in fields}
+
+
+_default_cache: Optional[PeriodRatioCache] = None
+
+
+def get_default_ratio_cache() -> PeriodRatioCache:
+    """Get the process-wide ratio cache shared by all fetchers"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PeriodRatioCache()
+    return _default_cache
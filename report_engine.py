@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+多周期分析报告引擎
+一次读取每个交易对最长周期内的数据，在同一份数据上计算所有周期（如1h、6h、24h、7d）
+的变化，而不是每个周期都重新读取、解析全部历史。各周期窗口的起点用二分查找定位，
+多加一个周期只多几次查找，报告耗时只随数据量增长。
+
+交易对分块后分发到进程池，每个工作进程按存储配置打开自己的存储后端并读取数据，
+主进程只汇总每个交易对每个周期的一行变化结果。启用增量分析缓存时（默认），
+每个交易对只处理上次报告之后追加的行。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from analytics_cache import ANALYTICS_CACHE, AnalyticsCache
+from archive import ColdArchive, TieredStore
+from storage import STORE_BACKENDS, SegmentStore, SnapshotStore
+from timeseries import TimeSeries, as_series
+
+
+def _parse_horizons(value: str) -> List[int]:
+    return [int(hours) for hours in value.split(',') if hours.strip()]
+
+
+# 定时报告的周期（小时），例如 1,6,24,168
+REPORT_HORIZONS = _parse_horizons(os.getenv('REPORT_HORIZONS', '24,6'))
+
+# 报告进程数（0表示CPU核数，1表示在当前进程内计算）
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '0'))
+
+# 交易对少于该数量时不启动进程池
+MIN_PARALLEL_SYMBOLS = 50
+
+# 排行指标 -> 变化字段，每个指标生成 <指标>_increase 和 <指标>_decrease 两个排行榜
+RANKED_METRICS = {
+    'price': 'mark_price_change_pct',
+    'basis': 'basis_percent_change',
+    'funding': 'funding_rate_change',
+    'oi': 'oi_change_pct',
+    'account_ratio': 'account_ratio_change',
+    'taker_ratio': 'taker_ratio_change',
+}
+
+
+def changes_between(symbol: str, hours: int, oldest: pd.Series, latest: pd.Series,
+                    data_points: int) -> Dict[str, Any]:
+    """窗口内最旧和最新两行之间的变化"""
+    return {
+        'symbol': symbol,
+        'period_hours': hours,
+        'data_points': data_points,
+        'mark_price_change': latest['mark_price'] - oldest['mark_price'],
+        'mark_price_change_pct': ((latest['mark_price'] - oldest['mark_price']) / oldest['mark_price']) * 100,
+        'basis_change': latest['basis'] - oldest['basis'],
+        'basis_percent_change': latest['basis_percent'] - oldest['basis_percent'],
+        'funding_rate_change': latest['last_funding_rate'] - oldest['last_funding_rate'],
+        'oi_change': latest['oi'] - oldest['oi'],
+        'oi_change_pct': ((latest['oi'] - oldest['oi']) / oldest['oi']) * 100 if oldest['oi'] != 0 else 0,
+        'account_ratio_change': latest['long_short_account_ratio'] - oldest['long_short_account_ratio'],
+        'taker_ratio_change': latest['taker_buy_sell_ratio'] - oldest['taker_buy_sell_ratio'],
+        'latest_timestamp': latest['timestamp'],
+        'oldest_timestamp': oldest['timestamp']
+    }
+
+
+def analyze_symbol(symbol: str, df: Union[pd.DataFrame, TimeSeries], horizons: List[int],
+                   now: datetime) -> Dict[int, Dict[str, Any]]:
+    """
+    在一份已加载的数据上计算所有周期的变化，各周期的窗口共享同一份数组
+
+    Returns:
+        {周期小时数: 变化}，窗口内少于2行的周期不包含在结果中
+    """
+    results = {}
+    if df is None or len(df) < 2:
+        return results
+
+    series = as_series(df, symbol)
+    for hours in horizons:
+        window = series.since(now - timedelta(hours=hours))
+        if len(window) < 2:
+            continue
+        results[hours] = changes_between(symbol, hours, window.first(), window.last(), len(window))
+    return results
+
+
+class TopNRanker:
+    """
+    一次计算所有指标的涨幅/跌幅前N名
+
+    变化列表先转换成一个 (交易对 × 指标) 的矩阵，每个指标列用 numpy.partition
+    找出第N名的值，只对不差于它的候选行排序，不需要对每个指标、每个方向各做一次
+    全量排序。并列时按输入顺序排列，与 sorted 的稳定排序结果一致；值为NaN的交易对
+    不参与该指标的排名。
+    """
+
+    def __init__(self, metrics: Optional[Dict[str, str]] = None, top_n: int = 10):
+        """
+        Args:
+            metrics: {指标名: 变化字段}，默认 RANKED_METRICS
+            top_n: 每个排行榜保留的数量
+        """
+        self.metrics = dict(RANKED_METRICS if metrics is None else metrics)
+        self.top_n = top_n
+
+    def add_metric(self, name: str, field: str):
+        """增加一个排行指标"""
+        self.metrics[name] = field
+
+    def categories(self) -> List[str]:
+        return [f"{name}_{direction}" for name in self.metrics for direction in ('increase', 'decrease')]
+
+    def _top_rows(self, keys: np.ndarray) -> np.ndarray:
+        """keys 最小的前N行（NaN除外），并列时按行号排列"""
+        rows = np.flatnonzero(~np.isnan(keys))
+        if len(rows) > self.top_n:
+            kth = np.partition(keys[rows], self.top_n - 1)[self.top_n - 1]
+            rows = rows[keys[rows] <= kth]
+        order = np.lexsort((rows, keys[rows]))
+        return rows[order][:self.top_n]
+
+    def rank(self, changes: List[Dict[str, Any]]) -> Dict[str, List[Dict]]:
+        """返回 {类别: [变化]}，类别为 <指标>_increase / <指标>_decrease"""
+        results = {category: [] for category in self.categories()}
+        if not changes or self.top_n <= 0:
+            return results
+
+        fields = list(self.metrics.values())
+        matrix = np.array([[change.get(field, np.nan) for field in fields] for change in changes],
+                          dtype=np.float64)
+        for column, name in enumerate(self.metrics):
+            values = matrix[:, column]
+            results[f"{name}_increase"] = [changes[row] for row in self._top_rows(-values)]
+            results[f"{name}_decrease"] = [changes[row] for row in self._top_rows(values)]
+        return results
+
+
+def rank_changes(all_changes: List[Dict[str, Any]], top_n: int = 10) -> Dict[str, List[Dict]]:
+    """按各排行榜类别取前N名，返回与 DataAnalyzer.find_extreme_changes 相同的结构"""
+    return TopNRanker(top_n=top_n).rank(all_changes)
+
+
+def store_spec(store: SnapshotStore) -> Dict[str, Any]:
+    """工作进程重新打开同一存储所需的配置（存储对象本身持有锁和连接，不能跨进程传递）"""
+    spec: Dict[str, Any] = {'archive_dir': None}
+    if isinstance(store, TieredStore):
+        spec['archive_dir'] = store.archive.archive_dir
+        spec['archive_fields'] = store.archive.fields
+        store = store.hot
+
+    backend = next((name for name, cls in STORE_BACKENDS.items() if type(store) is cls), None)
+    if backend is None:
+        raise ValueError(f"无法在工作进程中打开存储: {type(store).__name__}")
+
+    spec.update(backend=backend, data_dir=store.data_dir, fields=store.fields)
+    if isinstance(store, SegmentStore):
+        spec['span'] = store.span
+    return spec
+
+
+def open_store(spec: Dict[str, Any]) -> SnapshotStore:
+    """按 store_spec 的配置打开存储"""
+    cls = STORE_BACKENDS[spec['backend']]
+    if cls is SegmentStore:
+        store = cls(spec['data_dir'], spec['fields'], span=spec.get('span'))
+    else:
+        store = cls(spec['data_dir'], spec['fields'])
+    if spec.get('archive_dir'):
+        store = TieredStore(store, ColdArchive(spec['archive_dir'], spec.get('archive_fields')))
+    return store
+
+
+# 工作进程内的存储（由进程池初始化函数打开）
+_worker_store: Optional[SnapshotStore] = None
+
+
+def _init_worker(spec: Dict[str, Any]):
+    global _worker_store
+    _worker_store = open_store(spec)
+
+
+def _analyze_symbols(store: SnapshotStore, symbols: List[str], horizons: List[int],
+                     now: datetime, use_cache: bool = False) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    计算一批交易对在各周期内的变化，返回 {周期: [变化]}
+
+    使用增量缓存时只处理上次报告之后追加的行，否则每个交易对只读取一次最长周期的数据。
+    """
+    since = now - timedelta(hours=max(horizons))
+    cache = AnalyticsCache(store) if use_cache else None
+    results: Dict[int, List[Dict[str, Any]]] = {hours: [] for hours in horizons}
+    for symbol in symbols:
+        try:
+            if cache is not None:
+                changes = {
+                    hours: changes_between(symbol, hours, window['oldest'], window['latest'], window['data_points'])
+                    for hours, window in cache.update(symbol, horizons, now).items()
+                    if window['oldest'] is not None and window['data_points'] >= 2
+                }
+            else:
+                df = store.read(symbol, start=since)
+                changes = analyze_symbol(symbol, df, horizons, now)
+        except Exception as e:
+            print(f"分析 {symbol} 失败: {e}")
+            continue
+        for hours, change in changes.items():
+            results[hours].append(change)
+    return results
+
+
+def _analyze_chunk(symbols: List[str], horizons: List[int], now: datetime,
+                   use_cache: bool) -> Dict[int, List[Dict[str, Any]]]:
+    return _analyze_symbols(_worker_store, symbols, horizons, now, use_cache)
+
+
+class ReportEngine:
+    """单次读取、多周期的变化分析"""
+
+    def __init__(self, store: SnapshotStore, horizons: Optional[List[int]] = None,
+                 workers: Optional[int] = None, metrics: Optional[Dict[str, str]] = None,
+                 use_cache: Optional[bool] = None):
+        """
+        Args:
+            store: 存储后端（可以是带冷数据归档的 TieredStore）
+            horizons: 周期列表（小时），默认取环境变量 REPORT_HORIZONS
+            workers: 进程数，默认取环境变量 REPORT_WORKERS（0表示CPU核数）
+            metrics: 排行指标 {指标名: 变化字段}，默认 RANKED_METRICS
+            use_cache: 是否使用增量分析缓存（见 analytics_cache.py），默认取环境变量 ANALYTICS_CACHE
+        """
+        self.store = store
+        self.use_cache = ANALYTICS_CACHE if use_cache is None else use_cache
+        self.metrics = dict(RANKED_METRICS if metrics is None else metrics)
+        self.horizons = sorted(set(horizons or REPORT_HORIZONS))
+        workers = REPORT_WORKERS if workers is None else workers
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+
+    def analyze(self, symbols: Optional[List[str]] = None,
+                now: Optional[datetime] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        计算每个交易对在每个周期内的变化
+
+        Returns:
+            {周期小时数: [变化]}，列表按交易对排序
+        """
+        now = now or datetime.now()
+        symbols = sorted(symbols if symbols is not None else self.store.symbols())
+
+        if self.workers <= 1 or len(symbols) < MIN_PARALLEL_SYMBOLS:
+            return _analyze_symbols(self.store, symbols, self.horizons, now, self.use_cache)
+
+        try:
+            spec = store_spec(self.store)
+        except ValueError as e:
+            print(f"{e}，在当前进程内计算")
+            return _analyze_symbols(self.store, symbols, self.horizons, now, self.use_cache)
+
+        # 每个进程分到几块，块之间耗时不均时可以互相补位
+        chunk_count = min(len(symbols), self.workers * 4)
+        chunks = [symbols[i::chunk_count] for i in range(chunk_count)]
+
+        results: Dict[int, List[Dict[str, Any]]] = {hours: [] for hours in self.horizons}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(spec,)) as executor:
+            futures = [executor.submit(_analyze_chunk, chunk, self.horizons, now, self.use_cache) for chunk in chunks]
+            for future in futures:
+                for hours, changes in future.result().items():
+                    results[hours].extend(changes)
+
+        for changes in results.values():
+            changes.sort(key=lambda x: x['symbol'])
+        return results
+
+    def extreme_changes(self, top_n: int = 10, symbols: Optional[List[str]] = None,
+                        now: Optional[datetime] = None) -> Dict[int, Dict[str, List[Dict]]]:
+        """每个周期的各类排行榜 {周期小时数: {类别: [变化]}}"""
+        ranker = TopNRanker(self.metrics, top_n)
+        return {
+            hours: ranker.rank(changes)
+            for hours, changes in self.analyze(symbols, now).items()
+        }
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+数据保留引擎
+在后台线程中持续、逐个交易对地裁剪历史数据，替代数据目录超过阈值后一次性
+全量读取并重写所有CSV的清理方式：
+- 支持按行数（只保留最近N行）和按时间（只保留最近N小时）两种策略
+- 先做廉价检查，超出策略一定余量后才裁剪，避免每轮都重写文件
+- 重写文件时按字节数限速，不会挤占采集周期的磁盘I/O
+- 具体的裁剪方式由存储后端实现（CSV流式复制后原子替换，Arrow/segments直接删除过期分段）
+- 同时在后台合并压缩已结束的分段（segments 后端）和归档的分块文件
+- 数据目录超过大小阈值时可以请求一次全量裁剪（request_full_pass，可指定单独的策略），同样由后台线程执行
+- 配置了冷数据归档时，要删除的数据先写入归档（见 archive.py），历史不会丢失
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from storage import SnapshotStore
+
+
+class IORateLimiter:
+    """令牌桶限速器，限制每秒读写的字节数（0表示不限速）"""
+
+    def __init__(self, bytes_per_second: float, burst: Optional[float] = None):
+        self.rate = bytes_per_second
+        self.burst = burst if burst is not None else bytes_per_second
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int):
+        """消耗n个字节的额度，额度不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RetentionPolicy:
+    """保留策略"""
+
+    def __init__(self, max_rows: Optional[int] = None, max_age: Optional[timedelta] = None,
+                 slack: float = 0.1):
+        """
+        Args:
+            max_rows: 每个交易对最多保留的行数（None表示不限制）
+            max_age: 最长保留时间（None表示不限制）
+            slack: 超出策略的比例达到该值时才裁剪，避免每新增一行就重写一次文件
+        """
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.slack = slack
+
+    def cutoff(self, now: datetime) -> Optional[datetime]:
+        """早于该时间的数据需要删除"""
+        return now - self.max_age if self.max_age is not None else None
+
+    def trigger(self, now: datetime):
+        """触发裁剪的阈值 (行数, 时间)"""
+        rows = int(self.max_rows * (1 + self.slack)) if self.max_rows is not None else None
+        before = now - self.max_age * (1 + self.slack) if self.max_age is not None else None
+        return rows, before
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了任何限制（两者都不限制时不裁剪任何数据）"""
+        return self.max_rows is not None or self.max_age is not None
+
+    def describe(self) -> str:
+        parts = []
+        if self.max_rows is not None:
+            parts.append(f"最近 {self.max_rows} 行")
+        if self.max_age is not None:
+            parts.append(f"最近 {self.max_age.total_seconds() / 3600:g} 小时")
+        return "、".join(parts) or "不限制"
+
+
+class RetentionEngine:
+    """按保留策略持续裁剪存储中的数据"""
+
+    def __init__(self, store: SnapshotStore, policy: RetentionPolicy,
+                 limiter: Optional[IORateLimiter] = None, symbols_per_run: int = 50,
+                 archive=None):
+        """
+        Args:
+            store: 存储后端（热数据）
+            policy: 保留策略
+            limiter: 重写文件时的I/O限速器
+            symbols_per_run: 后台每轮检查的交易对数量（轮流检查全部交易对）
+            archive: 冷数据归档（ColdArchive），为None时裁剪的数据直接删除
+        """
+        self.store = store
+        self.policy = policy
+        self.limiter = limiter
+        self.symbols_per_run = symbols_per_run
+        self.archive = archive
+
+        self._cursor = 0
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 请求的全量裁剪（由后台线程执行）、使用的策略及完成回调
+        self._full_pass_lock = threading.Lock()
+        self._full_pass_callbacks: Optional[List[Callable[[Dict[str, int]], None]]] = None
+        self._full_pass_policy: Optional[RetentionPolicy] = None
+
+        self.last_run_time: Optional[datetime] = None
+        self.total_rows_removed = 0
+        self.total_rows_archived = 0
+
+    def trim_symbol(self, symbol: str, now: Optional[datetime] = None, force: bool = False,
+                    policy: Optional[RetentionPolicy] = None) -> int:
+        """检查并裁剪一个交易对，返回删除的行数（policy 为None时使用引擎的保留策略）"""
+        now = now or datetime.now()
+        policy = policy or self.policy
+        if not force:
+            trigger_rows, trigger_before = policy.trigger(now)
+            if not self.store.needs_trim(symbol, trigger_rows, trigger_before):
+                return 0
+        if self.archive is not None:
+            return self._archive_and_trim(symbol, now, policy)
+        return self.store.trim(symbol, policy.max_rows, policy.cutoff(now), self.limiter)
+
+    def _archive_and_trim(self, symbol: str, now: datetime, policy: RetentionPolicy) -> int:
+        """
+        先把要删除的数据写入归档，再从热数据中删除
+
+        行数策略换算成一个时间点后按时间裁剪，裁剪期间新追加的行不会导致
+        未归档的旧行被删除。只读取尾部 max_rows+1 行（换算时间点）和要删除的部分，
+        不读取整个热数据历史。
+        """
+        keep_from = policy.cutoff(now)
+        max_rows = policy.max_rows
+        if max_rows is not None:
+            tail = self.store.read(symbol, last_n=max_rows + 1)
+            if tail is not None and len(tail) > max_rows:
+                # 最后 max_rows 行中最早一行的时间
+                row_cutoff = pd.Timestamp(tail['timestamp'].iloc[1])
+                keep_from = row_cutoff if keep_from is None else max(pd.Timestamp(keep_from), row_cutoff)
+        if keep_from is None:
+            return 0
+
+        expiring = self.store.read(symbol, end=pd.Timestamp(keep_from).to_pydatetime())
+        if expiring is None:
+            return 0
+        expiring = expiring[expiring['timestamp'] < pd.Timestamp(keep_from)]
+        if len(expiring) == 0:
+            return 0
+
+        self.total_rows_archived += self.archive.write(symbol, expiring)
+        return self.store.trim(symbol, before=pd.Timestamp(keep_from).to_pydatetime(), limiter=self.limiter)
+
+    def run_once(self, max_symbols: Optional[int] = None, force: bool = False,
+                 policy: Optional[RetentionPolicy] = None) -> Dict[str, int]:
+        """
+        从上次的位置开始检查 max_symbols 个交易对（None表示全部）
+
+        Args:
+            force: 忽略余量，严格按策略裁剪
+            policy: 本次使用的保留策略（None表示引擎的保留策略）
+
+        Returns:
+            {'files_processed', 'files_cleaned', 'total_rows_removed', 'segments_compacted'}
+        """
+        with self._run_lock:
+            symbols = self.store.symbols()
+            if not symbols:
+                return {'files_processed': 0, 'files_cleaned': 0, 'total_rows_removed': 0,
+                        'segments_compacted': 0}
+
+            count = len(symbols) if max_symbols is None else min(max_symbols, len(symbols))
+            start = self._cursor % len(symbols)
+            batch = [symbols[(start + i) % len(symbols)] for i in range(count)]
+            self._cursor = start + count
+
+            now = datetime.now()
+            files_cleaned = 0
+            total_rows_removed = 0
+            segments_compacted = 0
+            for symbol in batch:
+                try:
+                    rows_removed = self.trim_symbol(symbol, now, force, policy)
+                    segments_compacted += self.store.compact(symbol, self.limiter)
+                    if self.archive is not None:
+                        segments_compacted += self.archive.compact(symbol, self.limiter)
+                except Exception as e:
+                    print(f"  ✗ {symbol}: 清理失败 - {e}")
+                    continue
+                if rows_removed > 0:
+                    files_cleaned += 1
+                    total_rows_removed += rows_removed
+
+            self.last_run_time = now
+            self.total_rows_removed += total_rows_removed
+            return {
+                'files_processed': len(batch),
+                'files_cleaned': files_cleaned,
+                'total_rows_removed': total_rows_removed,
+                'segments_compacted': segments_compacted
+            }
+
+    def request_full_pass(self, callback: Optional[Callable[[Dict[str, int]], None]] = None,
+                          policy: Optional[RetentionPolicy] = None) -> bool:
+        """
+        请求后台线程立即按策略裁剪全部交易对（忽略余量），不在调用方线程中执行
+
+        需要后台线程已启动（见 start）。
+
+        Args:
+            callback: 全量裁剪完成后在后台线程中以 run_once 的结果调用
+            policy: 全量裁剪使用的保留策略（None表示引擎的保留策略）
+
+        Returns:
+            bool: 已有全量裁剪在等待或执行中时返回False（callback 不会被登记）
+        """
+        with self._full_pass_lock:
+            if self._full_pass_callbacks is not None:
+                return False
+            self._full_pass_callbacks = [callback] if callback is not None else []
+            self._full_pass_policy = policy
+        self._wake_event.set()
+        return True
+
+    def full_pass_pending(self) -> bool:
+        """是否有已请求、尚未完成的全量裁剪"""
+        with self._full_pass_lock:
+            return self._full_pass_callbacks is not None
+
+    def _run_full_pass(self):
+        try:
+            result = self.run_once(force=True, policy=self._full_pass_policy)
+        finally:
+            with self._full_pass_lock:
+                callbacks, self._full_pass_callbacks = self._full_pass_callbacks or [], None
+                self._full_pass_policy = None
+        for callback in callbacks:
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"数据清理回调失败: {e}")
+
+    def _loop(self, interval: float):
+        while True:
+            self._wake_event.wait(interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                if self.full_pass_pending():
+                    self._run_full_pass()
+                    continue
+                if not self.policy.enabled and self.archive is None:
+                    # 没有配置保留策略：只执行请求的全量裁剪
+                    continue
+
+                result = self.run_once(self.symbols_per_run)
+                if result['total_rows_removed'] or result['segments_compacted']:
+                    print(f"数据保留: 裁剪 {result['files_cleaned']} 个交易对，删除 {result['total_rows_removed']} 行，"
+                          f"合并 {result['segments_compacted']} 个分段")
+            except Exception as e:
+                print(f"数据保留任务失败: {e}")
+
+    def is_running(self) -> bool:
+        """后台裁剪线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 60):
+        """启动后台裁剪线程，每 interval 秒检查一批交易对"""
+        if self.is_running():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,),
+                                        name="data-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台裁剪线程"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+内存滚动窗口
+每个交易对一个预分配、固定大小的环形缓冲区，保存最近N条快照。
+采集器写入存储后直接推入缓冲区，监控从内存读取，不再每轮重新读取磁盘；
+最近3次/最近10次持仓量均值用滑动累加和维护，每次更新为O(1)。
+只有冷启动时才从存储后端重建一次缓冲区。
+
+持仓量样本与快照行分开保存：快照可以带 oi_time（持仓量实际获取的时间），
+同一个 oi_time 的多行只算一个样本。行情流模式每分钟写入一行，但持仓量每15分钟
+才刷新一次，OI比率只按真正刷新过的持仓量计算，不会被重复的旧值拉向1。
+设置 oi_interval 时按时间采样：每 oi_interval 秒一个样本（取该时间段内最新的持仓量，
+没有数据的时间段沿用上一个值），自适应调度下各交易对采集频率不同，OI比率的窗口
+仍然是固定的时长。
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# 缓冲区保存的字段
+WINDOW_FIELDS = ('mark_price', 'last_funding_rate', 'oi')
+
+# OI比率的短期/长期窗口
+SHORT_WINDOW = 3
+LONG_WINDOW = 10
+
+
+class SymbolRingBuffer:
+    """单个交易对的环形缓冲区（快照行 + 持仓量样本）"""
+
+    # 每推入多少条数据后重新精确计算累加和，消除浮点误差累积
+    RESYNC_INTERVAL = 1000
+
+    def __init__(self, capacity: int = LONG_WINDOW, fields: Sequence[str] = WINDOW_FIELDS,
+                 oi_interval: Optional[float] = None):
+        """
+        Args:
+            capacity: 保存的快照行数
+            fields: 保存的字段
+            oi_interval: 持仓量采样间隔（秒），None表示每次获取的持仓量为一个样本
+        """
+        if capacity < LONG_WINDOW:
+            raise ValueError(f"缓冲区容量不能小于 {LONG_WINDOW}")
+
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.oi_interval = oi_interval
+        self._columns = {field: i for i, field in enumerate(self.fields)}
+        self._oi_column = self._columns['oi']
+
+        self._values = np.zeros((capacity, len(self.fields)), dtype=np.float64)
+        self._timestamps: List[Optional[pd.Timestamp]] = [None] * capacity
+        self._next = 0      # 下一次写入的位置
+        self._count = 0     # 已写入的总条数
+
+        # 持仓量样本环形缓冲区，只保留计算OI比率需要的最近 LONG_WINDOW 个
+        self._oi = np.zeros(LONG_WINDOW, dtype=np.float64)
+        self._oi_next = 0
+        self._oi_count = 0
+        self._oi_key: Any = None  # 最新样本的获取时间（按时间采样时为时间段序号）
+        self._oi_sum_short = 0.0
+        self._oi_sum_long = 0.0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def _oi_at(self, age: int) -> float:
+        """倒数第 age+1 个持仓量样本（age=0 为最新）"""
+        return self._oi[(self._oi_next - 1 - age) % LONG_WINDOW]
+
+    def push(self, timestamp: Any, data: Dict[str, Any]):
+        """推入一条快照"""
+        oi = float(data.get('oi') or 0)
+        if np.isnan(oi):
+            oi = 0.0
+
+        row = self._values[self._next]
+        for field, column in self._columns.items():
+            value = data.get(field)
+            row[column] = float(value) if value is not None else np.nan
+        row[self._oi_column] = oi
+        self._timestamps[self._next] = pd.Timestamp(timestamp)
+
+        self._next = (self._next + 1) % self.capacity
+        self._count += 1
+
+        observed = pd.Timestamp(data.get('oi_time') or timestamp)
+        if self.oi_interval:
+            self._push_oi(int(observed.timestamp() // self.oi_interval), oi)
+        else:
+            self._push_oi(observed, oi)
+
+    def _push_oi(self, key: Any, oi: float):
+        """记录一个持仓量样本：与最新样本的获取时间（时间段）相同时只更新该样本"""
+        if self._oi_key is not None and key <= self._oi_key:
+            latest = (self._oi_next - 1) % LONG_WINDOW
+            delta = oi - self._oi[latest]
+            self._oi[latest] = oi
+            self._oi_sum_short += delta
+            self._oi_sum_long += delta
+            return
+
+        if self.oi_interval and self._oi_key is not None:
+            # 没有采集到的时间段沿用上一个持仓量
+            previous = self._oi_at(0)
+            for _ in range(min(key - self._oi_key - 1, LONG_WINDOW)):
+                self._append_oi(previous)
+
+        self._oi_key = key
+        self._append_oi(oi)
+
+    def _append_oi(self, oi: float):
+        # 滑出窗口的值
+        if self._oi_count >= SHORT_WINDOW:
+            self._oi_sum_short -= self._oi_at(SHORT_WINDOW - 1)
+        if self._oi_count >= LONG_WINDOW:
+            self._oi_sum_long -= self._oi_at(LONG_WINDOW - 1)
+
+        self._oi[self._oi_next] = oi
+        self._oi_next = (self._oi_next + 1) % LONG_WINDOW
+        self._oi_count += 1
+        self._oi_sum_short += oi
+        self._oi_sum_long += oi
+
+        if self._oi_count % self.RESYNC_INTERVAL == 0:
+            self._resync()
+
+    def _resync(self):
+        self._oi_sum_short = sum(self._oi_at(age) for age in range(min(self._oi_count, SHORT_WINDOW)))
+        self._oi_sum_long = sum(self._oi_at(age) for age in range(min(self._oi_count, LONG_WINDOW)))
+
+    def latest(self, field: str) -> Optional[float]:
+        """最新一条的字段值"""
+        if self._count == 0:
+            return None
+        return float(self._values[(self._next - 1) % self.capacity, self._columns[field]])
+
+    def latest_timestamp(self) -> Optional[pd.Timestamp]:
+        if self._count == 0:
+            return None
+        return self._timestamps[(self._next - 1) % self.capacity]
+
+    def oi_sample_count(self) -> int:
+        """缓冲区中的持仓量样本数（最多 LONG_WINDOW）"""
+        return min(self._oi_count, LONG_WINDOW)
+
+    def oi_values(self) -> np.ndarray:
+        """按时间升序返回持仓量样本"""
+        size = self.oi_sample_count()
+        indices = (np.arange(self._oi_next - size, self._oi_next)) % LONG_WINDOW
+        return self._oi[indices].copy()
+
+    def oi_ratio(self) -> Optional[float]:
+        """最近3个OI样本均值 / 最近10个OI样本均值，数据不足或长期均值为0时返回None"""
+        if self._oi_count < LONG_WINDOW:
+            return None
+
+        recent_10_avg = self._oi_sum_long / LONG_WINDOW
+        if recent_10_avg == 0:
+            return None
+        return (self._oi_sum_short / SHORT_WINDOW) / recent_10_avg
+
+    def values(self, field: str) -> np.ndarray:
+        """按时间升序返回缓冲区中某个字段的全部值"""
+        size = len(self)
+        indices = (np.arange(self._next - size, self._next)) % self.capacity
+        return self._values[indices, self._columns[field]].copy()
+
+    def to_frame(self) -> pd.DataFrame:
+        """按时间升序转换为DataFrame（用于图表等需要完整窗口的场景）"""
+        size = len(self)
+        indices = [(self._next - size + i) % self.capacity for i in range(size)]
+        data = {'timestamp': [self._timestamps[i] for i in indices]}
+        for field, column in self._columns.items():
+            data[field] = self._values[indices, column]
+        return pd.DataFrame(data)
+
+
+class RollingWindows:
+    """所有交易对的环形缓冲区（线程安全）"""
+
+    def __init__(self, capacity: int = LONG_WINDOW, fields: Sequence[str] = WINDOW_FIELDS,
+                 oi_interval: Optional[float] = None):
+        self.capacity = max(capacity, LONG_WINDOW)
+        self.fields = tuple(fields)
+        self.oi_interval = oi_interval  # 持仓量采样间隔（秒），见 SymbolRingBuffer
+        self._buffers: Dict[str, SymbolRingBuffer] = {}
+        self._lock = threading.Lock()
+
+    def push(self, symbol: str, data: Dict[str, Any]):
+        """推入一条快照（可直接注册为采集器的快照监听者）"""
+        with self._lock:
+            buffer = self._buffers.get(symbol)
+            if buffer is None:
+                buffer = self._buffers[symbol] = SymbolRingBuffer(self.capacity, self.fields, self.oi_interval)
+            buffer.push(data['timestamp'], data)
+
+    def get(self, symbol: str) -> Optional[SymbolRingBuffer]:
+        with self._lock:
+            return self._buffers.get(symbol)
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return sorted(self._buffers)
+
+    def remove(self, symbols: Sequence[str]):
+        """移除下架的交易对"""
+        with self._lock:
+            for symbol in symbols:
+                self._buffers.pop(symbol, None)
+
+    def rebuild(self, store, rows: Optional[int] = None, infer_oi_time: bool = False) -> int:
+        """
+        冷启动：从存储后端读取每个交易对最近的数据重建缓冲区，返回交易对数量
+
+        Args:
+            rows: 每个交易对读取的行数，默认 capacity；持仓量刷新比写入慢时需要多读一些行才能凑够样本
+            infer_oi_time: 存储中没有 oi_time，按持仓量取值变化推断刷新时间
+                （连续相同的持仓量视为同一次刷新，用于行情流模式）
+        """
+        frames = store.latest_per_symbol(max(rows or 0, self.capacity))
+
+        with self._lock:
+            self._buffers.clear()
+            for symbol, df in frames.items():
+                if infer_oi_time and len(df):
+                    refreshed = df['oi'].ne(df['oi'].shift())
+                    df = df.assign(oi_time=df['timestamp'].where(refreshed).ffill())
+                buffer = self._buffers[symbol] = SymbolRingBuffer(self.capacity, self.fields, self.oi_interval)
+                for row in df.to_dict('records'):
+                    buffer.push(row['timestamp'], row)
+
+        return len(frames)
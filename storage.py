@@ -0,0 +1,1523 @@
+#!/usr/bin/env python3
+"""
+快照存储后端
+统一的按交易对读写接口，采集器、监控器、分析器和图表生成器都通过它访问历史数据：
+
+- csv:   兼容原有格式，每个交易对一个 data/<SYMBOL>.csv
+- arrow: 列式存储，按天分区 data/<SYMBOL>/<YYYY-MM-DD>.arrows（Arrow IPC流格式），
+         列类型固定为 float64 / int64 / timestamp，每次追加只写入一个记录批次；
+         读取最近N行或时间范围时只打开相关的日分区，无需解析全部历史
+- sqlite: 单个 data/snapshots.db（WAL模式），snapshots 表按 (symbol, timestamp) 建索引，
+         每个采集周期的写入合并为一个事务，跨交易对查询只需一次索引查询
+- segments: 按天（或小时）分段的CSV data/<SYMBOL>/<时间段>.csv，manifest 记录每段的
+         行数、字节数和时间范围；过期只需删除整段，旧分段合并压缩为 .csv.gz
+
+每个后端都在写入、裁剪和合并时增量维护每个交易对的行数、字节数和文件数，
+保存在 data/usage.json 中，查询总大小和各交易对占用时无需扫描数据目录。
+"""
+
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from timeseries import slice_by_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    pa_ipc = None
+
+
+# 全部快照字段（data_collector 采集的完整字段）
+SNAPSHOT_FIELDS = [
+    'timestamp',
+    'mark_price',
+    'index_price',
+    'basis',
+    'basis_percent',
+    'last_funding_rate',
+    'next_funding_time',
+    'oi',
+    'long_short_account_ratio',
+    'top_trader_account_ls_ratio',
+    'top_trader_position_ls_ratio',
+    'taker_buy_sell_ratio'
+]
+
+# 基础快照字段（binance_monitor_auto 采集的字段）
+BASIC_FIELDS = SNAPSHOT_FIELDS[:8]
+
+# 非 float64 的列
+INT_FIELDS = {'next_funding_time'}
+
+DEFAULT_BACKEND = os.getenv('STORAGE_BACKEND', 'csv')
+
+# segments 后端的分段粒度：day 或 hour
+SEGMENT_SPAN = os.getenv('SEGMENT_SPAN', 'day')
+
+USAGE_FILE = 'usage.json'
+
+
+def is_available() -> bool:
+    """pyarrow是否可用（arrow后端需要）"""
+    return pa is not None
+
+
+def arrow_schema(fields: List[str]):
+    """快照字段的Arrow列类型：timestamp为微秒时间戳，INT_FIELDS为int64，其余为float64"""
+    def field_type(field: str):
+        if field == 'timestamp':
+            return pa.timestamp('us')
+        if field in INT_FIELDS:
+            return pa.int64()
+        return pa.float64()
+
+    return pa.schema([(field, field_type(field)) for field in fields])
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """将快照中的ISO时间字符串转换为datetime"""
+    if isinstance(value, datetime):
+        return value
+    return pd.Timestamp(value).to_pydatetime()
+
+
+def read_tail_lines(path: str, n: int, block_size: int = 8192) -> Tuple[bytes, List[bytes], bool]:
+    """
+    从文件末尾向前按块读取CSV的最后n行，读取量与文件总大小无关
+
+    Returns:
+        (表头行, 最后n行数据, 是否已读到文件开头)
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        header_end = f.tell()
+
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+
+        # 多读一个换行符，保证去掉块首可能不完整的一行后仍有n个完整行
+        while position > header_end and data.count(b'\n') <= n:
+            read_size = min(block_size, position - header_end)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+
+    lines = data.splitlines()
+    reached_start = position <= header_end
+    if not reached_start and lines:
+        lines = lines[1:]
+
+    lines = [line for line in lines if line.strip()]
+    return header, lines[-n:] if n > 0 else [], reached_start and len(lines) <= n
+
+
+def tail_offset(path: str, n: int, block_size: int = 65536) -> Tuple[int, int]:
+    """
+    从文件末尾向前查找最后n行数据的起始字节偏移，读取量只与这n行的大小有关
+
+    Returns:
+        (表头结束位置, 最后n行的起始位置)；数据不足n行时两者相等
+    """
+    with open(path, 'rb') as f:
+        f.readline()
+        header_end = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if n <= 0:
+            return header_end, size
+        if size <= header_end:
+            return header_end, header_end
+
+        # 文件末尾的换行符不作为行分隔符计数
+        f.seek(size - 1)
+        position = size - 1 if f.read(1) == b'\n' else size
+
+        count = 0
+        while position > header_end:
+            read_size = min(block_size, position - header_end)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size)
+            index = len(block)
+            while True:
+                index = block.rfind(b'\n', 0, index)
+                if index < 0:
+                    break
+                count += 1
+                if count == n:
+                    return header_end, position + index + 1
+
+    return header_end, header_end
+
+
+def _line_timestamp(line: bytes) -> Optional[datetime]:
+    """CSV数据行第一列（timestamp）的时间"""
+    value = line.split(b',', 1)[0].strip().decode('utf-8')
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parse_timestamp(value)
+
+
+def count_lines(path: str, block_size: int = 1 << 20) -> int:
+    """按块统计文件的换行符数量（不解析内容）"""
+    lines = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b'\n')
+    return lines
+
+
+class StorageUsage:
+    """每个交易对的行数、字节数和文件数，增量更新并定期写入 usage.json"""
+
+    # 批次外的更新最多每隔多少秒写入一次
+    SAVE_INTERVAL = 60
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, Dict[str, int]] = {}
+        self._totals = {'rows': 0, 'bytes': 0, 'files': 0}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+
+    def load(self) -> bool:
+        """读取 usage.json，不存在或损坏时返回False"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)['symbols']
+        except (OSError, ValueError, KeyError):
+            return False
+        self.replace(entries)
+        self._dirty = False
+        return True
+
+    def replace(self, entries: Dict[str, Dict[str, int]]):
+        """整体替换（全量扫描后使用）"""
+        with self._lock:
+            self._entries = {symbol: {key: int(entry.get(key, 0)) for key in self._totals}
+                             for symbol, entry in entries.items()}
+            self._totals = {key: sum(entry[key] for entry in self._entries.values()) for key in self._totals}
+            self._dirty = True
+
+    def add(self, symbol: str, rows: int = 0, bytes: int = 0, files: int = 0):
+        """增量更新一个交易对"""
+        with self._lock:
+            entry = self._entries.setdefault(symbol, {'rows': 0, 'bytes': 0, 'files': 0})
+            for key, delta in (('rows', rows), ('bytes', bytes), ('files', files)):
+                entry[key] += delta
+                self._totals[key] += delta
+            if entry['files'] <= 0 and entry['rows'] <= 0:
+                for key in self._totals:
+                    self._totals[key] -= entry[key]
+                del self._entries[symbol]
+            self._dirty = True
+
+    def get(self, symbol: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._entries.get(symbol, {'rows': 0, 'bytes': 0, 'files': 0}))
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+    def breakdown(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按字节数从大到小排列的各交易对占用"""
+        with self._lock:
+            items = [{'symbol': symbol, **entry} for symbol, entry in self._entries.items()]
+        items.sort(key=lambda item: (-item['bytes'], -item['rows'], item['symbol']))
+        return items[:top] if top is not None else items
+
+    def save(self, force: bool = False):
+        """有变化时写入文件（非强制时按 SAVE_INTERVAL 节流）"""
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._saved_at < self.SAVE_INTERVAL):
+                return
+            data = {'symbols': self._entries, 'totals': self._totals}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.time()
+
+
+class SnapshotStore:
+    """快照存储接口"""
+
+    def __init__(self, data_dir: str = "data", fields: Optional[List[str]] = None):
+        self.data_dir = data_dir
+        self.fields = list(fields or SNAPSHOT_FIELDS)
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._usage = StorageUsage(os.path.join(self.data_dir, USAGE_FILE))
+        self._usage_ready = False
+
+    def append(self, symbol: str, data: Dict[str, Any]):
+        """追加一条快照"""
+        raise NotImplementedError
+
+    def append_many(self, snapshots: Dict[str, Dict[str, Any]]):
+        """追加一批快照 {symbol: data}"""
+        for symbol, data in snapshots.items():
+            self.append(symbol, data)
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        """
+        读取交易对历史数据（按时间升序）
+
+        Args:
+            symbol: 交易对名称
+            last_n: 只返回最近N行
+            start: 起始时间（包含）
+            end: 结束时间（包含）
+
+        Returns:
+            DataFrame，timestamp列为datetime；没有数据时返回None
+        """
+        raise NotImplementedError
+
+    def symbols(self) -> List[str]:
+        """有数据的交易对"""
+        raise NotImplementedError
+
+    def latest_per_symbol(self, n: int) -> Dict[str, pd.DataFrame]:
+        """所有交易对各自最近n行"""
+        frames = {}
+        for symbol in self.symbols():
+            df = self.read(symbol, last_n=n)
+            if df is not None and len(df) > 0:
+                frames[symbol] = df
+        return frames
+
+    def window_since(self, since: datetime) -> Dict[str, pd.DataFrame]:
+        """所有交易对在 since 之后的数据"""
+        frames = {}
+        for symbol in self.symbols():
+            df = self.read(symbol, start=since)
+            if df is not None and len(df) > 0:
+                frames[symbol] = df
+        return frames
+
+    @contextmanager
+    def batch(self):
+        """一个采集周期内的批量写入（sqlite后端合并为一个事务，其他后端逐条写入）"""
+        try:
+            yield self
+        finally:
+            self._save_usage(force=True)
+
+    def retain_last(self, symbol: str, max_rows: int) -> int:
+        """只保留最近 max_rows 行，返回删除的行数"""
+        return self.trim(symbol, max_rows=max_rows)
+
+    def needs_trim(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> bool:
+        """廉价检查：是否超过 max_rows 行或存在早于 before 的数据"""
+        return True
+
+    def trim(self, symbol: str, max_rows: Optional[int] = None, before: Optional[datetime] = None,
+             limiter=None) -> int:
+        """
+        删除早于 before 的数据，并只保留最近 max_rows 行，返回删除的行数
+
+        Args:
+            limiter: 限速器（带 consume(字节数) 方法），用于限制重写文件时的读写速率
+        """
+        raise NotImplementedError
+
+    def compact(self, symbol: str, limiter=None) -> int:
+        """合并/压缩已结束的分段，返回合并的分段数（不分段的后端无需处理）"""
+        return 0
+
+    def usage(self) -> StorageUsage:
+        """增量维护的占用统计；首次使用时读取 usage.json，不存在则全量扫描一次"""
+        if not self._usage_ready:
+            if not self._usage.load():
+                self._usage.replace(self._scan_usage())
+                self._usage.save(force=True)
+            self._usage_ready = True
+        return self._usage
+
+    def rebuild_usage(self):
+        """重新全量扫描占用统计（数据目录被外部修改后使用）"""
+        self._usage.replace(self._scan_usage())
+        self._usage.save(force=True)
+        self._usage_ready = True
+
+    def _save_usage(self, force: bool = False):
+        if self._usage_ready:
+            self._usage.save(force)
+
+    def _scan_usage(self) -> Dict[str, Dict[str, int]]:
+        """全量扫描 {symbol: {'rows', 'bytes', 'files'}}"""
+        raise NotImplementedError
+
+    def total_size(self) -> int:
+        """存储占用的总字节数"""
+        return self.usage().totals()['bytes']
+
+    def file_count(self) -> int:
+        """数据文件数量"""
+        return self.usage().totals()['files']
+
+    def total_rows(self) -> int:
+        """总行数"""
+        return self.usage().totals()['rows']
+
+    def storage_breakdown(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """各交易对的占用 [{'symbol', 'rows', 'bytes', 'files'}]，按字节数从大到小"""
+        return self.usage().breakdown(top)
+
+    @staticmethod
+    def _select(df: pd.DataFrame, last_n: Optional[int], start: Optional[datetime],
+                end: Optional[datetime]) -> pd.DataFrame:
+        """按时间范围和行数筛选（有序时二分查找边界）"""
+        if df['timestamp'].is_monotonic_increasing:
+            df = slice_by_time(df, start, end)
+        else:
+            if start is not None:
+                df = df[df['timestamp'] >= start]
+            if end is not None:
+                df = df[df['timestamp'] <= end]
+        if last_n is not None:
+            df = df.tail(last_n)
+        return df.reset_index(drop=True)
+
+
+class CsvStore(SnapshotStore):
+    """每个交易对一个CSV文件（原有格式）
+
+    按最近N行或起始时间读取时从文件末尾向前读取，只解析需要的尾部行；
+    只按结束时间读取时从文件开头读到结束时间为止。两者都依赖采集器按时间顺序
+    追加写入；只有读取全部历史时才解析整个文件。
+    """
+
+    # 只按起始时间读取时，首次读取的行数（不够时翻倍）
+    TAIL_CHUNK_ROWS = 256
+
+    # 裁剪时流式复制的块大小
+    COPY_BLOCK_SIZE = 65536
+
+    def __init__(self, data_dir: str = "data", fields: Optional[List[str]] = None):
+        super().__init__(data_dir, fields)
+        # 只在追加写入和裁剪的最后替换文件时持有
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.data_dir, f"{symbol}.csv")
+
+    def _read_tail(self, csv_file: str, n: int) -> Tuple[pd.DataFrame, bool]:
+        """解析最后n行，返回 (数据, 是否已包含全部行)"""
+        header, lines, complete = read_tail_lines(csv_file, n)
+        text = b'\n'.join([header.rstrip(b'\r\n')] + lines).decode('utf-8')
+        df = pd.read_csv(io.StringIO(text))
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp')
+        return df, complete
+
+    def _read_head(self, csv_file: str, end: datetime) -> pd.DataFrame:
+        """从文件开头读取到 end（包含）为止的行"""
+        with open(csv_file, 'rb') as f:
+            header = f.readline()
+            lines = []
+            for line in f:
+                if not line.strip():
+                    continue
+                timestamp = _line_timestamp(line)
+                if timestamp is not None and timestamp > end:
+                    break
+                lines.append(line)
+
+        df = pd.read_csv(io.BytesIO(header + b''.join(lines)))
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return df
+
+    def append(self, symbol: str, data: Dict[str, Any]):
+        csv_file = self._path(symbol)
+        usage = self.usage()
+
+        with self._lock:
+            # 检查文件是否存在，如果不存在则写入表头
+            file_exists = os.path.isfile(csv_file)
+            size_before = os.path.getsize(csv_file) if file_exists else 0
+
+            with open(csv_file, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fields)
+
+                if not file_exists:
+                    writer.writeheader()
+
+                writer.writerow({field: data[field] for field in self.fields})
+
+            usage.add(symbol, rows=1, bytes=os.path.getsize(csv_file) - size_before,
+                      files=0 if file_exists else 1)
+        self._save_usage()
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        csv_file = self._path(symbol)
+        if not os.path.exists(csv_file):
+            return None
+
+        if last_n is not None or start is not None:
+            # 只读取尾部：按起始时间读取时不断翻倍，直到最早一行早于起始时间或已读完整个文件
+            n = last_n if last_n is not None else self.TAIL_CHUNK_ROWS
+            while True:
+                df, complete = self._read_tail(csv_file, n)
+                if last_n is not None or complete or (len(df) and df['timestamp'].iloc[0] < start):
+                    return self._select(df, last_n, start, end)
+                n *= 2
+
+        if end is not None:
+            # 只按结束时间读取（例如归档过期数据）：读到结束时间即停止
+            return self._select(self._read_head(csv_file, parse_timestamp(end)), None, None, end)
+
+        df = pd.read_csv(csv_file)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp')
+        return self._select(df, last_n, start, end)
+
+    def symbols(self) -> List[str]:
+        csv_files = glob.glob(os.path.join(self.data_dir, "*.csv"))
+        return sorted(os.path.basename(f)[:-len('.csv')] for f in csv_files)
+
+    def needs_trim(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> bool:
+        csv_file = self._path(symbol)
+        if not os.path.exists(csv_file):
+            return False
+
+        if max_rows is not None:
+            _, lines, _ = read_tail_lines(csv_file, max_rows + 1)
+            if len(lines) > max_rows:
+                return True
+
+        if before is not None:
+            with open(csv_file, 'rb') as f:
+                f.readline()
+                first_line = f.readline()
+            first = _line_timestamp(first_line) if first_line.strip() else None
+            if first is not None and first < before:
+                return True
+
+        return False
+
+    def trim(self, symbol: str, max_rows: Optional[int] = None, before: Optional[datetime] = None,
+             limiter=None) -> int:
+        """
+        流式裁剪：只向前扫描要删除的行，把保留的部分按块复制到临时文件后原子替换，
+        内存占用与文件大小无关。复制期间不持有锁，采集器可以继续追加；
+        替换前在锁内补齐复制期间新追加的数据，进程中途崩溃时原文件保持完整。
+        """
+        csv_file = self._path(symbol)
+        if not os.path.exists(csv_file):
+            return 0
+
+        # 按行数保留时，最后 max_rows 行之前的数据都要删除
+        keep_from = tail_offset(csv_file, max_rows)[1] if max_rows is not None else 0
+
+        with open(csv_file, 'rb') as source:
+            header = source.readline()
+            header_end = source.tell()
+            keep_from = max(keep_from, header_end)
+
+            # 向前扫描要删除的行：计数，并按时间继续跳过早于 before 的行（数据按时间追加）
+            rows_removed = 0
+            position = header_end
+            while True:
+                line = source.readline()
+                if not line:
+                    break
+                if position >= keep_from:
+                    timestamp = _line_timestamp(line) if before is not None and line.strip() else None
+                    if timestamp is None or timestamp >= before:
+                        break
+                    keep_from = position + len(line)
+                position += len(line)
+                rows_removed += 1
+                if limiter is not None:
+                    limiter.consume(len(line))
+
+            if rows_removed == 0:
+                return 0
+
+            tmp_file = f"{csv_file}.tmp"
+            with open(tmp_file, 'wb') as target:
+                target.write(header)
+                source.seek(keep_from)
+                while True:
+                    block = source.read(self.COPY_BLOCK_SIZE)
+                    if not block:
+                        break
+                    target.write(block)
+                    if limiter is not None:
+                        limiter.consume(len(block))
+
+                with self._lock:
+                    # 复制期间追加的数据
+                    shutil.copyfileobj(source, target)
+                    target.flush()
+                    os.fsync(target.fileno())
+                    size_before = os.path.getsize(csv_file)
+                    os.replace(tmp_file, csv_file)
+                    self.usage().add(symbol, rows=-rows_removed,
+                                     bytes=os.path.getsize(csv_file) - size_before)
+
+        self._save_usage(force=True)
+        return rows_removed
+
+    def _scan_usage(self) -> Dict[str, Dict[str, int]]:
+        entries = {}
+        for symbol in self.symbols():
+            csv_file = self._path(symbol)
+            try:
+                entries[symbol] = {
+                    'rows': max(count_lines(csv_file) - 1, 0),  # 去掉表头
+                    'bytes': os.path.getsize(csv_file),
+                    'files': 1
+                }
+            except OSError:
+                continue
+        return entries
+
+
+class ArrowStore(SnapshotStore):
+    """按交易对和日期分区的Arrow IPC列式存储
+
+    每个分区文件是一个Arrow IPC流：文件头写入一次schema，之后每次追加写入
+    一个记录批次，无需重写已有数据。进程在写入中途崩溃时，读取会在最后一个
+    完整批次处停止。每条记录单独成批会带来元数据开销，因此某个交易对开始写入
+    新的一天时，前一天的分区会被合并为单个批次。
+    """
+
+    SUFFIX = '.arrows'
+
+    def __init__(self, data_dir: str = "data", fields: Optional[List[str]] = None):
+        if not is_available():
+            raise RuntimeError("arrow存储需要安装 pyarrow: pip install pyarrow")
+
+        super().__init__(data_dir, fields)
+        self.schema = arrow_schema(self.fields)
+        self._lock = threading.Lock()
+
+    def _symbol_dir(self, symbol: str) -> str:
+        return os.path.join(self.data_dir, symbol)
+
+    def _partitions(self, symbol: str) -> List[str]:
+        """交易对的分区文件，按日期升序"""
+        symbol_dir = self._symbol_dir(symbol)
+        if not os.path.isdir(symbol_dir):
+            return []
+        return sorted(os.path.join(symbol_dir, name) for name in os.listdir(symbol_dir)
+                      if name.endswith(self.SUFFIX))
+
+    @classmethod
+    def _partition_day(cls, path: str) -> str:
+        return os.path.basename(path)[:-len(cls.SUFFIX)]
+
+    def _to_batch(self, rows: List[Dict[str, Any]]):
+        columns = []
+        for field in self.fields:
+            values = [row.get(field) for row in rows]
+            if field == 'timestamp':
+                values = [parse_timestamp(value) for value in values]
+            columns.append(pa.array(values, type=self.schema.field(field).type))
+        return pa.record_batch(columns, schema=self.schema)
+
+    def append(self, symbol: str, data: Dict[str, Any]):
+        timestamp = parse_timestamp(data['timestamp'])
+        path = os.path.join(self._symbol_dir(symbol), f"{timestamp.date().isoformat()}{self.SUFFIX}")
+        batch = self._to_batch([data])
+        usage = self.usage()
+
+        with self._lock:
+            new_file = not os.path.exists(path)
+            size_before = 0 if new_file else os.path.getsize(path)
+            if new_file:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                # 前一天的分区不再追加，合并为单个批次
+                previous = [p for p in self._partitions(symbol) if p < path]
+                if previous:
+                    usage.add(symbol, bytes=self._compact_partition(previous[-1]))
+
+            with open(path, 'ab') as f:
+                if new_file:
+                    f.write(self.schema.serialize())
+                f.write(batch.serialize())
+
+            usage.add(symbol, rows=1, bytes=os.path.getsize(path) - size_before,
+                      files=1 if new_file else 0)
+        self._save_usage()
+
+    def _read_partition(self, path: str):
+        """读取一个分区，忽略末尾不完整的批次"""
+        batches = []
+        with pa.memory_map(path) as source:
+            reader = pa_ipc.open_stream(source)
+            schema = reader.schema
+            while True:
+                try:
+                    batches.append(reader.read_next_batch())
+                except StopIteration:
+                    break
+                except (pa.ArrowInvalid, OSError):
+                    print(f"分区文件末尾不完整，已忽略: {path}")
+                    break
+        return pa.Table.from_batches(batches, schema=schema)
+
+    def _write_partition(self, path: str, table):
+        """整体重写一个分区（先写临时文件再原子替换）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(table.schema.serialize())
+            for batch in table.to_batches():
+                f.write(batch.serialize())
+        os.replace(tmp_path, path)
+
+    def _compact_partition(self, path: str) -> int:
+        """将分区中的多个小批次合并为一个批次，返回文件大小的变化"""
+        try:
+            size_before = os.path.getsize(path)
+            table = self._read_partition(path)
+            if table.num_rows and len(table.to_batches()) > 1:
+                self._write_partition(path, table.combine_chunks())
+            return os.path.getsize(path) - size_before
+        except Exception as e:
+            print(f"合并分区失败 {path}: {e}")
+            return 0
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        partitions = self._partitions(symbol)
+        if start is not None:
+            partitions = [p for p in partitions if self._partition_day(p) >= start.date().isoformat()]
+        if end is not None:
+            partitions = [p for p in partitions if self._partition_day(p) <= end.date().isoformat()]
+
+        # 从最新分区向前读取，够 last_n 行即停止
+        frames = []
+        rows = 0
+        for path in reversed(partitions):
+            frame = self._read_partition(path).to_pandas()
+            if start is not None or end is not None:
+                frame = self._select(frame, None, start, end)
+            frames.append(frame)
+            rows += len(frame)
+            if last_n is not None and rows >= last_n:
+                break
+
+        if not frames:
+            return None
+
+        df = pd.concat(reversed(frames), ignore_index=True)
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp')
+        return self._select(df, last_n, None, None)
+
+    def symbols(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.data_dir)
+                      if self._partitions(name))
+
+    def needs_trim(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> bool:
+        partitions = self._partitions(symbol)
+        if not partitions:
+            return False
+
+        if before is not None:
+            oldest_day = self._partition_day(partitions[0])
+            before_day = before.strftime('%Y-%m-%d')
+            if oldest_day < before_day:
+                return True
+            if oldest_day == before_day:
+                timestamps = self._read_partition(partitions[0]).column('timestamp')
+                if len(timestamps) and timestamps[0].as_py() < before:
+                    return True
+
+        if max_rows is not None:
+            rows = 0
+            for path in reversed(partitions):
+                rows += self._read_partition(path).num_rows
+                if rows > max_rows:
+                    return True
+
+        return False
+
+    def _trim_plan(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> List[str]:
+        """trim 需要重写的边界分区（只读取，不持有锁）"""
+        before_day = before.strftime('%Y-%m-%d') if before is not None else None
+        rewrites = []
+        counts = []
+        for path in self._partitions(symbol):
+            day = self._partition_day(path)
+            if before_day is not None and day < before_day:
+                continue
+
+            table = self._read_partition(path)
+            rows = table.num_rows
+            if day == before_day:
+                timestamps = pd.to_datetime(table.column('timestamp').to_numpy())
+                expired = int((timestamps < pd.Timestamp(before)).sum())
+                if 0 < expired < rows:
+                    rewrites.append(path)
+                rows -= expired
+            counts.append((path, rows))
+
+        if max_rows is not None:
+            kept = 0
+            for path, rows in reversed(counts):
+                if kept < max_rows < kept + rows and path not in rewrites:
+                    rewrites.append(path)
+                kept += rows
+        return rewrites
+
+    def trim(self, symbol: str, max_rows: Optional[int] = None, before: Optional[datetime] = None,
+             limiter=None) -> int:
+        """早于 before 所在日期的分区直接删除，只重写边界分区"""
+        # 在锁外等待限速额度，不阻塞采集器写入
+        if limiter is not None:
+            limiter.consume(sum(os.path.getsize(path) for path in self._trim_plan(symbol, max_rows, before)))
+
+        usage = self.usage()
+        with self._lock:
+            bytes_before, files_before = self._disk_usage(symbol)
+            removed = 0
+            if before is not None:
+                before_day = before.strftime('%Y-%m-%d')
+                for path in self._partitions(symbol):
+                    day = self._partition_day(path)
+                    if day > before_day:
+                        break
+
+                    table = self._read_partition(path)
+                    if day < before_day:
+                        removed += table.num_rows
+                        os.remove(path)
+                        continue
+
+                    timestamps = pd.to_datetime(table.column('timestamp').to_numpy())
+                    keep_from = int((timestamps < pd.Timestamp(before)).sum())
+                    if keep_from:
+                        self._rewrite_partition(path, table.slice(keep_from))
+                        removed += keep_from
+
+            if max_rows is not None:
+                kept = 0
+                for path in reversed(self._partitions(symbol)):
+                    table = self._read_partition(path)
+                    if kept >= max_rows:
+                        # 整个分区过期：直接删除
+                        removed += table.num_rows
+                        os.remove(path)
+                        continue
+
+                    keep = min(table.num_rows, max_rows - kept)
+                    if keep < table.num_rows:
+                        self._rewrite_partition(path, table.slice(table.num_rows - keep))
+                        removed += table.num_rows - keep
+                    kept += keep
+
+            if not self._partitions(symbol):
+                shutil.rmtree(self._symbol_dir(symbol), ignore_errors=True)
+
+            bytes_after, files_after = self._disk_usage(symbol)
+            usage.add(symbol, rows=-removed, bytes=bytes_after - bytes_before,
+                      files=files_after - files_before)
+
+        self._save_usage(force=True)
+        return removed
+
+    def _disk_usage(self, symbol: str) -> Tuple[int, int]:
+        """一个交易对的分区总字节数和分区数"""
+        partitions = self._partitions(symbol)
+        return sum(os.path.getsize(path) for path in partitions), len(partitions)
+
+    def _rewrite_partition(self, path: str, table):
+        if table.num_rows == 0:
+            os.remove(path)
+            return
+        self._write_partition(path, table)
+
+    def _scan_usage(self) -> Dict[str, Dict[str, int]]:
+        entries = {}
+        for symbol in self.symbols():
+            partitions = self._partitions(symbol)
+            entries[symbol] = {
+                'rows': sum(self._read_partition(path).num_rows for path in partitions),
+                'bytes': sum(os.path.getsize(path) for path in partitions),
+                'files': len(partitions)
+            }
+        return entries
+
+
+class SqliteStore(SnapshotStore):
+    """单文件SQLite存储（WAL模式），snapshots 表按 (symbol, timestamp) 建索引
+
+    时间戳统一存为微秒精度的ISO字符串，字典序即时间顺序。
+    """
+
+    DB_NAME = 'snapshots.db'
+
+    def __init__(self, data_dir: str = "data", fields: Optional[List[str]] = None):
+        super().__init__(data_dir, fields)
+        self.db_path = os.path.join(self.data_dir, self.DB_NAME)
+        self._lock = threading.RLock()
+        self._pending: Optional[List[tuple]] = None
+        self._batch_depth = 0
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        columns = ", ".join(
+            f"{field} {self._column_type(field)}" for field in SNAPSHOT_FIELDS
+        )
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS snapshots (symbol TEXT NOT NULL, {columns})")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_snapshots_symbol_timestamp ON snapshots (symbol, timestamp)"
+            )
+
+    @staticmethod
+    def _column_type(field: str) -> str:
+        if field == 'timestamp':
+            return 'TEXT NOT NULL'
+        if field in INT_FIELDS:
+            return 'INTEGER'
+        return 'REAL'
+
+    @staticmethod
+    def _format_timestamp(value: Any) -> str:
+        return parse_timestamp(value).isoformat(timespec='microseconds')
+
+    def _row(self, symbol: str, data: Dict[str, Any]) -> tuple:
+        values = [symbol]
+        for field in self.fields:
+            value = data[field]
+            values.append(self._format_timestamp(value) if field == 'timestamp' else value)
+        return tuple(values)
+
+    def _insert(self, rows: List[tuple]):
+        placeholders = ", ".join("?" for _ in range(len(self.fields) + 1))
+        sql = f"INSERT INTO snapshots (symbol, {', '.join(self.fields)}) VALUES ({placeholders})"
+        usage = self.usage()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(sql, rows)
+
+            counts: Dict[str, int] = {}
+            for row in rows:
+                counts[row[0]] = counts.get(row[0], 0) + 1
+            for symbol, count in counts.items():
+                usage.add(symbol, rows=count)
+        self._save_usage()
+
+    def append(self, symbol: str, data: Dict[str, Any]):
+        row = self._row(symbol, data)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+                return
+        self._insert([row])
+
+    @contextmanager
+    def batch(self):
+        """批量写入：退出时在一个事务中写入本周期的所有快照"""
+        with self._lock:
+            self._batch_depth += 1
+            if self._pending is None:
+                self._pending = []
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    rows, self._pending = self._pending, None
+                    if rows:
+                        self._insert(rows)
+                    self._save_usage(force=True)
+
+    def _query(self, sql: str, params: tuple) -> pd.DataFrame:
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return df
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        conditions = ["symbol = ?"]
+        params: List[Any] = [symbol]
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(self._format_timestamp(start))
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(self._format_timestamp(end))
+
+        columns = ", ".join(self.fields)
+        where = " AND ".join(conditions)
+        if last_n is not None:
+            # 先按时间倒序取最近N行，再恢复升序
+            sql = (f"SELECT * FROM (SELECT {columns} FROM snapshots WHERE {where} "
+                   f"ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp")
+            params.append(last_n)
+        else:
+            sql = f"SELECT {columns} FROM snapshots WHERE {where} ORDER BY timestamp"
+
+        df = self._query(sql, tuple(params))
+        return df if len(df) > 0 else None
+
+    def latest_per_symbol(self, n: int) -> Dict[str, pd.DataFrame]:
+        columns = ", ".join(self.fields)
+        sql = (f"SELECT symbol, {columns} FROM ("
+               f"SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY timestamp DESC) AS rn "
+               f"FROM snapshots) WHERE rn <= ? ORDER BY symbol, timestamp")
+        return self._split_by_symbol(self._query(sql, (n,)))
+
+    def window_since(self, since: datetime) -> Dict[str, pd.DataFrame]:
+        columns = ", ".join(self.fields)
+        sql = f"SELECT symbol, {columns} FROM snapshots WHERE timestamp >= ? ORDER BY symbol, timestamp"
+        return self._split_by_symbol(self._query(sql, (self._format_timestamp(since),)))
+
+    @staticmethod
+    def _split_by_symbol(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        return {
+            symbol: group.drop(columns='symbol').reset_index(drop=True)
+            for symbol, group in df.groupby('symbol', sort=True)
+        }
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT symbol FROM snapshots ORDER BY symbol").fetchall()
+        return [row[0] for row in rows]
+
+    def needs_trim(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> bool:
+        with self._lock:
+            if before is not None and self._conn.execute(
+                "SELECT 1 FROM snapshots WHERE symbol = ? AND timestamp < ? LIMIT 1",
+                (symbol, self._format_timestamp(before))
+            ).fetchone():
+                return True
+            if max_rows is not None and self._conn.execute(
+                "SELECT 1 FROM snapshots WHERE symbol = ? ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+                (symbol, max_rows)
+            ).fetchone():
+                return True
+        return False
+
+    def trim(self, symbol: str, max_rows: Optional[int] = None, before: Optional[datetime] = None,
+             limiter=None) -> int:
+        """按索引删除，不需要重写文件（limiter 不起作用）"""
+        removed = 0
+        with self._lock, self._conn:
+            if before is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM snapshots WHERE symbol = ? AND timestamp < ?",
+                    (symbol, self._format_timestamp(before))
+                ).rowcount
+            if max_rows is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM snapshots WHERE symbol = ? AND timestamp < ("
+                    "SELECT timestamp FROM snapshots WHERE symbol = ? "
+                    "ORDER BY timestamp DESC LIMIT 1 OFFSET ?)",
+                    (symbol, symbol, max_rows - 1)
+                ).rowcount
+        if removed:
+            self.usage().add(symbol, rows=-removed)
+            self._save_usage(force=True)
+        return removed
+
+    def _scan_usage(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT symbol, COUNT(*) FROM snapshots GROUP BY symbol").fetchall()
+        return {symbol: {'rows': count, 'bytes': 0, 'files': 0} for symbol, count in rows}
+
+    def total_size(self) -> int:
+        # 数据库文件只需stat三个文件，包含WAL中尚未合并的数据
+        total_size = 0
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                total_size += os.path.getsize(self.db_path + suffix)
+            except OSError:
+                continue
+        return total_size
+
+    def file_count(self) -> int:
+        return 1 if os.path.exists(self.db_path) else 0
+
+    def storage_breakdown(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """单个数据库文件无法按交易对统计字节数，按行数比例分摊"""
+        items = self.usage().breakdown()
+        total_rows = sum(item['rows'] for item in items)
+        total_size = self.total_size()
+        for item in items:
+            item['bytes'] = int(total_size * item['rows'] / total_rows) if total_rows else 0
+        items.sort(key=lambda item: (-item['bytes'], item['symbol']))
+        return items[:top] if top is not None else items
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+class SegmentStore(SnapshotStore):
+    """按交易对和时间段分段的CSV存储，每个交易对一个 manifest
+
+    布局：data/<SYMBOL>/<时间段>.csv（当前时间段）和 data/<SYMBOL>/<YYYY-MM-DD>.csv.gz（已压缩）。
+    manifest.json 记录每个分段的行数、字节数和最早/最晚时间，因此：
+    - 按时间范围读取只打开与范围重叠的分段，按最近N行读取只打开最新的几个分段
+    - 按时间过期只需删除整个分段，不需要读取数据
+    - 每个交易对的行数、字节数随 manifest 一起增量更新
+    manifest 在每个批次结束时写入；加载时校验文件大小，崩溃后只重新扫描不一致的分段。
+    compact() 把已结束日期的分段合并为一个gzip压缩文件（按原始文本逐行复制）。
+    """
+
+    MANIFEST = 'manifest.json'
+    SPAN_FORMATS = {
+        'day': '%Y-%m-%d',
+        'hour': '%Y-%m-%dT%H',
+    }
+
+    def __init__(self, data_dir: str = "data", fields: Optional[List[str]] = None,
+                 span: Optional[str] = None):
+        super().__init__(data_dir, fields)
+        self.span = (span or SEGMENT_SPAN).lower()
+        if self.span not in self.SPAN_FORMATS:
+            raise ValueError(f"不支持的分段粒度: {self.span}（可选: {', '.join(self.SPAN_FORMATS)}）")
+
+        self._lock = threading.RLock()
+        self._manifests: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._dirty = set()
+        self._batch_depth = 0
+
+    @staticmethod
+    def _format_timestamp(value: Any) -> str:
+        return parse_timestamp(value).isoformat(timespec='microseconds')
+
+    @staticmethod
+    def _is_segment(name: str) -> bool:
+        return name.endswith('.csv') or name.endswith('.csv.gz')
+
+    @staticmethod
+    def _segment_day(name: str) -> str:
+        return name[:10]
+
+    def _symbol_dir(self, symbol: str) -> str:
+        return os.path.join(self.data_dir, symbol)
+
+    def _segment_path(self, symbol: str, name: str) -> str:
+        return os.path.join(self.data_dir, symbol, name)
+
+    def _scan_segment(self, path: str) -> Dict[str, Any]:
+        """读取分段的时间列，重建 manifest 条目"""
+        timestamps = pd.to_datetime(pd.read_csv(path, usecols=['timestamp'])['timestamp'])
+        return {
+            'rows': len(timestamps),
+            'bytes': os.path.getsize(path),
+            'min_ts': self._format_timestamp(timestamps.min()) if len(timestamps) else None,
+            'max_ts': self._format_timestamp(timestamps.max()) if len(timestamps) else None,
+        }
+
+    def _manifest(self, symbol: str) -> Dict[str, Dict[str, Any]]:
+        """交易对的 manifest {分段文件名: 条目}（调用方持有锁）"""
+        entries = self._manifests.get(symbol)
+        if entries is not None:
+            return entries
+
+        symbol_dir = self._symbol_dir(symbol)
+        entries = {}
+        manifest_path = os.path.join(symbol_dir, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get('segments', {})
+            except (OSError, ValueError) as e:
+                print(f"读取manifest失败，重新扫描 {symbol}: {e}")
+
+        names = set()
+        if os.path.isdir(symbol_dir):
+            names = {name for name in os.listdir(symbol_dir) if self._is_segment(name)}
+
+        changed = False
+        for name in set(entries) - names:
+            del entries[name]
+            changed = True
+        for name in names:
+            path = self._segment_path(symbol, name)
+            entry = entries.get(name)
+            if entry is None or entry['bytes'] != os.path.getsize(path):
+                entries[name] = self._scan_segment(path)
+                changed = True
+
+        self._manifests[symbol] = entries
+        if changed:
+            self._dirty.add(symbol)
+            self._flush()
+        return entries
+
+    def _save_manifest(self, symbol: str):
+        symbol_dir = self._symbol_dir(symbol)
+        if not os.path.isdir(symbol_dir):
+            return
+        path = os.path.join(symbol_dir, self.MANIFEST)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'span': self.span, 'segments': self._manifests.get(symbol, {})}, f)
+        os.replace(tmp_path, path)
+
+    def _flush(self):
+        """批次外立即写入变化的 manifest"""
+        if self._batch_depth > 0:
+            return
+        for symbol in self._dirty:
+            self._save_manifest(symbol)
+        self._dirty.clear()
+
+    @contextmanager
+    def batch(self):
+        """批量写入：退出时一次性写入本周期变化的 manifest"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                self._flush()
+                if self._batch_depth == 0:
+                    self._save_usage(force=True)
+
+    def append(self, symbol: str, data: Dict[str, Any]):
+        timestamp = self._format_timestamp(data['timestamp'])
+        name = parse_timestamp(data['timestamp']).strftime(self.SPAN_FORMATS[self.span]) + '.csv'
+        usage = self.usage()
+
+        with self._lock:
+            entries = self._manifest(symbol)
+            os.makedirs(self._symbol_dir(symbol), exist_ok=True)
+            path = self._segment_path(symbol, name)
+            file_exists = os.path.isfile(path)
+
+            with open(path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fields)
+                if not file_exists:
+                    writer.writeheader()
+                writer.writerow({field: data[field] for field in self.fields})
+
+            entry = entries.get(name)
+            new_segment = entry is None
+            if entry is None or entry['rows'] == 0:
+                entry = entries[name] = {'rows': 0, 'bytes': entry['bytes'] if entry else 0,
+                                         'min_ts': timestamp, 'max_ts': timestamp}
+            size_before = entry['bytes']
+            entry['rows'] += 1
+            entry['bytes'] = os.path.getsize(path)
+            entry['min_ts'] = min(entry['min_ts'], timestamp)
+            entry['max_ts'] = max(entry['max_ts'], timestamp)
+            usage.add(symbol, rows=1, bytes=entry['bytes'] - size_before, files=1 if new_segment else 0)
+
+            self._dirty.add(symbol)
+            self._flush()
+        self._save_usage()
+
+    def _segments(self, symbol: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """与时间范围重叠的非空分段，按时间升序（调用方持有锁）"""
+        start = self._format_timestamp(start) if start is not None else None
+        end = self._format_timestamp(end) if end is not None else None
+        segments = []
+        for name, entry in self._manifest(symbol).items():
+            if entry['rows'] == 0:
+                continue
+            if start is not None and entry['max_ts'] < start:
+                continue
+            if end is not None and entry['min_ts'] > end:
+                continue
+            segments.append((name, dict(entry)))
+        segments.sort(key=lambda item: item[1]['min_ts'])
+        return segments
+
+    def read(self, symbol: str, last_n: Optional[int] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        # 读取期间分段可能被合并或删除，此时重新获取分段列表
+        for _ in range(3):
+            with self._lock:
+                if not self._manifest(symbol):
+                    return None
+                segments = self._segments(symbol, start, end)
+
+            if last_n is not None:
+                # 从最新的分段向前，只取够 last_n 行
+                rows = 0
+                for i in range(len(segments) - 1, -1, -1):
+                    rows += segments[i][1]['rows']
+                    if rows >= last_n:
+                        segments = segments[i:]
+                        break
+
+            try:
+                frames = [pd.read_csv(self._segment_path(symbol, name)) for name, _ in segments]
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            return None
+
+        if not frames:
+            df = pd.DataFrame(columns=self.fields)
+        else:
+            df = pd.concat(frames, ignore_index=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp')
+        return self._select(df, last_n, start, end)
+
+    def symbols(self) -> List[str]:
+        symbols = []
+        for name in os.listdir(self.data_dir):
+            symbol_dir = self._symbol_dir(name)
+            if os.path.isdir(symbol_dir) and any(self._is_segment(f) for f in os.listdir(symbol_dir)):
+                symbols.append(name)
+        return sorted(symbols)
+
+    def needs_trim(self, symbol: str, max_rows: Optional[int] = None,
+                   before: Optional[datetime] = None) -> bool:
+        with self._lock:
+            entries = [entry for entry in self._manifest(symbol).values() if entry['rows']]
+        if max_rows is not None and sum(entry['rows'] for entry in entries) > max_rows:
+            return True
+        if before is not None:
+            before = self._format_timestamp(before)
+            return any(entry['min_ts'] < before for entry in entries)
+        return False
+
+    def _remove_segment(self, symbol: str, name: str) -> int:
+        """删除整个分段，返回删除的行数（调用方持有锁）"""
+        entry = self._manifest(symbol).pop(name)
+        try:
+            os.remove(self._segment_path(symbol, name))
+        except FileNotFoundError:
+            pass
+        self._dirty.add(symbol)
+        return entry['rows']
+
+    def _rewrite_segment(self, symbol: str, name: str, keep) -> int:
+        """按 keep(df) 的结果重写分段（保持原压缩格式），返回删除的行数（调用方持有锁）"""
+        path = self._segment_path(symbol, name)
+        df = pd.read_csv(path)
+        timestamps = pd.to_datetime(df['timestamp'])
+        kept = keep(df, timestamps)
+        removed = len(df) - len(kept)
+        if removed == 0:
+            return 0
+        if len(kept) == 0:
+            return self._remove_segment(symbol, name)
+
+        tmp_path = f"{path}.tmp"
+        kept.to_csv(tmp_path, index=False, compression='gzip' if name.endswith('.gz') else None)
+        os.replace(tmp_path, path)
+        self._manifest(symbol)[name] = self._scan_segment(path)
+        self._dirty.add(symbol)
+        return removed
+
+    def _trim_rewrite_bytes(self, symbol: str, max_rows: Optional[int] = None,
+                            before: Optional[datetime] = None) -> int:
+        """trim 需要重写的边界分段的总字节数（调用方持有锁）"""
+        cutoff = self._format_timestamp(before) if before is not None else None
+        total = 0
+        rewritten = set()
+        remaining = []
+        for name, entry in self._segments(symbol):
+            if cutoff is not None and entry['max_ts'] < cutoff:
+                continue
+            if cutoff is not None and entry['min_ts'] < cutoff:
+                total += entry['bytes']
+                rewritten.add(name)
+            remaining.append((name, entry))
+
+        if max_rows is not None:
+            kept = 0
+            for name, entry in reversed(remaining):
+                if kept < max_rows < kept + entry['rows'] and name not in rewritten:
+                    total += entry['bytes']
+                kept += entry['rows']
+        return total
+
+    def trim(self, symbol: str, max_rows: Optional[int] = None, before: Optional[datetime] = None,
+             limiter=None) -> int:
+        """整段过期的分段直接删除，只重写跨越边界的一个分段"""
+        # 在锁外等待限速额度，不阻塞采集器写入
+        if limiter is not None:
+            with self._lock:
+                rewrite_bytes = self._trim_rewrite_bytes(symbol, max_rows, before)
+            limiter.consume(rewrite_bytes)
+
+        removed = 0
+        usage = self.usage()
+        with self._lock:
+            before_usage = self._manifest_usage(symbol)
+            segments = self._segments(symbol)
+
+            if before is not None:
+                cutoff = self._format_timestamp(before)
+                for name, entry in segments:
+                    if entry['max_ts'] < cutoff:
+                        removed += self._remove_segment(symbol, name)
+                        continue
+                    if entry['min_ts'] < cutoff:
+                        removed += self._rewrite_segment(
+                            symbol, name, lambda df, ts: df[(ts >= pd.Timestamp(before)).to_numpy()])
+                segments = self._segments(symbol)
+
+            if max_rows is not None:
+                kept = 0
+                for name, entry in reversed(segments):
+                    if kept >= max_rows:
+                        removed += self._remove_segment(symbol, name)
+                        continue
+                    keep = min(entry['rows'], max_rows - kept)
+                    if keep < entry['rows']:
+                        removed += self._rewrite_segment(symbol, name, lambda df, ts, keep=keep: df.tail(keep))
+                    kept += keep
+
+            self._flush()
+            self._record_usage_change(usage, symbol, before_usage)
+        self._save_usage(force=True)
+        return removed
+
+    def _manifest_usage(self, symbol: str) -> Dict[str, int]:
+        """从 manifest 汇总一个交易对的占用（调用方持有锁）"""
+        entries = self._manifest(symbol)
+        return {
+            'rows': sum(entry['rows'] for entry in entries.values()),
+            'bytes': sum(entry['bytes'] for entry in entries.values()),
+            'files': len(entries)
+        }
+
+    def _record_usage_change(self, usage: StorageUsage, symbol: str, before: Dict[str, int]):
+        after = self._manifest_usage(symbol)
+        usage.add(symbol, **{key: after[key] - before[key] for key in after})
+
+    def compact(self, symbol: str, limiter=None) -> int:
+        """
+        把已结束日期（今天之前）的分段合并为一个 <YYYY-MM-DD>.csv.gz，返回合并的分段数
+
+        按原始文本逐行复制，不经过pandas解析，数值格式保持不变。
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            days: Dict[str, List[str]] = {}
+            sizes: Dict[str, int] = {}
+            for name, entry in self._segments(symbol):
+                day = self._segment_day(name)
+                if day < today:
+                    days.setdefault(day, []).append(name)
+                    sizes[day] = sizes.get(day, 0) + entry['bytes']
+
+        merged = 0
+        usage = self.usage()
+        for day, names in sorted(days.items()):
+            target = f"{day}.csv.gz"
+            if names == [target]:
+                continue
+
+            # 在锁外等待限速额度，不阻塞采集器写入
+            if limiter is not None:
+                limiter.consume(sizes[day])
+
+            with self._lock:
+                entries = self._manifest(symbol)
+                names = [name for name in names if name in entries]
+                if not names or names == [target]:
+                    continue
+                before_usage = self._manifest_usage(symbol)
+
+                target_path = self._segment_path(symbol, target)
+                tmp_path = f"{target_path}.tmp"
+                header_written = False
+                with gzip.open(tmp_path, 'wb') as out:
+                    for name in sorted(names, key=lambda n: entries[n]['min_ts']):
+                        path = self._segment_path(symbol, name)
+                        opener = gzip.open if name.endswith('.gz') else open
+                        with opener(path, 'rb') as f:
+                            header = f.readline()
+                            if not header_written:
+                                out.write(header)
+                                header_written = True
+                            shutil.copyfileobj(f, out)
+                os.replace(tmp_path, target_path)
+
+                rows = sum(entries[name]['rows'] for name in names)
+                min_ts = min(entries[name]['min_ts'] for name in names)
+                max_ts = max(entries[name]['max_ts'] for name in names)
+                for name in names:
+                    entries.pop(name)
+                    if name != target:
+                        os.remove(self._segment_path(symbol, name))
+                entries[target] = {
+                    'rows': rows,
+                    'bytes': os.path.getsize(target_path),
+                    'min_ts': min_ts,
+                    'max_ts': max_ts,
+                }
+                self._dirty.add(symbol)
+                self._flush()
+                self._record_usage_change(usage, symbol, before_usage)
+                merged += len(names)
+
+        if merged:
+            self._save_usage(force=True)
+        return merged
+
+    def _scan_usage(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {symbol: self._manifest_usage(symbol) for symbol in self.symbols()}
+
+
+STORE_BACKENDS = {
+    'csv': CsvStore,
+    'arrow': ArrowStore,
+    'sqlite': SqliteStore,
+    'segments': SegmentStore,
+}
+
+
+def create_store(backend: Optional[str] = None, data_dir: str = "data",
+                 fields: Optional[List[str]] = None) -> SnapshotStore:
+    """按名称创建存储后端（默认取环境变量 STORAGE_BACKEND）"""
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"不支持的存储后端: {backend}（可选: {', '.join(STORE_BACKENDS)}）")
+    return STORE_BACKENDS[backend](data_dir, fields)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+流通量数据提供者
+市值 = 现货价格 × 流通量。流通量数据来自可替换的提供者：
+- StaticSupplyProvider：内存中的固定表（默认的10个主流币种）
+- FileSupplyProvider：本地 JSON/CSV 文件，加载一次后缓存在内存中，
+  文件修改时间变化时才重新加载，不在每次查询时重建字典或发起网络请求
+刷新后会依次调用注册的刷新回调，便于外部更新缓存或记录日志。
+"""
+
+import csv
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+# 简化的流通量估算（未配置流通量文件时使用）
+DEFAULT_SUPPLY = {
+    "BTC": 19500000,   # 比特币流通量
+    "ETH": 120000000,  # 以太坊流通量
+    "BNB": 150000000,  # BNB流通量
+    "ADA": 35000000000, # Cardano流通量
+    "SOL": 400000000,  # Solana流通量
+    "XRP": 54000000000, # XRP流通量
+    "DOT": 1200000000, # Polkadot流通量
+    "DOGE": 140000000000, # Dogecoin流通量
+    "AVAX": 360000000, # Avalanche流通量
+    "MATIC": 10000000000, # Polygon流通量
+}
+
+SUPPLY_FILE = os.getenv('SUPPLY_FILE', '')
+
+# 文件中可识别的列名/字段名
+ASSET_KEYS = ('asset', 'symbol', 'base_asset')
+SUPPLY_KEYS = ('circulating_supply', 'supply')
+
+
+class SupplyProvider:
+    """流通量提供者基类"""
+
+    def __init__(self):
+        self._supply: Dict[str, float] = {}
+        self._hooks: List[Callable[[Dict[str, float]], None]] = []
+        self._lock = threading.Lock()
+
+    def get_supply(self, asset: str) -> Optional[float]:
+        """基础币种的流通量，未知时返回None"""
+        return self._supply.get(asset)
+
+    def assets(self) -> List[str]:
+        return sorted(self._supply)
+
+    def __len__(self) -> int:
+        return len(self._supply)
+
+    def add_refresh_hook(self, hook: Callable[[Dict[str, float]], None]):
+        """注册刷新回调，每次加载新数据后以 {币种: 流通量} 调用"""
+        self._hooks.append(hook)
+
+    def refresh(self, force: bool = False) -> bool:
+        """按需重新加载数据，返回是否加载了新数据"""
+        return False
+
+    def _set_supply(self, supply: Dict[str, float]):
+        # 整体替换字典，读取方无需加锁
+        self._supply = supply
+        for hook in self._hooks:
+            try:
+                hook(supply)
+            except Exception as e:
+                print(f"流通量刷新回调失败: {e}")
+
+
+class StaticSupplyProvider(SupplyProvider):
+    """内存中的固定流通量表"""
+
+    def __init__(self, supply: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self._supply = {asset: float(value) for asset, value in (DEFAULT_SUPPLY if supply is None else supply).items()}
+
+
+class FileSupplyProvider(SupplyProvider):
+    """
+    从本地文件读取流通量
+
+    支持的格式：
+    - JSON：{"BTC": 19500000, ...} 或 [{"asset": "BTC", "circulating_supply": 19500000}, ...]
+    - CSV：包含 asset 和 circulating_supply 两列（列名也可以是 symbol / supply）
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._mtime: Optional[float] = None
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """文件修改时间变化时重新加载；加载失败时保留旧数据"""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                if force:
+                    print(f"读取流通量文件失败: {e}")
+                return False
+
+            if not force and mtime == self._mtime:
+                return False
+
+            try:
+                supply = load_supply_file(self.path)
+            except (OSError, ValueError) as e:
+                print(f"解析流通量文件 {self.path} 失败: {e}")
+                return False
+
+            self._mtime = mtime
+            self._set_supply(supply)
+            return True
+
+
+def _parse_records(records) -> Dict[str, float]:
+    supply = {}
+    for record in records:
+        asset = next((record[key] for key in ASSET_KEYS if record.get(key)), None)
+        value = next((record[key] for key in SUPPLY_KEYS if record.get(key) not in (None, '')), None)
+        if asset is None or value is None:
+            continue
+        supply[str(asset).upper()] = float(value)
+    return supply
+
+
+def load_supply_file(path: str) -> Dict[str, float]:
+    """读取 JSON/CSV 流通量文件，返回 {基础币种: 流通量}"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return _parse_records(csv.DictReader(f))
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        return {str(asset).upper(): float(value) for asset, value in data.items() if value is not None}
+    if isinstance(data, list):
+        return _parse_records(data)
+    raise ValueError("流通量文件必须是对象或记录列表")
+
+
+def save_supply_file(path: str, supply: Dict[str, float]):
+    """原子写入 JSON 流通量文件（可在刷新回调或外部同步脚本中使用）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(supply.items())), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def create_supply_provider(path: Optional[str] = None) -> SupplyProvider:
+    """配置了存在的流通量文件时从文件读取，否则使用默认的固定表"""
+    path = SUPPLY_FILE if path is None else path
+    if path:
+        if os.path.exists(path):
+            return FileSupplyProvider(path)
+        print(f"流通量文件 {path} 不存在，使用内置的 {len(DEFAULT_SUPPLY)} 个币种")
+    return StaticSupplyProvider()
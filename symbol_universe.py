@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+USDT永续合约交易对列表缓存
+exchangeInfo 响应有数MB，交易对列表却很少变化。本模块将交易对列表缓存在
+内存和磁盘中，超过TTL后才重新请求（带 If-None-Match / If-Modified-Since
+条件请求头），并在交易对上架/下架时通知监听者。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import http_client
+
+
+EXCHANGE_INFO_URL = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+DEFAULT_CACHE_FILE = os.getenv('SYMBOL_CACHE_FILE', os.path.join('cache', 'usdt_perpetual_symbols.json'))
+DEFAULT_TTL = int(os.getenv('SYMBOL_CACHE_TTL', '3600'))  # 1小时
+
+# 上架/下架事件回调：callback(listed, delisted)
+ChangeListener = Callable[[List[str], List[str]], None]
+
+
+def parse_usdt_perpetual_symbols(exchange_info: Dict) -> List[str]:
+    """从 exchangeInfo 响应中筛选正在交易的USDT永续合约"""
+    usdt_symbols = []
+    for symbol_info in exchange_info["symbols"]:
+        if (symbol_info["quoteAsset"] == "USDT" and
+            symbol_info["contractType"] == "PERPETUAL" and
+            symbol_info["status"] == "TRADING"):
+            usdt_symbols.append(symbol_info["symbol"])
+    return sorted(usdt_symbols)
+
+
+class SymbolUniverse:
+    """带TTL、磁盘持久化和变更检测的交易对列表缓存"""
+
+    def __init__(self, cache_file: Optional[str] = DEFAULT_CACHE_FILE, ttl: int = DEFAULT_TTL,
+                 url: str = EXCHANGE_INFO_URL):
+        """
+        Args:
+            cache_file: 磁盘缓存文件路径，为None时只缓存在内存中
+            ttl: 缓存有效期（秒）
+            url: exchangeInfo 接口地址
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.url = url
+
+        self.symbols: List[str] = []
+        self.fetched_at = 0.0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+
+        self._listeners: List[ChangeListener] = []
+        self._lock = threading.Lock()
+
+        self._load_from_disk()
+
+    def add_listener(self, listener: ChangeListener):
+        """注册上架/下架事件监听者"""
+        self._listeners.append(listener)
+
+    def is_fresh(self) -> bool:
+        """缓存是否在有效期内"""
+        return bool(self.symbols) and (time.time() - self.fetched_at) < self.ttl
+
+    def get_symbols(self, force_refresh: bool = False) -> List[str]:
+        """获取交易对列表，缓存过期时自动刷新；刷新失败时返回旧缓存"""
+        with self._lock:
+            if force_refresh or not self.is_fresh():
+                self._refresh()
+            return list(self.symbols)
+
+    def count(self) -> int:
+        """交易对数量"""
+        return len(self.get_symbols())
+
+    def _refresh(self):
+        """条件请求 exchangeInfo 并更新缓存"""
+        headers = {}
+        if self.symbols:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+
+        try:
+            response = http_client.get(self.url, headers=headers)
+
+            if response.status_code == 304:
+                self.fetched_at = time.time()
+                self._save_to_disk()
+                return
+
+            response.raise_for_status()
+            symbols = parse_usdt_perpetual_symbols(response.json())
+        except Exception as e:
+            print(f"刷新交易对列表失败: {e}")
+            return
+
+        previous = self.symbols
+        self.symbols = symbols
+        self.fetched_at = time.time()
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self._save_to_disk()
+
+        print(f"获取到 {len(symbols)} 个USDT永续合约交易对")
+
+        if previous:
+            self._emit_changes(previous, symbols)
+
+    def _emit_changes(self, previous: List[str], current: List[str]):
+        """比较新旧列表并通知监听者"""
+        previous_set, current_set = set(previous), set(current)
+        listed = sorted(current_set - previous_set)
+        delisted = sorted(previous_set - current_set)
+
+        if not listed and not delisted:
+            return
+
+        print(f"交易对列表变化: 上架 {len(listed)} 个, 下架 {len(delisted)} 个")
+        for listener in self._listeners:
+            try:
+                listener(listed, delisted)
+            except Exception as e:
+                print(f"交易对变更通知失败: {e}")
+
+    def _load_from_disk(self):
+        """从磁盘加载缓存"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            self.symbols = cached.get('symbols', [])
+            self.fetched_at = cached.get('fetched_at', 0.0)
+            self.etag = cached.get('etag')
+            self.last_modified = cached.get('last_modified')
+        except Exception as e:
+            print(f"读取交易对缓存失败: {e}")
+
+    def _save_to_disk(self):
+        """写入磁盘缓存（先写临时文件再原子替换）"""
+        if not self.cache_file:
+            return
+
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'symbols': self.symbols,
+                    'fetched_at': self.fetched_at,
+                    'etag': self.etag,
+                    'last_modified': self.last_modified
+                }, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"写入交易对缓存失败: {e}")
+
+
+_default_universe: Optional[SymbolUniverse] = None
+
+
+def get_default_universe() -> SymbolUniverse:
+    """获取进程内共享的交易对列表缓存"""
+    global _default_universe
+    if _default_universe is None:
+        _default_universe = SymbolUniverse()
+    return _default_universe
@@ -5,6 +5,7 @@ Telegram Bot推送功能
 """
 
 import requests
+import http_client
 import os
 from typing import Optional, List, Dict
 from datetime import datetime
@@ -45,7 +46,7 @@ class TelegramBot:
         }
 
         try:
-            response = requests.post(url, json=payload, timeout=10)
+            response = http_client.post(url, json=payload, timeout=10)
             response.raise_for_status()
             print(f"Telegram消息发送成功: {message[:50]}...")
             return True
@@ -120,7 +121,7 @@ class TelegramBot:
                     'parse_mode': 'HTML'
                 }
 
-                response = requests.post(url, files=files, data=data, timeout=30)
+                response = http_client.post(url, files=files, data=data, timeout=30)
                 response.raise_for_status()
                 print(f"Telegram图片发送成功: {photo_path}")
                 return True
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+按时间索引的序列
+采集器按时间顺序追加写入，历史数据的时间戳本身就是单调递增的。TimeSeries 只在加载时
+检查一次顺序（乱序时才做一次稳定排序），之后用 searchsorted 二分查找时间窗口的边界：
+取一个窗口是 O(log n)，不需要在全部历史上构造布尔掩码；多个周期的窗口共享同一份
+已加载的数组。
+"""
+
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+TimeLike = Union[datetime, pd.Timestamp, np.datetime64, str]
+
+
+def _to_datetime64(value: TimeLike) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).as_unit('ns'))
+
+
+def window_bounds(timestamps: np.ndarray, start: Optional[TimeLike] = None,
+                  end: Optional[TimeLike] = None) -> Tuple[int, int]:
+    """
+    有序时间戳数组中 [start, end] 对应的行范围 [i, j)
+
+    Args:
+        timestamps: 升序的 datetime64[ns] 数组
+        start: 起始时间（包含），None表示从头开始
+        end: 结束时间（包含），None表示到末尾
+    """
+    i = 0 if start is None else int(np.searchsorted(timestamps, _to_datetime64(start), side='left'))
+    j = len(timestamps) if end is None else int(np.searchsorted(timestamps, _to_datetime64(end), side='right'))
+    return i, max(i, j)
+
+
+def slice_by_time(df: pd.DataFrame, start: Optional[TimeLike] = None,
+                  end: Optional[TimeLike] = None) -> pd.DataFrame:
+    """按时间范围切片（df 按 timestamp 升序）"""
+    if start is None and end is None:
+        return df
+    i, j = window_bounds(df['timestamp'].to_numpy(dtype='datetime64[ns]'), start, end)
+    return df.iloc[i:j]
+
+
+class TimeSeries:
+    """一个交易对按时间升序的历史数据"""
+
+    def __init__(self, df: pd.DataFrame, symbol: Optional[str] = None):
+        """
+        Args:
+            df: 历史数据，timestamp列可以是字符串或datetime；只在这里检查一次顺序
+            symbol: 交易对名称
+        """
+        if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df = df.assign(timestamp=pd.to_datetime(df['timestamp']))
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp', kind='stable')
+
+        self.symbol = symbol
+        self.frame = df.reset_index(drop=True)
+        self.timestamps = self.frame['timestamp'].to_numpy(dtype='datetime64[ns]')
+        self._start = 0
+        self._stop = len(self.frame)
+
+    @classmethod
+    def _view(cls, parent: 'TimeSeries', start: int, stop: int) -> 'TimeSeries':
+        # 窗口与原序列共享数据，只记录行范围
+        view = cls.__new__(cls)
+        view.symbol = parent.symbol
+        view.frame = parent.frame
+        view.timestamps = parent.timestamps
+        view._start = start
+        view._stop = stop
+        return view
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def window(self, start: Optional[TimeLike] = None, end: Optional[TimeLike] = None) -> 'TimeSeries':
+        """[start, end] 时间范围内的子序列（O(log n)，不复制数据）"""
+        i, j = window_bounds(self.timestamps[self._start:self._stop], start, end)
+        return self._view(self, self._start + i, self._start + j)
+
+    def since(self, start: TimeLike) -> 'TimeSeries':
+        """start（包含）之后的子序列"""
+        return self.window(start=start)
+
+    def tail(self, n: int) -> 'TimeSeries':
+        """最近n行"""
+        return self._view(self, max(self._start, self._stop - n), self._stop)
+
+    def row(self, i: int) -> pd.Series:
+        """第i行（支持负数下标）"""
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"行号超出范围: {i}")
+        return self.frame.iloc[self._start + i if i >= 0 else self._stop + i]
+
+    def first(self) -> pd.Series:
+        return self.row(0)
+
+    def last(self) -> pd.Series:
+        return self.row(-1)
+
+    def values(self, field: str) -> np.ndarray:
+        """某一列的数组（窗口内）"""
+        return self.frame[field].to_numpy()[self._start:self._stop]
+
+    def to_frame(self) -> pd.DataFrame:
+        """窗口内的数据"""
+        return self.frame.iloc[self._start:self._stop].reset_index(drop=True)
+
+    @property
+    def start_time(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self.timestamps[self._start]) if len(self) else None
+
+    @property
+    def end_time(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self.timestamps[self._stop - 1]) if len(self) else None
+
+    def __repr__(self) -> str:
+        return f"TimeSeries({self.symbol or ''}, {len(self)} 行, {self.start_time} ~ {self.end_time})"
+
+
+def as_series(data: Union[TimeSeries, pd.DataFrame], symbol: Optional[str] = None) -> TimeSeries:
+    """把 DataFrame 包装为 TimeSeries（已经是 TimeSeries 时原样返回）"""
+    return data if isinstance(data, TimeSeries) else TimeSeries(data, symbol)